@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
+from importlib.util import find_spec
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,6 +47,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'LittleLemonAPI.middleware.PerformanceMiddleware', # First, so the total covers the other middleware
+    'LittleLemonAPI.routers.PrimaryPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -85,6 +89,35 @@ DATABASES = {
     }
 }
 
+# Read replicas, paths of SQLite copies of the primary database separated by ':' in 'LITTLELEMON_REPLICAS'.
+# A local copy can be refreshed with 'python manage.py sync_replica'
+REPLICA_DATABASES = {
+    f'replica{index}': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'TEST': {'MIRROR': 'default'},
+    }
+    for index, path in enumerate(filter(None, os.environ.get('LITTLELEMON_REPLICAS', '').split(os.pathsep)), 1)
+}
+DATABASES.update(REPLICA_DATABASES)
+
+# Routers sending the reads of replica-enabled views to the replicas and everything else to the primary
+DATABASE_ROUTERS = ['LittleLemonAPI.routers.ReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+# Shared by every worker process, it carries the token and role revocations, the menu version and the
+# primary pins. A process-local backend such as LocMemCache fails 'manage.py check'
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -134,14 +167,20 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     # Rendering classes for displaying data
     'DEFAULT_RENDERER_CLASSES':[
-        'rest_framework.renderers.JSONRenderer',
+        'LittleLemonAPI.renderers.ORJSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
         'rest_framework_xml.renderers.XMLRenderer',
         'rest_framework_yaml.renderers.YAMLRenderer',
-    ],
+    ] + (['LittleLemonAPI.renderers.MessagePackRenderer'] if find_spec('msgpack') else []),
+    # Parsing classes for request bodies
+    'DEFAULT_PARSER_CLASSES': [
+        'LittleLemonAPI.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ] + (['LittleLemonAPI.parsers.MessagePackParser'] if find_spec('msgpack') else []),
     # Authentication classes for default auth check
     'DEFAULT_AUTHENTICATION_CLASSES':[
-        'rest_framework.authentication.TokenAuthentication',
+        'LittleLemonAPI.authentication.CachedTokenAuthentication',
     ],
     # Filter backends for default filter classes
     'DEFAULT_FILTER_BACKENDS': [
@@ -154,13 +193,14 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 2,
     # Throttle classes for default throttling
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle', 
+        'LittleLemonAPI.throttling.RoleRateThrottle',
     ],
-    # Throttle rates for the throttle classes
+    # Throttle rates for the throttle classes, 'user' is the rate of customers
     'DEFAULT_THROTTLE_RATES': {
         'anon': '3/minute',
         'user': '5/minute',
+        'crew': '30/minute',
+        'manager': '60/minute',
     },   
 }
 
@@ -168,3 +208,27 @@ REST_FRAMEWORK = {
 DJOSER = {
     'USER_ID_FIELD': 'username',
 }
+
+# Little Lemon API content
+LITTLELEMON = {
+    # Maximum number of users kept in the process-wide role cache
+    'ROLE_CACHE_SIZE': 10000,
+    # Seconds after which cached roles are fetched again from the database
+    'ROLE_CACHE_TTL': 300,
+    # Maximum number of tokens kept in the process-wide token cache and seconds after which they are resolved again
+    'TOKEN_CACHE_SIZE': 10000,
+    'TOKEN_CACHE_TTL': 60,
+    # Cache alias and seconds for which menu and category list responses are cached,
+    # the cache has to be shared by all worker processes
+    'RESPONSE_CACHE_ALIAS': 'default',
+    'RESPONSE_CACHE_TTL': 600,
+    # Per-request timings in 'Server-Timing' headers and histograms at '/api/metrics', requests slower
+    # than 'SLOW_REQUEST_SECONDS' are logged with their SQL to the 'LittleLemonAPI.performance' logger.
+    # Disabled by default, enable it while profiling
+    'PERFORMANCE_METRICS': False,
+    'SLOW_REQUEST_SECONDS': 0.5,
+    # Replica aliases serving the safe requests of replica-enabled views, and seconds for which
+    # a client reads from the primary after its last write
+    'READ_REPLICAS': list(REPLICA_DATABASES),
+    'PRIMARY_PIN_SECONDS': 5,
+}
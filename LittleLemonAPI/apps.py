@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class LittlelemonapiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'LittleLemonAPI'
+
+    def ready(self):
+        # Connecting the signal handlers and registering the system checks of the app
+        from . import checks, signals
@@ -0,0 +1,83 @@
+from datetime import timedelta
+from django.db import connections, router, transaction
+from django.utils import timezone
+from .conf import get_setting
+from .models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem
+
+# Columns moved from the live tables into the archive tables
+ORDER_COLUMNS = ['id', 'user_id', 'delivery_crew_id', 'status', 'total', 'date', 'updated_at']
+ITEM_COLUMNS = ['id', 'order_id', 'menuitem_id', 'quantity', 'unit_price', 'price']
+
+
+def archive_cutoff():
+    """
+    Method to compute the first day whose orders always stay in the live table
+
+    Returns:
+        date: delivered orders placed before this day may be archived
+    """
+
+    return timezone.localdate() - timedelta(days=get_setting('ARCHIVE_AFTER_DAYS'))
+
+
+def reaches_archive(start, end):
+    """
+    Method to check whether a date range asks for orders which may be archived.
+    Requests without any date only read the live table
+
+    Args:
+        start (date): first day of the range, None for an open start
+        end (date): last day of the range, None for an open end
+
+    Returns:
+        bool: true if the range includes days before the archive cutoff
+    """
+
+    if start is None and end is None:
+        return False
+    return start is None or start < archive_cutoff()
+
+
+def archive_batch(cutoff, after_id=0, batch_size=1000):
+    """
+    Method to move the next batch of delivered orders placed before the cutoff into the archive.
+    The batch is copied with 'INSERT ... SELECT' and deleted from the live tables in one transaction,
+    so an interrupted run leaves every order either live or archived and the next run carries on
+
+    Args:
+        cutoff (date): orders placed before this day are archived
+        after_id (int, optional): id after which the batch starts. Defaults to 0.
+        batch_size (int, optional): largest number of orders moved. Defaults to 1000.
+
+    Returns:
+        tuple: number of orders and items moved, and the last order id of the batch or None when nothing is left
+    """
+
+    connection = connections[router.db_for_write(Order)]
+    quote = connection.ops.quote_name
+    tables = {model: quote(model._meta.db_table) for model in (Order, OrderItem, ArchivedOrder, ArchivedOrderItem)}
+    orders, items = ', '.join(map(quote, ORDER_COLUMNS)), ', '.join(map(quote, ITEM_COLUMNS))
+
+    with transaction.atomic(using=connection.alias):
+        ids = list(
+            Order.objects.using(connection.alias).filter(status=True, date__lt=cutoff, id__gt=after_id)
+            .order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0, 0, None
+        placeholders = ', '.join(['%s'] * len(ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {tables[ArchivedOrder]} ({orders}, {quote("archived_at")}) '
+                f'SELECT {orders}, %s FROM {tables[Order]} WHERE {quote("id")} IN ({placeholders})',
+                [timezone.now(), *ids],
+            )
+            cursor.execute(
+                f'INSERT INTO {tables[ArchivedOrderItem]} ({items}) '
+                f'SELECT {items} FROM {tables[OrderItem]} WHERE {quote("order_id")} IN ({placeholders})',
+                ids,
+            )
+            item_count = cursor.rowcount
+            cursor.execute(f'DELETE FROM {tables[OrderItem]} WHERE {quote("order_id")} IN ({placeholders})', ids)
+            cursor.execute(f'DELETE FROM {tables[Order]} WHERE {quote("id")} IN ({placeholders})', ids)
+    return len(ids), item_count, ids[-1]
@@ -0,0 +1,41 @@
+import django
+from django.core.handlers.asgi import ASGIHandler
+from django.urls import reverse
+from django.utils.functional import cached_property
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """
+    ASGI handler serving the event streams without a thread of their own.
+    Django runs every request in a thread-sensitive context whose worker thread lives until the response is sent,
+    so an open stream would hold an idle thread for as long as the client listens. Streams are handled outside
+    such a context, their synchronous steps borrow the shared sync thread only until the stream starts
+    """
+
+    # URL names of the views answering with endless streams
+    stream_urls = ['order-events']
+
+
+    @cached_property
+    def stream_paths(self):
+        return {reverse(name) for name in self.stream_urls}
+
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] in self.stream_paths:
+            await self.handle(scope, receive, send)
+        else:
+            await super().__call__(scope, receive, send)
+
+
+
+def get_asgi_application():
+    """
+    Method to build the ASGI application of the project, the counterpart of 'django.core.asgi.get_asgi_application()'
+
+    Returns:
+        StreamingASGIHandler: ASGI callable
+    """
+
+    django.setup(set_prefix=False)
+    return StreamingASGIHandler()
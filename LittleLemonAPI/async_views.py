@@ -0,0 +1,318 @@
+import asyncio
+import orjson
+from django.contrib.auth.models import AnonymousUser
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.filters import OrderingFilter, SearchFilter
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from asgiref.sync import sync_to_async
+from .authentication import CachedTokenAuthentication
+from .conf import get_setting
+from .events import broker, Subscription, RESYNC
+from .metrics import timed
+from .models import MenuItem, Cart, Category
+from .pagination import AsyncPageNumberPagination, AsyncOrderPageNumberPagination
+from .permissions import isManager, isCrew
+from .projections import get_plan
+from .renderers import ORJSONRenderer
+from .roles import aget_roles
+from .search import MenuSearchFilter
+from .serializers import MenuItemSerializer, CartSerializer, OrderSerializer, CategorySerializer
+from .views import OrderArchiveMixin
+
+
+class AsyncListView(View):
+    """
+    Base view class serving a GET list with the async ORM.
+    Authentication, permissions, throttling, filtering and pagination follow the synchronous views,
+    rows are rendered through the precompiled read plan of the serializer as JSON
+    """
+
+    serializer_class = None
+    queryset = None
+    permission_classes = []
+    filter_backends = [OrderingFilter]
+    pagination_class = AsyncPageNumberPagination
+    authentication_class = CachedTokenAuthentication
+    renderer_class = ORJSONRenderer
+
+    # Throttle classes, the project defaults are used when None
+    throttle_classes = None
+
+
+    def get_queryset(self):
+        return self.queryset.all()
+
+
+    def get_serializer_class(self):
+        return self.serializer_class
+
+
+    def get_throttles(self):
+        throttle_classes = self.throttle_classes
+        if throttle_classes is None:
+            throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+        return [throttle() for throttle in throttle_classes]
+
+
+    async def initial(self, request):
+        """
+        Method to authenticate the request and run the permission and throttle checks
+
+        Args:
+            request (Request): request object from the client side
+
+        Raises:
+            APIException: if a check fails
+        """
+
+        authenticator = self.authentication_class()
+        try:
+            result = await authenticator.aauthenticate(request)
+        except exceptions.AuthenticationFailed:
+            request.user = AnonymousUser()
+            raise
+        request.user = result[0] if result else AnonymousUser()
+        request.auth = result[1] if result else None
+        await aget_roles(request) # Memoizing the roles so the permission classes run without queries
+
+        for permission in [permission() for permission in self.permission_classes]:
+            if not permission.has_permission(request, self):
+                if not request.user.is_authenticated:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied(getattr(permission, 'message', None))
+
+        # The bucket store blocks on its database file, the checks run in a worker thread
+        await sync_to_async(self.check_throttles)(request)
+
+
+    def check_throttles(self, request):
+        """
+        Method to take a token of every throttle of the view
+
+        Args:
+            request (Request): request object from the client side
+
+        Raises:
+            Throttled: if a throttle denies the request
+        """
+
+        waits = [throttle.wait() for throttle in self.get_throttles() if not throttle.allow_request(request, self)]
+        if waits:
+            waits = [wait for wait in waits if wait is not None]
+            raise exceptions.Throttled(max(waits, default=None))
+
+
+    async def filter_queryset(self, request, queryset):
+        """
+        Method to apply the filter backends of the view.
+        Search backends may read from the database while building the query, they run in a worker thread
+
+        Returns:
+            QuerySet: filtered queryset
+        """
+
+        for backend in self.filter_backends:
+            backend = backend()
+            if isinstance(backend, SearchFilter) and backend.get_search_terms(request):
+                queryset = await sync_to_async(backend.filter_queryset)(request, queryset, self)
+            else:
+                queryset = backend.filter_queryset(request, queryset, self)
+        return queryset
+
+
+    async def get(self, request, *args, **kwargs):
+        """
+        Method to display the list
+
+        Args:
+            request (HttpRequest): request object from the client side
+
+        Returns:
+            HttpResponse: JSON response for the client
+        """
+
+        request = Request(request, authenticators=())
+        self.request = request
+        try:
+            await self.initial(request)
+            plan = get_plan(self.get_serializer_class())
+            rows = plan.project(await self.filter_queryset(request, self.get_queryset()))
+
+            paginator = self.pagination_class()
+            page = await paginator.apaginate_queryset(rows, request, self)
+            items = [row async for row in rows] if page is None else page
+            with timed('serialize'):
+                data = await plan.arender(items)
+            if page is not None:
+                data = paginator.get_paginated_response(data).data
+        except exceptions.APIException as exc:
+            return self.handle_exception(exc)
+        return self.render(data)
+
+
+    def handle_exception(self, exc):
+        """
+        Method to turn an API exception into the same response the synchronous views give
+
+        Args:
+            exc (APIException): raised exception
+
+        Returns:
+            HttpResponse: JSON error response
+        """
+
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        response = self.render(data, status=exc.status_code)
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            response['WWW-Authenticate'] = self.authentication_class().authenticate_header(self.request)
+        if getattr(exc, 'wait', None) is not None:
+            response['Retry-After'] = '%d' % exc.wait
+        return response
+
+
+    def render(self, data, status=200):
+        renderer = self.renderer_class()
+        with timed('render'):
+            content = renderer.render(data)
+        return HttpResponse(content, status=status, content_type=renderer.media_type)
+
+
+
+class AsyncCategoriesView(AsyncListView):
+    """
+    Async view class for displaying categories, public like 'CategoriesView'
+    """
+
+    queryset = Category.objects.all()
+    serializer_class = CategorySerializer
+
+
+
+class AsyncMenuItemsView(AsyncListView):
+    """
+    Async view class for displaying menuitems with the ordering and search of 'MenuItemsView'
+    """
+
+    queryset = MenuItem.objects.all()
+    serializer_class = MenuItemSerializer
+    ordering_fields = ['price', 'featured']
+    search_fields = ['title', 'category__title']
+    filter_backends = [OrderingFilter, MenuSearchFilter]
+
+
+
+class AsyncCartView(AsyncListView):
+    """
+    Async view class for displaying the cart of the requesting user
+    """
+
+    serializer_class = CartSerializer
+    permission_classes = [IsAuthenticated]
+
+
+    def get_queryset(self):
+        return Cart.objects.filter(user=self.request.user)
+
+
+
+class AsyncOrdersView(OrderArchiveMixin, AsyncListView):
+    """
+    Async view class for displaying orders with the personalized querysets and archive reads of 'OrderItemView'
+    """
+
+    serializer_class = OrderSerializer
+    permission_classes = [IsAuthenticated]
+    ordering_fields = ['status', 'date']
+    pagination_class = AsyncOrderPageNumberPagination
+
+
+    def get_queryset(self):
+        return self.get_order_queryset()
+
+
+
+class OrderEventsView(AsyncListView):
+    """
+    Async view class streaming order changes as server-sent events.
+    Every placed order and every change of its status or crew member is pushed to the streams allowed to see
+    the order by the rules of 'OrderItemView': managers get every order, crew members their assigned orders and
+    customers their own orders. An idle stream is a parked coroutine with an empty queue, so a server process
+    holds thousands of them without a thread or a database connection each.
+    Needs an ASGI server, the events come from the changes made by the same process
+    """
+
+    permission_classes = [IsAuthenticated]
+
+
+    async def get(self, request, *args, **kwargs):
+        """
+        Method to open the event stream, an 'order' parameter limits the stream to a single order
+
+        Args:
+            request (HttpRequest): request object from the client side
+
+        Returns:
+            StreamingHttpResponse: 'text/event-stream' response kept open until the client leaves
+        """
+
+        request = Request(request, authenticators=())
+        self.request = request
+        try:
+            await self.initial(request)
+            if not isinstance(request._request, ASGIRequest):
+                raise exceptions.NotAcceptable('Order events are only streamed by the ASGI server.')
+            order_id = request.query_params.get('order')
+            if order_id is not None and not order_id.isdigit():
+                raise exceptions.ValidationError({'order': ['A valid integer is required.']})
+        except exceptions.APIException as exc:
+            return self.handle_exception(exc)
+
+        if isManager(request):
+            role = 'manager'
+        elif isCrew(request):
+            role = 'crew'
+        else:
+            role = 'customer'
+        stream = self.stream(role, request.user.pk, int(order_id) if order_id is not None else None)
+        response = StreamingHttpResponse(stream, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no' # Keeping proxies from buffering the events
+        return response
+
+
+    async def stream(self, role, user_id, order_id):
+        """
+        Method to turn the events published for the user into the server-sent event format.
+        A keep-alive comment is sent after a quiet period so proxies keep the connection open,
+        a 'resync' event tells a client which fell behind to fetch its orders again
+
+        Args:
+            role (str): role deciding which orders the stream sees
+            user_id (int): id of the requesting user
+            order_id (int): id of the only order of interest, None for every visible order
+
+        Yields:
+            bytes: server-sent event frames
+        """
+
+        subscription = Subscription(role, user_id, order_id) # Created here to bind the loop serving the stream
+        broker.subscribe(subscription)
+        try:
+            yield b'retry: 3000\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), get_setting('EVENT_STREAM_KEEPALIVE_SECONDS'))
+                except asyncio.TimeoutError:
+                    yield b': keep-alive\n\n'
+                    continue
+                if event is RESYNC:
+                    yield b'event: resync\ndata: {}\n\n'
+                else:
+                    yield b'id: %d\nevent: order\ndata: %s\n\n' % (event['sequence'], orjson.dumps(event))
+        finally:
+            broker.unsubscribe(subscription)
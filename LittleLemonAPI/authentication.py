@@ -0,0 +1,152 @@
+import copy
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from .cache import SharedTTLCache
+from .conf import get_setting
+from .roles import get_user_roles, aget_user_roles
+
+
+# Process-wide cache holding the resolved users and tokens against the token keys.
+# Entries are invalidated in every worker by the signal handlers in 'signals.py' when a token is deleted
+# or its user changes, so revoked tokens and deactivated users are rejected immediately
+token_cache = SharedTTLCache(
+    maxsize=lambda: get_setting('TOKEN_CACHE_SIZE'),
+    ttl=lambda: get_setting('TOKEN_CACHE_TTL'),
+    prefix='littlelemon:token-revoked',
+)
+
+
+def invalidate_tokens(*keys):
+    """
+    Method to drop cached tokens in every worker process, all tokens are dropped if no key is given
+
+    Args:
+        keys (str): keys of the revoked tokens
+    """
+
+    token_cache.invalidate(*keys)
+
+
+class AsyncTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication which can also resolve the token with the async ORM.
+    The sync path is the one of 'TokenAuthentication', both paths accept and reject the same headers
+    """
+
+    def get_token_key(self, request):
+        """
+        Method to read the token key from the 'Authorization' header
+
+        Args:
+            request (Request): request object from the client side
+
+        Raises:
+            AuthenticationFailed: if the header is malformed
+
+        Returns:
+            str: token key or None if no token is given
+        """
+
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+
+        if len(auth) == 1:
+            raise exceptions.AuthenticationFailed(_('Invalid token header. No credentials provided.'))
+        elif len(auth) > 2:
+            raise exceptions.AuthenticationFailed(_('Invalid token header. Token string should not contain spaces.'))
+        try:
+            return auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(_('Invalid token header. Token string should not contain invalid characters.'))
+
+
+    async def aauthenticate(self, request):
+        """
+        Method to authenticate the request from async code
+
+        Args:
+            request (Request): request object from the client side
+
+        Returns:
+            tuple: user and token or None if no token is given
+        """
+
+        key = self.get_token_key(request)
+        if key is None:
+            return None
+
+        model = self.get_model()
+        try:
+            token = await model.objects.select_related('user').aget(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return (token.user, token)
+
+
+
+class CachedTokenAuthentication(AsyncTokenAuthentication):
+    """
+    Token authentication serving the token to user resolution from the token cache.
+    The roles of the user are resolved together with the token and memoized on the request,
+    so a request with warm caches makes no authentication or permission queries
+    """
+
+    def authenticate(self, request):
+        """
+        Method to authenticate the request
+
+        Args:
+            request (Request): request object from the client side
+
+        Returns:
+            tuple: user and token or None if no token is given
+        """
+
+        result = super().authenticate(request)
+        if result is not None:
+            request._littlelemon_roles = (result[0].pk, get_user_roles(result[0]))
+        return result
+
+
+    def authenticate_credentials(self, key):
+        """
+        Method to resolve a token key, the database is only read on a cache miss.
+        Every hit checks the revocation markers in the shared cache
+
+        Args:
+            key (str): token key given by the client
+
+        Returns:
+            tuple: user and token
+        """
+
+        markers, entry = token_cache.read(key)
+        if entry is None:
+            entry = super().authenticate_credentials(key) # Inactive users and unknown keys raise and are never cached
+            token_cache.write(key, markers, entry)
+        user, token = entry
+        return (copy.copy(user), token) # Every request gets its own user object
+
+
+    async def aauthenticate(self, request):
+        """
+        Method to authenticate the request from async code with the same token cache
+        """
+
+        key = self.get_token_key(request)
+        if key is None:
+            return None
+
+        markers, entry = token_cache.read(key)
+        if entry is None:
+            entry = await super().aauthenticate(request)
+            token_cache.write(key, markers, entry)
+        user, token = entry
+        request._littlelemon_roles = (user.pk, await aget_user_roles(user))
+        return (copy.copy(user), token)
+
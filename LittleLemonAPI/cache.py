@@ -0,0 +1,292 @@
+import threading
+import time
+from collections import OrderedDict
+from django.core.cache import caches
+from .conf import get_setting
+
+
+class TTLCache:
+    """
+    Process-wide, thread safe least recently used cache with expiring entries.
+    Entries older than 'ttl' seconds are treated as missing and the cache never
+    holds more than 'maxsize' entries
+    """
+
+    def __init__(self, maxsize, ttl):
+        """
+        Constructor for the cache object
+
+        Args:
+            maxsize (int | callable): maximum number of entries kept in the cache
+            ttl (float | callable): seconds for which an entry stays valid
+        """
+
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    @property
+    def maxsize(self):
+        return self._maxsize() if callable(self._maxsize) else self._maxsize
+
+
+    @property
+    def ttl(self):
+        return self._ttl() if callable(self._ttl) else self._ttl
+
+
+    def get(self, key, default=None):
+        """
+        Method to read an entry from the cache
+
+        Args:
+            key (Hashable): key of the entry
+            default (object, optional): value returned on a miss. Defaults to None.
+
+        Returns:
+            object: cached value if present and not expired else default
+        """
+
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires, value = entry
+            if expires < time.monotonic(): # Dropping the expired entry
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+
+    def set(self, key, value):
+        """
+        Method to store an entry in the cache, evicting the least recently used entries
+
+        Args:
+            key (Hashable): key of the entry
+            value (object): value to be stored
+        """
+
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+    def delete(self, *keys):
+        """
+        Method to remove entries from the cache, missing keys are ignored
+
+        Args:
+            keys (Hashable): keys of the entries to be removed
+        """
+
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+
+    def clear(self):
+        """
+        Method to remove every entry from the cache
+        """
+
+        with self._lock:
+            self._data.clear()
+
+
+    def __len__(self):
+        return len(self._data)
+
+
+
+class SharedTTLCache(TTLCache):
+    """
+    Process-wide cache whose entries are invalidated in every worker process.
+    Invalidations write markers into the shared cache and every entry remembers the markers read before
+    it was built, so an entry is only served while they are unchanged. Missing markers are seeded with
+    a new value, so an expired or evicted marker can never bring a stale entry back.
+    The shared cache has to be seen by every worker process, see 'checks.check_shared_cache'
+    """
+
+    def __init__(self, maxsize, ttl, prefix):
+        """
+        Constructor for the cache object
+
+        Args:
+            maxsize (int | callable): maximum number of entries kept in the cache
+            ttl (float | callable): seconds for which an entry stays valid
+            prefix (str): prefix of the marker keys in the shared cache
+        """
+
+        super().__init__(maxsize, ttl)
+        self.prefix = prefix
+
+
+    def markers(self, key):
+        """
+        Method to read the current markers of an entry, the marker of the whole cache and the one of the key
+
+        Args:
+            key (Hashable): key of the entry
+
+        Returns:
+            tuple: marker values
+        """
+
+        shared = get_shared_cache()
+        keys = (self.prefix, f'{self.prefix}:{key}')
+        values = shared.get_many(keys)
+        missing = [name for name in keys if name not in values]
+        if missing: # Seeding the markers never set, expired or evicted, the winner of a race is read back
+            now = time.time_ns()
+            for name in missing:
+                shared.add(name, now, timeout=2 * self.ttl + 1)
+            values.update(shared.get_many(missing))
+        return tuple(values.get(name, 0) for name in keys)
+
+
+    def read(self, key):
+        """
+        Method to read an entry which was not invalidated in any process.
+        The returned markers have to be passed to 'write()' when the entry is built again
+
+        Args:
+            key (Hashable): key of the entry
+
+        Returns:
+            tuple: current markers and the cached value or None on a miss
+        """
+
+        markers = self.markers(key)
+        entry = self.get(key)
+        if entry is None or entry[0] != markers:
+            return markers, None
+        return markers, entry[1]
+
+
+    def write(self, key, markers, value):
+        """
+        Method to store an entry built after its markers were read
+
+        Args:
+            key (Hashable): key of the entry
+            markers (tuple): markers returned by 'read()' before building the value
+            value (object): value to be stored
+        """
+
+        self.set(key, (markers, value))
+
+
+    def invalidate(self, *keys):
+        """
+        Method to invalidate entries in every process, all entries are invalidated if no key is given
+
+        Args:
+            keys (Hashable): keys of the entries
+        """
+
+        names = [f'{self.prefix}:{key}' for key in keys] if keys else [self.prefix]
+        get_shared_cache().set_many({name: time.time_ns() for name in names}, timeout=2 * self.ttl + 1)
+        if keys:
+            self.delete(*keys)
+        else:
+            self.clear()
+
+
+
+# Key of the global menu version, every cached menu response is keyed by it
+MENU_VERSION_KEY = 'littlelemon:menu-version'
+
+# Striped locks coalescing concurrent rebuilds of the same key inside one process
+_build_locks = [threading.Lock() for _ in range(64)]
+
+
+def get_shared_cache():
+    """
+    Method to get the django cache used for the shared response cache
+
+    Returns:
+        BaseCache: cache configured by the 'RESPONSE_CACHE_ALIAS' setting
+    """
+
+    return caches[get_setting('RESPONSE_CACHE_ALIAS')]
+
+
+def get_menu_version():
+    """
+    Method to read the current menu version.
+    A missing version is seeded with the current time so keys never repeat after eviction
+
+    Returns:
+        int: current version of the menu and category data
+    """
+
+    shared = get_shared_cache()
+    version = shared.get(MENU_VERSION_KEY)
+    if version is None:
+        shared.add(MENU_VERSION_KEY, time.time_ns(), timeout=None)
+        version = shared.get(MENU_VERSION_KEY)
+    return version
+
+
+def bump_menu_version():
+    """
+    Method to invalidate every cached menu and category response by moving to a new version
+    """
+
+    shared = get_shared_cache()
+    try:
+        shared.incr(MENU_VERSION_KEY)
+    except ValueError: # Version was never set or has been evicted
+        shared.set(MENU_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def get_or_build(key, build, timeout):
+    """
+    Method to read a value from the shared cache, building it on a miss.
+    Concurrent misses of the same key are coalesced so only one caller runs 'build',
+    the others wait for its result
+
+    Args:
+        key (str): cache key of the value
+        build (callable): method producing the value on a miss
+        timeout (float): seconds for which the built value is cached
+
+    Returns:
+        object: cached or freshly built value
+    """
+
+    shared = get_shared_cache()
+    value = shared.get(key)
+    if value is not None:
+        return value
+
+    with _build_locks[hash(key) % len(_build_locks)]: # Coalescing the threads of this process
+        value = shared.get(key)
+        if value is not None:
+            return value
+
+        # Coalescing the other processes through a lock entry in the shared cache
+        lock_key = f'{key}:lock'
+        wait = get_setting('RESPONSE_CACHE_LOCK_TIMEOUT')
+        deadline = time.monotonic() + wait
+        owner = shared.add(lock_key, 1, timeout=wait)
+        while not owner and time.monotonic() < deadline:
+            time.sleep(0.01)
+            value = shared.get(key)
+            if value is not None:
+                return value
+            owner = shared.add(lock_key, 1, timeout=wait)
+
+        try:
+            value = build()
+            shared.set(key, value, timeout=timeout)
+        finally:
+            if owner:
+                shared.delete(lock_key)
+        return value
@@ -0,0 +1,52 @@
+from django.db import connections, router
+from .models import Cart, MenuItem
+from .sql import column, on_conflict
+
+
+def add_to_cart(user, menuitem_id, quantity):
+    """
+    Method to add a quantity of a menu item to the cart of a user with a single statement.
+    The row is inserted or its quantity incremented by one 'INSERT ... SELECT ... ON CONFLICT',
+    prices are always taken from the menu item, so concurrent adds of the same item never lose
+    an increment and clients can not set prices
+
+    Args:
+        user (User): owner of the cart
+        menuitem_id (int): id of the menu item to be added
+        quantity (int): quantity added onto the cart
+
+    Returns:
+        tuple: cart row and true if it was inserted, (None, False) if the menu item does not exist
+    """
+
+    connection = connections[router.db_for_write(Cart)]
+    table, menu = connection.ops.quote_name(Cart._meta.db_table), connection.ops.quote_name(MenuItem._meta.db_table)
+    places = Cart._meta.get_field('price').decimal_places
+    menu_id, menu_price = column(MenuItem, 'id'), column(MenuItem, 'price')
+    columns = {name: column(Cart, name) for name in ('id', 'user', 'menuitem', 'quantity', 'unit_price', 'price')}
+    total_quantity = f'{table}.{columns["quantity"]} + excluded.{columns["quantity"]}'
+    assignments = {
+        'quantity': total_quantity,
+        'unit_price': f'excluded.{columns["unit_price"]}', # Following price changes of the menu item
+        'price': f'ROUND(excluded.{columns["unit_price"]} * ({total_quantity}), {places})',
+    }
+
+    sql = (
+        f'INSERT INTO {table} ({columns["user"]}, {columns["menuitem"]}, {columns["quantity"]}, {columns["unit_price"]}, {columns["price"]}) '
+        f'SELECT %s, {menu_id}, %s, {menu_price}, ROUND({menu_price} * %s, {places}) FROM {menu} WHERE {menu_id} = %s '
+        f'{on_conflict(Cart, ["menuitem", "user"], assignments)} '
+        f'RETURNING {columns["id"]}, {columns["quantity"]}, {columns["unit_price"]}, {columns["price"]}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user.pk, quantity, quantity, menuitem_id])
+        row = cursor.fetchone()
+    if row is None: # No menu item to select the row from
+        return None, False
+
+    pk, total, unit_price, price = row
+    cart = Cart(
+        pk=pk, user=user, menuitem_id=menuitem_id, quantity=total,
+        unit_price=Cart._meta.get_field('unit_price').to_python(unit_price),
+        price=Cart._meta.get_field('price').to_python(price),
+    )
+    return cart, total == quantity # Rows in a cart always hold a positive quantity
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+from django.utils.module_loading import import_string
+from .conf import get_setting
+
+
+# Cache backends whose entries are not seen by the other worker processes
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Check failing when the shared cache only lives inside one process.
+    The token and role revocations, the menu version and the primary pins are read from it by every worker,
+    a process-local backend would keep revoked grants alive in the other workers
+
+    Returns:
+        list: errors of the check
+    """
+
+    alias = get_setting('RESPONSE_CACHE_ALIAS')
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    try:
+        backend_class = import_string(backend)
+    except (ImportError, TypeError): # Reported by the cache checks of django
+        return []
+    if not issubclass(backend_class, tuple(import_string(path) for path in PROCESS_LOCAL_BACKENDS)):
+        return []
+    return [Error(
+        f"The cache '{alias}' used by LittleLemonAPI is local to one process.",
+        hint="Configure a backend shared by all worker processes, e.g. FileBasedCache, DatabaseCache, Redis or Memcached, "
+             "or point LITTLELEMON['RESPONSE_CACHE_ALIAS'] at one.",
+        id='LittleLemonAPI.E001',
+    )]
@@ -0,0 +1,63 @@
+from django.conf import settings
+
+
+# Default values for the 'LITTLELEMON' settings dictionary
+DEFAULTS = {
+    # Maximum number of users whose group names are kept in the role cache
+    'ROLE_CACHE_SIZE': 10000,
+    # Seconds after which a cached role entry is fetched again from the database
+    'ROLE_CACHE_TTL': 300,
+    # Maximum number of tokens whose users are kept in the token cache
+    'TOKEN_CACHE_SIZE': 10000,
+    # Seconds after which a cached token is resolved again from the database
+    'TOKEN_CACHE_TTL': 60,
+    # Alias of the django cache holding the cached menu and category responses and the invalidation markers,
+    # it has to be shared by all worker processes
+    'RESPONSE_CACHE_ALIAS': 'default',
+    # Seconds for which a cached menu or category response is kept
+    'RESPONSE_CACHE_TTL': 600,
+    # Seconds a request waits for another request rebuilding the same response
+    'RESPONSE_CACHE_LOCK_TIMEOUT': 5,
+    # SQLite file holding the token buckets of the throttle, shared by all worker processes of the deployment.
+    # None keeps the buckets in 'throttle.sqlite3' inside the 'BASE_DIR' of the project
+    'THROTTLE_DATABASE': None,
+    # Whether GET lists are rendered from precompiled read plans instead of the serializers
+    'FAST_LIST_SERIALIZATION': True,
+    # Whether the performance middleware measures requests, when disabled it removes itself from the stack
+    'PERFORMANCE_METRICS': False,
+    # Seconds after which a request is logged as slow together with its SQL
+    'SLOW_REQUEST_SECONDS': 0.5,
+    # Database aliases of the read replicas, requests are spread over them in turn
+    'READ_REPLICAS': [],
+    # Seconds after a write during which the reads of the same client go to the primary database
+    'PRIMARY_PIN_SECONDS': 5,
+    # Seconds of silence after which an order event stream sends a keep-alive comment
+    'EVENT_STREAM_KEEPALIVE_SECONDS': 15,
+    # Integrations receiving the order events through the outbox, keyed by name, e.g.
+    # {'kitchen': {'url': 'http://printer.local/orders', 'topics': ['order.created'], 'concurrency': 2, 'secret': '...'}}
+    # or {'audit': {'sink': 'LittleLemonAPI.outbox.log_sink'}}
+    'OUTBOX_DESTINATIONS': {},
+    # Failed deliveries after which an outbox event is given up
+    'OUTBOX_MAX_ATTEMPTS': 8,
+    # Delay before the first retry of an outbox event, doubled for every further attempt
+    'OUTBOX_BACKOFF_SECONDS': 2,
+    # Longest delay between two attempts of an outbox event
+    'OUTBOX_BACKOFF_MAX_SECONDS': 600,
+    # Days after which delivered orders are moved into the archive tables by 'archive_orders'
+    'ARCHIVE_AFTER_DAYS': 180,
+}
+
+
+def get_setting(name):
+    """
+    Method to read a single value from the 'LITTLELEMON' settings dictionary.
+    The settings are read on every call so that 'override_settings' works in tests
+
+    Args:
+        name (str): name of the setting to read
+
+    Returns:
+        object: value from the project settings if present else the default value
+    """
+
+    return getattr(settings, 'LITTLELEMON', {}).get(name, DEFAULTS[name])
@@ -0,0 +1,146 @@
+import asyncio
+import itertools
+import threading
+from django.db import transaction
+
+# Events kept for a slow subscriber before it is told to resynchronize
+SUBSCRIPTION_QUEUE_SIZE = 100
+
+# Marker put into the queue of a subscriber which lost events
+RESYNC = object()
+
+
+def order_event(order_id, user_id, status, delivery_crew_id, updated_at):
+    """
+    Method to build the event announcing the current state of an order
+
+    Returns:
+        dict: event payload
+    """
+
+    return {
+        'id': order_id,
+        'user': user_id,
+        'status': bool(status),
+        'delivery_crew': delivery_crew_id,
+        'updated_at': updated_at.isoformat() if updated_at is not None else None,
+    }
+
+
+
+class Subscription:
+    """
+    Event queue of a single stream, bound to the event loop of the connection serving it
+    """
+
+    def __init__(self, role, user_id, order_id=None):
+        """
+        Constructor for the subscription object, has to be created inside the event loop of the stream
+
+        Args:
+            role (str): 'manager', 'crew' or 'customer', deciding which orders are visible
+            user_id (int): id of the subscribed user
+            order_id (int, optional): id of the only order of interest. Defaults to every visible order.
+        """
+
+        self.role = role
+        self.user_id = user_id
+        self.order_id = order_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(SUBSCRIPTION_QUEUE_SIZE)
+
+
+    @property
+    def key(self):
+        return ('manager',) if self.role == 'manager' else (self.role, self.user_id)
+
+
+    def deliver(self, event):
+        """
+        Method to hand an event over to the loop of the stream, safe to call from any thread
+        """
+
+        if self.order_id is None or self.order_id == event['id']:
+            self.loop.call_soon_threadsafe(self.put, event)
+
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull: # Slow client, its queue is replaced by a request to resynchronize
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+
+
+class OrderBroker:
+    """
+    Process-wide publish/subscribe hub of order changes.
+    Subscriptions are indexed by the audience they belong to, so publishing an event only touches
+    the managers, the crew member and the customer of the order, never every open stream
+    """
+
+    def __init__(self):
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+        self._sequence = itertools.count(1)
+
+
+    def subscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.setdefault(subscription.key, set()).add(subscription)
+
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.key)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.key]
+
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+    def publish(self, event):
+        """
+        Method to deliver an order event to every stream allowed to see the order,
+        following the rules of the order list: managers see every order, crew members
+        the orders assigned to them and customers their own orders
+
+        Args:
+            event (dict): payload built by 'order_event()'
+        """
+
+        event = {**event, 'sequence': next(self._sequence)}
+        keys = [('manager',), ('customer', event['user'])]
+        if event['delivery_crew'] is not None:
+            keys.append(('crew', event['delivery_crew']))
+        with self._lock:
+            subscriptions = [subscription for key in keys for subscription in self._subscriptions.get(key, ())]
+        for subscription in subscriptions:
+            try:
+                subscription.deliver(event)
+            except RuntimeError: # Loop of the stream is already closed
+                self.unsubscribe(subscription)
+
+
+    def publish_on_commit(self, events):
+        """
+        Method to publish events once the current transaction commits, so rolled back changes are never announced
+
+        Args:
+            events (list): payloads built by 'order_event()'
+        """
+
+        if events:
+            transaction.on_commit(lambda: [self.publish(event) for event in events])
+
+
+
+# Broker of this process, streams only see the changes made by the same server process
+broker = OrderBroker()
@@ -0,0 +1,249 @@
+"""
+Helpers shared by the benchmark management commands.
+Benchmarks run against a throwaway copy of the schema so the project database is never touched
+"""
+
+import contextlib
+import os
+import random
+import resource
+import tempfile
+import time
+from datetime import date, timedelta
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User, Group
+from django.db import connection, transaction
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.views import APIView
+from LittleLemonAPI.async_views import AsyncListView
+from LittleLemonAPI.models import Category, MenuItem, Cart, Order, OrderItem
+from LittleLemonAPI.roles import MANAGER, DELIVERY_CREW
+
+# Words used for generating realistic menu item titles
+WORDS = [
+    'lemon', 'garlic', 'grilled', 'chicken', 'salmon', 'pasta', 'basil', 'tomato', 'greek', 'salad',
+    'bruschetta', 'olive', 'feta', 'lamb', 'souvlaki', 'risotto', 'mushroom', 'spinach', 'pita', 'hummus',
+    'baklava', 'tiramisu', 'gelato', 'espresso', 'orange', 'honey', 'almond', 'pistachio', 'octopus', 'calamari',
+]
+
+
+@contextlib.contextmanager
+def scratch_database():
+    """
+    Context manager creating a temporary file based test database for the duration of a benchmark
+
+    Yields:
+        str: name of the temporary database
+    """
+
+    old_name = connection.settings_dict['NAME']
+    path = None
+    if connection.vendor == 'sqlite': # Using a file so large datasets do not live in process memory
+        handle, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        connection.settings_dict['TEST'] = {**connection.settings_dict.get('TEST', {}), 'NAME': path}
+
+    setup_test_environment()
+    name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield name
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+@contextlib.contextmanager
+def unthrottled():
+    """
+    Context manager switching the throttles of all API views off, so a benchmark measures the views only
+    """
+
+    throttles = APIView.throttle_classes, AsyncListView.throttle_classes
+    APIView.throttle_classes = AsyncListView.throttle_classes = []
+    try:
+        yield
+    finally:
+        APIView.throttle_classes, AsyncListView.throttle_classes = throttles
+
+
+def current_rss():
+    """
+    Method to read the resident set size of the process
+
+    Returns:
+        int: resident memory in bytes
+    """
+
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError: # Falling back to the peak value where '/proc' is not available
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Timer:
+    """
+    Context manager measuring the wall clock time of a block in seconds
+    """
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.elapsed = 0.0
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+
+
+def insert_statement(model, columns):
+    """
+    Method to build the parameterized 'INSERT' statement of a single row
+
+    Args:
+        model (Model): model whose table receives the rows
+        columns (list): column names in the order of the row values
+
+    Returns:
+        str: statement for 'executemany'
+    """
+
+    return 'INSERT INTO {} ({}) VALUES ({})'.format(
+        connection.ops.quote_name(model._meta.db_table),
+        ', '.join(connection.ops.quote_name(column) for column in columns),
+        ', '.join(['%s'] * len(columns)),
+    )
+
+
+def insert_rows(model, columns, rows, batch_size=5000):
+    """
+    Method to insert plain rows into the table of a model with batched 'executemany' calls
+
+    Args:
+        model (Model): model whose table receives the rows
+        columns (list): column names in the order of the row values
+        rows (Iterable[tuple]): rows to be inserted
+        batch_size (int, optional): rows sent per call. Defaults to 5000.
+    """
+
+    sql = insert_statement(model, columns)
+    batch = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                cursor.executemany(sql, batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+
+
+def seed_users(customers=10, crews=2):
+    """
+    Method to create the role groups, a manager and the requested customers and crew members
+
+    Returns:
+        dict: lists of users against 'manager', 'crew' and 'customer'
+    """
+
+    managers, _ = Group.objects.get_or_create(name=MANAGER)
+    crew_group, _ = Group.objects.get_or_create(name=DELIVERY_CREW)
+    password = make_password('lemon@bench!') # Hashing once for every user
+    users = {
+        'manager': [User.objects.create(username='bench-manager', password=password)],
+        'crew': User.objects.bulk_create([User(username=f'bench-crew-{i}', password=password) for i in range(crews)]),
+        'customer': User.objects.bulk_create([User(username=f'bench-customer-{i}', password=password) for i in range(customers)]),
+    }
+    managers.user_set.add(*users['manager'])
+    crew_group.user_set.add(*users['crew'])
+    for user in [user for group in users.values() for user in group]:
+        Token.objects.create(user=user)
+    return users
+
+
+def seed_menu(items, categories=10, seed=0):
+    """
+    Method to create categories and menu items
+
+    Args:
+        items (int): number of menu items to create
+        categories (int, optional): number of categories. Defaults to 10.
+        seed (int, optional): seed of the random generator. Defaults to 0.
+
+    Returns:
+        list: ids of the created menu items
+    """
+
+    rng = random.Random(seed)
+    category_ids = [
+        category.pk for category in Category.objects.bulk_create([
+            Category(slug=f'category-{i}', title=f'Category {i}') for i in range(categories)
+        ])
+    ]
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    insert_rows(MenuItem, ['title', 'price', 'featured', 'category_id', 'updated_at'], (
+        (f'{" ".join(rng.sample(WORDS, 3)).title()} {i}', f'{rng.uniform(2, 60):.2f}', rng.random() < 0.1, rng.choice(category_ids), now)
+        for i in range(items)
+    ))
+    return list(MenuItem.objects.values_list('id', flat=True))
+
+
+def seed_orders(orders, users, menuitem_ids, lines=3, days=365, seed=0):
+    """
+    Method to create orders with their items spread over the given number of past days
+
+    Args:
+        orders (int): number of orders to create
+        users (dict): users returned by 'seed_users'
+        menuitem_ids (list): ids of the menu items available for ordering
+        lines (int, optional): items in every order. Defaults to 3.
+        days (int, optional): days over which the order dates are spread. Defaults to 365.
+        seed (int, optional): seed of the random generator. Defaults to 0.
+    """
+
+    rng = random.Random(seed)
+    today = date.today()
+    customer_ids = [user.pk for user in users['customer']]
+    crew_ids = [user.pk for user in users['crew']]
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    first_id = (Order.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+
+    insert_rows(Order, ['id', 'user_id', 'delivery_crew_id', 'status', 'total', 'date', 'updated_at'], (
+        (first_id + i, rng.choice(customer_ids), rng.choice(crew_ids), rng.random() < 0.8,
+         f'{rng.uniform(5, 200):.2f}', today - timedelta(days=rng.randrange(days)), now)
+        for i in range(orders)
+    ))
+    insert_rows(OrderItem, ['order_id', 'menuitem_id', 'quantity', 'unit_price', 'price'], (
+        (first_id + i, menuitem_id, 1, '9.99', '9.99')
+        for i in range(orders)
+        for menuitem_id in rng.sample(menuitem_ids, min(lines, len(menuitem_ids)))
+    ))
+
+
+def seed_carts(carts, users, menuitem_ids, seed=0):
+    """
+    Method to fill the carts of the customers, spreading the cart rows evenly over the customers
+
+    Args:
+        carts (int): number of cart rows to create
+        users (dict): users returned by 'seed_users'
+        menuitem_ids (list): ids of the menu items available for adding
+        seed (int, optional): seed of the random generator. Defaults to 0.
+    """
+
+    rng = random.Random(seed)
+    customer_ids = [user.pk for user in users['customer']]
+    per_customer = min(len(menuitem_ids), -(-carts // len(customer_ids)))
+
+    def rows():
+        remaining = carts
+        for customer_id in customer_ids:
+            for menuitem_id in rng.sample(menuitem_ids, min(per_customer, remaining)):
+                yield (customer_id, menuitem_id, 1, '9.99', '9.99')
+            remaining -= min(per_customer, remaining)
+
+    insert_rows(Cart, ['user_id', 'menuitem_id', 'quantity', 'unit_price', 'price'], rows())
+
@@ -0,0 +1,39 @@
+import time
+from django.core.management.base import BaseCommand
+from LittleLemonAPI.archive import archive_batch, archive_cutoff
+from LittleLemonAPI.conf import get_setting
+from ._bench import Timer
+
+
+class Command(BaseCommand):
+    """
+    Management command moving delivered orders older than 'ARCHIVE_AFTER_DAYS' into the archive tables.
+    Every batch commits on its own, so the command can be stopped at any time and run again to resume
+    """
+
+    help = 'Move delivered orders older than ARCHIVE_AFTER_DAYS into the archive tables'
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='orders moved per transaction')
+        parser.add_argument('--max-orders', type=int, default=None, help='stop after about this many orders')
+        parser.add_argument('--pause', type=float, default=0, help='seconds to wait between batches, leaves room for live writes')
+
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff()
+        self.stdout.write(f'Archiving delivered orders placed before {cutoff} ({get_setting("ARCHIVE_AFTER_DAYS")} days)')
+        moved = items = 0
+        last_id = 0
+        with Timer() as timer:
+            while options['max_orders'] is None or moved < options['max_orders']:
+                orders, order_items, last_id = archive_batch(cutoff, last_id, options['batch_size'])
+                if last_id is None:
+                    break
+                moved += orders
+                items += order_items
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'  {moved} orders archived, up to id {last_id}')
+                if options['pause']:
+                    time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} orders with {items} items in {timer.elapsed:.1f}s'))
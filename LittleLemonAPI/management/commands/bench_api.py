@@ -0,0 +1,330 @@
+import http.client
+import io
+import json
+import logging
+import random
+import statistics
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from socketserver import ThreadingMixIn
+from urllib.parse import urlsplit
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.urls import resolve, Resolver404
+from rest_framework.authtoken.models import Token
+from LittleLemonAPI.models import Order
+from LittleLemonAPI.sales import rebuild_sales_rollup
+from ._bench import WORDS, scratch_database, seed_users, seed_menu, seed_orders, seed_carts, unthrottled, Timer
+
+
+# Dataset sizes of the scale presets: menu items, orders and cart rows
+SCALES = {
+    'small': (1000, 1000, 1000),
+    'medium': (100000, 100000, 100000),
+    'large': (1000000, 1000000, 1000000),
+}
+
+
+class QueryCounter:
+    """
+    Database execute wrapper counting the queries of the current request
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+
+class CountingApplication:
+    """
+    WSGI application wrapping the Django handler, the queries of every request are reported in a response header
+    """
+
+    header = 'X-Bench-Queries'
+
+
+    def __init__(self):
+        self.handler = WSGIHandler()
+
+
+    def __call__(self, environ, start_response):
+        counter = QueryCounter()
+
+        def start(status, headers, exc_info=None):
+            return start_response(status, headers + [(self.header, str(counter.count))], exc_info)
+
+        with connection.execute_wrapper(counter):
+            return self.handler(environ, start)
+
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+
+class ThreadingServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+
+class Command(BaseCommand):
+    """
+    Management command replaying role specific traffic against every API route.
+    Requests go through the WSGI handler in-process or over HTTP to a local threaded server,
+    throughput, latency percentiles and queries per request are reported per route
+    """
+
+    help = 'Benchmark the API routes with customer, delivery crew and manager traffic mixes'
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='small', help='dataset size preset')
+        parser.add_argument('--items', type=int, help='number of menu items, overrides the preset')
+        parser.add_argument('--orders', type=int, help='number of orders, overrides the preset')
+        parser.add_argument('--carts', type=int, help='number of cart rows, overrides the preset')
+        parser.add_argument('--customers', type=int, default=200, help='number of customers')
+        parser.add_argument('--crews', type=int, default=10, help='number of delivery crew members')
+        parser.add_argument('--mix', default='customer=70,crew=20,manager=10', help='weights of the role journeys')
+        parser.add_argument('--requests', type=int, default=2000, help='requests sent in total')
+        parser.add_argument('--concurrency', type=int, default=8, help='virtual users sending requests at the same time')
+        parser.add_argument('--mode', choices=['inprocess', 'server'], default='inprocess', help='how requests reach the views')
+        parser.add_argument('--seed', type=int, default=0, help='seed of the data and traffic generators')
+        parser.add_argument('--output', help='JSON file receiving the results')
+
+
+    def handle(self, *args, **options):
+        items, orders, carts = SCALES[options['scale']]
+        items, orders, carts = options['items'] or items, options['orders'] or orders, options['carts'] or carts
+        mix = {role: int(weight) for role, weight in (part.split('=') for part in options['mix'].split(','))}
+
+        with scratch_database(), unthrottled():
+            with Timer() as seeding:
+                users = seed_users(customers=options['customers'], crews=options['crews'])
+                menuitem_ids = seed_menu(items, seed=options['seed'])
+                seed_orders(orders, users, menuitem_ids, seed=options['seed'])
+                seed_carts(carts, users, menuitem_ids, seed=options['seed'])
+                rebuild_sales_rollup()
+            self.stdout.write(f'Seeded {items} menu items, {orders} orders and {carts} cart rows in {seeding.elapsed:.1f}s')
+
+            self.tokens = dict(Token.objects.values_list('user_id', 'key'))
+            self.users = users
+            self.menuitem_ids = menuitem_ids
+            self.crew_orders = {
+                user.pk: list(Order.objects.filter(delivery_crew=user).values_list('id', flat=True)[:200]) for user in users['crew']
+            }
+            self.order_ids = list(Order.objects.values_list('id', flat=True)[:5000])
+
+            app = CountingApplication()
+            if options['mode'] == 'server':
+                server = make_server('127.0.0.1', 0, app, server_class=ThreadingServer, handler_class=QuietRequestHandler)
+                threading.Thread(target=server.serve_forever, daemon=True).start()
+                send = self.server_sender(app, server.server_address)
+            else:
+                send = self.inprocess_sender(app)
+
+            logger = logging.getLogger('django.request')
+            level = logger.level
+            logger.setLevel(logging.CRITICAL) # Failed requests are counted in the results instead of being logged
+            try:
+                with Timer() as timer:
+                    samples = self.replay(send, mix, options)
+            finally:
+                logger.setLevel(level)
+                if options['mode'] == 'server':
+                    server.shutdown()
+
+        results = self.summarize(samples, timer.elapsed)
+        results.update(
+            commit=self.get_commit(), mode=options['mode'], concurrency=options['concurrency'], mix=mix,
+            dataset={'menu_items': items, 'orders': orders, 'carts': carts, 'customers': options['customers'], 'crews': options['crews']},
+        )
+        self.print_results(results)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+
+    def journeys(self, role, user, rng):
+        """
+        Method to build the requests of a single journey of a role
+
+        Args:
+            role (str): 'customer', 'crew' or 'manager'
+            user (User): user sending the requests
+            rng (Random): random generator of the virtual user
+
+        Returns:
+            list: tuples of method, path and JSON body
+        """
+
+        if role == 'customer':
+            menuitem_id = rng.choice(self.menuitem_ids)
+            return [
+                ('GET', '/api/categories', None),
+                ('GET', f'/api/menu-items?page={rng.randint(1, 50)}', None),
+                ('GET', f'/api/menu-items?search={rng.choice(WORDS)}', None),
+                ('POST', '/api/cart/menu-items', {'menuitem_id': menuitem_id, 'quantity': 1}),
+                ('GET', '/api/cart/menu-items', None),
+                ('POST', '/api/orders', None),
+                ('GET', '/api/orders', None),
+            ]
+        if role == 'crew':
+            order_ids = self.crew_orders.get(user.pk) or self.order_ids
+            return [
+                ('GET', '/api/orders', None),
+                ('PATCH', f'/api/orders/{rng.choice(order_ids)}', {'status': rng.random() < 0.5}),
+                ('GET', '/api/orders?pagination=cursor', None),
+            ]
+        start = date.today() - timedelta(days=rng.randint(7, 90))
+        return [
+            ('GET', '/api/orders?page_size=50', None),
+            ('GET', f'/api/reports/sales?start={start.isoformat()}', None),
+            ('POST', '/api/orders/dispatch', {
+                'orders': rng.sample(self.order_ids, min(20, len(self.order_ids))),
+                'delivery_crew': rng.choice(self.users['crew']).pk,
+            }),
+            ('GET', '/api/menu-items?ordering=-price', None),
+        ]
+
+
+    def replay(self, send, mix, options):
+        """
+        Method to run the virtual users until the requested number of requests is sent
+
+        Returns:
+            list: tuples of route name, latency, status code and query count
+        """
+
+        roles = list(mix)
+        weights = [mix[role] for role in roles]
+        users = {'customer': self.users['customer'], 'crew': self.users['crew'], 'manager': self.users['manager']}
+        budget = iter(range(options['requests']))
+        lock = threading.Lock()
+        samples = []
+
+        def virtual_user(index):
+            rng = random.Random(options['seed'] * 1000 + index)
+            while True:
+                role = rng.choices(roles, weights)[0]
+                user = users[role][index % len(users[role])] # Spreading customers so carts are not shared
+                for method, path, body in self.journeys(role, user, rng):
+                    with lock:
+                        if next(budget, None) is None:
+                            return
+                    sample = send(method, path, body, self.tokens[user.pk])
+                    with lock:
+                        samples.append(sample)
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            list(pool.map(virtual_user, range(options['concurrency'])))
+        return samples
+
+
+    def inprocess_sender(self, app):
+        def send(method, path, body, token):
+            parts = urlsplit(path)
+            payload = json.dumps(body).encode() if body is not None else b''
+            environ = {
+                'REQUEST_METHOD': method, 'PATH_INFO': parts.path, 'QUERY_STRING': parts.query,
+                'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': 'testserver',
+                'HTTP_AUTHORIZATION': f'Token {token}', 'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(payload)),
+                'wsgi.input': io.BytesIO(payload), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+                'wsgi.version': (1, 0), 'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+            }
+            started = {}
+
+            def start_response(status, headers, exc_info=None):
+                started.update(headers, status=int(status.split()[0]))
+
+            with Timer() as timer:
+                response = app(environ, start_response)
+                b''.join(response)
+                response.close()
+            return self.route_name(parts.path), timer.elapsed, started['status'], int(started[app.header])
+        return send
+
+
+    def server_sender(self, app, address):
+        host, port = address
+
+        def send(method, path, body, token):
+            client = http.client.HTTPConnection(host, port, timeout=60)
+            headers = {'Host': 'testserver', 'Authorization': f'Token {token}', 'Content-Type': 'application/json'}
+            with Timer() as timer:
+                client.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+                response = client.getresponse()
+                response.read()
+            client.close()
+            return self.route_name(urlsplit(path).path), timer.elapsed, response.status, int(response.getheader(app.header, 0))
+        return send
+
+
+    def route_name(self, path):
+        try:
+            return resolve(path).url_name
+        except Resolver404:
+            return path
+
+
+    def summarize(self, samples, elapsed):
+        """
+        Method to aggregate the samples into throughput, latency percentiles and queries per request
+
+        Returns:
+            dict: results of all requests and of every route
+        """
+
+        def stats(group, seconds):
+            latencies = sorted(sample[1] for sample in group)
+            quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+            return {
+                'requests': len(group),
+                'throughput': round(len(group) / seconds, 1),
+                'p50_ms': round(quantiles[49] * 1000, 2),
+                'p95_ms': round(quantiles[94] * 1000, 2),
+                'p99_ms': round(quantiles[98] * 1000, 2),
+                'queries_per_request': round(sum(sample[3] for sample in group) / len(group), 2),
+                'errors': sum(1 for sample in group if sample[2] >= 500),
+                'statuses': {str(code): sum(1 for sample in group if sample[2] == code) for code in sorted({sample[2] for sample in group})},
+            }
+
+        routes = {}
+        for sample in samples:
+            routes.setdefault(sample[0], []).append(sample)
+        return {
+            'elapsed_s': round(elapsed, 2),
+            'overall': stats(samples, elapsed),
+            'routes': {name: stats(group, elapsed) for name, group in sorted(routes.items())},
+        }
+
+
+    def print_results(self, results):
+        overall = results['overall']
+        self.stdout.write(
+            f'{overall["requests"]} requests in {results["elapsed_s"]}s: {overall["throughput"]} req/s, '
+            f'p50 {overall["p50_ms"]} ms, p95 {overall["p95_ms"]} ms, p99 {overall["p99_ms"]} ms'
+        )
+        for name, route in results['routes'].items():
+            self.stdout.write(
+                f'  {name:<16} {route["requests"]:>6} req  p50 {route["p50_ms"]:>8} ms  p95 {route["p95_ms"]:>8} ms  '
+                f'p99 {route["p99_ms"]:>8} ms  {route["queries_per_request"]:>6} q/req  statuses {route["statuses"]}'
+            )
+
+
+    def get_commit(self):
+        try:
+            return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,96 @@
+import io
+import statistics
+from datetime import timedelta
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from LittleLemonAPI.conf import get_setting
+from LittleLemonAPI.models import Order, ArchivedOrder
+from ._bench import scratch_database, unthrottled, Timer
+
+
+class Command(BaseCommand):
+    """
+    Management command measuring the hot order endpoints before and after archiving.
+    The orders are seeded by 'seed_data' into a scratch database, every route is timed for one user
+    of each role, then 'archive_orders' runs and the same requests are timed again
+    """
+
+    help = 'Benchmark the order endpoints before and after moving old orders into the archive'
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=10000000, help='number of orders to seed')
+        parser.add_argument('--customers', type=int, default=1000, help='number of customers')
+        parser.add_argument('--crews', type=int, default=50, help='number of delivery crew members')
+        parser.add_argument('--days', type=int, default=1095, help='past days over which the orders are spread')
+        parser.add_argument('--workers', type=int, default=1, help='processes generating the orders')
+        parser.add_argument('--batch-size', type=int, default=5000, help='orders archived per transaction')
+        parser.add_argument('--repeat', type=int, default=20, help='timed requests per route')
+
+
+    def handle(self, *args, **options):
+        with scratch_database(), unthrottled():
+            with Timer() as timer:
+                call_command(
+                    'seed_data', orders=options['orders'], customers=options['customers'], crews=options['crews'],
+                    days=options['days'], workers=options['workers'], items=1000, carts=0, stdout=io.StringIO(),
+                )
+            self.stdout.write(f'Seeded {options["orders"]} orders over {options["days"]} days in {timer.elapsed:.1f}s')
+
+            tokens = dict(Token.objects.values_list('user__username', 'key'))
+            customer, crew, manager = (tokens[f'seed-{role}-0'] for role in ('customer', 'crew', 'manager'))
+            recent = timezone.localdate() - timedelta(days=7)
+            old = timezone.localdate() - timedelta(days=get_setting('ARCHIVE_AFTER_DAYS') + 30)
+            routes = [
+                ('customer orders', customer, '/api/orders'),
+                ('crew orders', crew, '/api/orders'),
+                ('manager orders', manager, '/api/orders'),
+                ('manager orders, no count', manager, '/api/orders?count=false'),
+                ('manager orders, cursor', manager, '/api/orders?pagination=cursor'),
+                ('customer last week', customer, f'/api/orders?start={recent}'),
+                ('async customer orders', customer, '/api/async/orders'),
+                ('customer old day', customer, f'/api/orders?date={old}'),
+                ('manager old day', manager, f'/api/orders?date={old}'),
+            ]
+
+            before = self.measure(routes, options['repeat'])
+            live = Order.objects.count()
+            with Timer() as timer:
+                call_command('archive_orders', batch_size=options['batch_size'], stdout=io.StringIO())
+            archived = ArchivedOrder.objects.count()
+            self.stdout.write(f'Archived {archived} of {live} orders in {timer.elapsed:.1f}s, {live - archived} stay live')
+            after = self.measure(routes, options['repeat'])
+
+            self.stdout.write(f'{"route":<28}{"before ms":>12}{"after ms":>12}{"speedup":>10}')
+            for name, _, _ in routes:
+                self.stdout.write(f'{name:<28}{before[name]:>12.2f}{after[name]:>12.2f}{before[name] / after[name]:>9.1f}x')
+
+
+    def measure(self, routes, repeat):
+        """
+        Method to time the routes, the first request of every route warms the caches and is not counted
+
+        Args:
+            routes (list): name, token and path of every route
+            repeat (int): timed requests per route
+
+        Returns:
+            dict: median latency in milliseconds against the route name
+        """
+
+        results = {}
+        for name, token, path in routes:
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+            response = client.get(path)
+            assert response.status_code == 200, (path, response.status_code)
+            timings = []
+            for _ in range(repeat):
+                with Timer() as timer:
+                    client.get(path)
+                timings.append(timer.elapsed * 1000)
+            results[name] = statistics.median(timings)
+        return results
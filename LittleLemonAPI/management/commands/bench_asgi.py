@@ -0,0 +1,111 @@
+import asyncio
+import io
+import statistics
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from rest_framework.authtoken.models import Token
+from ._bench import scratch_database, seed_users, seed_menu, seed_orders, unthrottled, Timer
+
+
+class Command(BaseCommand):
+    """
+    Management command comparing the sync views under WSGI with the async views under ASGI.
+    Both handlers are driven in-process at the same concurrency, WSGI with a thread per
+    in-flight request like a threaded server and ASGI with a task per in-flight request
+    """
+
+    help = 'Benchmark throughput and tail latency of the sync WSGI and async ASGI read endpoints'
+
+    # Pairs of sync and async paths of the same list
+    endpoints = [
+        ('/api/menu-items', '/api/async/menu-items'),
+        ('/api/orders', '/api/async/orders'),
+        ('/api/cart/menu-items', '/api/async/cart/menu-items'),
+    ]
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='requests sent per endpoint and mode')
+        parser.add_argument('--concurrency', type=int, default=64, help='requests in flight at the same time')
+        parser.add_argument('--orders', type=int, default=5000, help='number of seeded orders')
+
+
+    def handle(self, *args, **options):
+        with scratch_database(), unthrottled():
+            users = seed_users(customers=20)
+            seed_orders(options['orders'], users, seed_menu(500))
+            token = Token.objects.get(user=users['customer'][0]).key
+            for sync_path, async_path in self.endpoints:
+                for mode, path, run in (('wsgi', sync_path, self.run_wsgi), ('asgi', async_path, self.run_asgi)):
+                    with Timer() as timer:
+                        latencies = run(path, token, options['requests'], options['concurrency'])
+                    self.report(mode, path, latencies, timer.elapsed)
+
+
+    def run_wsgi(self, path, token, requests, concurrency):
+        handler = WSGIHandler()
+
+        def call(_):
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SERVER_NAME': 'testserver',
+                'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': 'testserver',
+                'HTTP_AUTHORIZATION': f'Token {token}', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+                'wsgi.url_scheme': 'http', 'wsgi.version': (1, 0), 'wsgi.multithread': True,
+                'wsgi.multiprocess': False, 'wsgi.run_once': False,
+            }
+            with Timer() as timer:
+                response = handler(environ, lambda status, headers: None)
+                b''.join(response)
+                response.close()
+            return timer.elapsed
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return list(pool.map(call, range(requests)))
+
+
+    def run_asgi(self, path, token, requests, concurrency):
+        handler = ASGIHandler()
+
+        async def call(limit):
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+                'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+                'headers': [(b'host', b'testserver'), (b'authorization', f'Token {token}'.encode())],
+                'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+            }
+            received = asyncio.Event()
+            done = asyncio.Event()
+
+            async def receive():
+                if not received.is_set():
+                    received.set()
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await done.wait() # The client stays connected until the response is complete
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.body' and not message.get('more_body'):
+                    done.set()
+
+            async with limit:
+                with Timer() as timer:
+                    await handler(scope, receive, send)
+            return timer.elapsed
+
+        async def main():
+            limit = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*(call(limit) for _ in range(requests)))
+
+        return asyncio.run(main())
+
+
+    def report(self, mode, path, latencies, elapsed):
+        latencies = sorted(latencies)
+        quantiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f'{mode} {path}: {len(latencies) / elapsed:,.0f} req/s, p50 {quantiles[49] * 1000:.1f} ms, '
+            f'p95 {quantiles[94] * 1000:.1f} ms, p99 {quantiles[98] * 1000:.1f} ms'
+        )
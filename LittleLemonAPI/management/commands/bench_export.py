@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIClient
+from ._bench import scratch_database, seed_users, seed_menu, seed_orders, current_rss, Timer
+
+
+class Command(BaseCommand):
+    """
+    Management command benchmarking the streaming order export.
+    Reports exported rows per second and the resident memory while streaming
+    """
+
+    help = 'Benchmark the streaming CSV / NDJSON order export'
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=100000, help='number of orders to seed (use 1000000 for the full run)')
+        parser.add_argument('--lines', type=int, default=3, help='items in every order')
+        parser.add_argument('--type', choices=['csv', 'ndjson'], action='append', help='export formats to measure')
+
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            users = seed_users()
+            seed_orders(options['orders'], users, seed_menu(200), lines=options['lines'])
+
+            client = APIClient()
+            client.force_authenticate(user=users['manager'][0])
+            for export_type in options['type'] or ['csv', 'ndjson']:
+                baseline = peak = current_rss()
+                size = chunks = 0
+                with Timer() as timer:
+                    response = client.get('/api/orders/export', {'type': export_type})
+                    for chunk in response.streaming_content:
+                        size += len(chunk)
+                        chunks += 1
+                        if chunks % 50 == 0: # Sampling the memory while streaming
+                            peak = max(peak, current_rss())
+                peak = max(peak, current_rss())
+
+                rows = options['orders'] * options['lines']
+                self.stdout.write(
+                    f'{export_type}: {rows} rows in {timer.elapsed:.2f}s '
+                    f'({rows / timer.elapsed:,.0f} rows/s, {size / 2 ** 20:.1f} MiB), '
+                    f'rss {baseline / 2 ** 20:.1f} MiB -> peak {peak / 2 ** 20:.1f} MiB'
+                )
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from LittleLemonAPI.models import MenuItem, Category, Cart, Order
+from LittleLemonAPI.projections import get_plan
+from LittleLemonAPI.renderers import ORJSONRenderer, MessagePackRenderer
+from LittleLemonAPI.serializers import MenuItemSerializer, CategorySerializer, CartSerializer, OrderSerializer
+from ._bench import scratch_database, seed_users, seed_menu, seed_orders, insert_rows, Timer
+
+
+class Command(BaseCommand):
+    """
+    Management command comparing the renderers on the list payloads of the endpoints
+    """
+
+    help = 'Benchmark the stdlib JSON, orjson and MessagePack renderers per endpoint payload'
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000, help='number of rows rendered per payload')
+        parser.add_argument('--repeat', type=int, default=5, help='runs per renderer, the best one is reported')
+
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        with scratch_database():
+            users = seed_users(customers=1)
+            menuitem_ids = seed_menu(rows)
+            seed_orders(rows, users, menuitem_ids)
+            customer = users['customer'][0]
+            insert_rows(Cart, ['user_id', 'menuitem_id', 'quantity', 'unit_price', 'price'], (
+                (customer.pk, menuitem_id, 2, '4.50', '9.00') for menuitem_id in menuitem_ids
+            ))
+
+            payloads = [
+                ('/api/categories', CategorySerializer, Category.objects.order_by('pk')),
+                ('/api/menu-items', MenuItemSerializer, MenuItem.objects.order_by('pk')),
+                ('/api/cart/menu-items', CartSerializer, Cart.objects.order_by('pk')),
+                ('/api/orders', OrderSerializer, Order.objects.order_by('pk')),
+            ]
+            renderers = [('json', JSONRenderer()), ('orjson', ORJSONRenderer()), ('msgpack', MessagePackRenderer())]
+            for endpoint, serializer_class, queryset in payloads:
+                plan = get_plan(serializer_class)
+                data = plan.render(list(plan.project(queryset)))
+                results = []
+                for name, renderer in renderers:
+                    elapsed = min(self.measure(renderer, data) for _ in range(options['repeat']))
+                    results.append(f'{name} {len(data) / elapsed:,.0f} rows/s {len(renderer.render(data)) / len(data):.0f} B/row')
+                self.stdout.write(f'{endpoint} ({len(data)} rows): ' + ', '.join(results))
+
+
+    def measure(self, renderer, data):
+        with Timer() as timer:
+            renderer.render(data)
+        return timer.elapsed
@@ -0,0 +1,45 @@
+import random
+from django.core.management.base import BaseCommand
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from LittleLemonAPI.models import MenuItem
+from LittleLemonAPI.search import MenuSearchFilter
+from LittleLemonAPI.views import MenuItemsView
+from ._bench import WORDS, scratch_database, seed_menu, Timer
+
+
+class Command(BaseCommand):
+    """
+    Management command comparing the full-text menu search with the 'LIKE' based 'SearchFilter'
+    """
+
+    help = 'Benchmark the full-text menu search against SearchFilter'
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=100000, help='number of menu items to seed')
+        parser.add_argument('--queries', type=int, default=200, help='number of searches per backend')
+
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        with scratch_database():
+            seed_menu(options['items'])
+
+            searches = [' '.join(rng.sample(WORDS, rng.randint(1, 2)))[:rng.randint(3, 12)] for _ in range(options['queries'])]
+            view = MenuItemsView()
+            factory = APIRequestFactory()
+            backends = [('SearchFilter', SearchFilter, ''), ('MenuSearchFilter', MenuSearchFilter, ''), ('MenuSearchFilter typo', MenuSearchFilter, '&search_mode=typo')]
+            for name, backend, extra in backends:
+                hits = 0
+                with Timer() as timer:
+                    for search in searches:
+                        request = Request(factory.get(f'/api/menu-items?search={search}{extra}'))
+                        queryset = backend().filter_queryset(request, MenuItem.objects.all(), view)
+                        hits += queryset.count()
+                        list(queryset[:10])
+                self.stdout.write(
+                    f'{name}: {len(searches)} searches over {options["items"]} items in {timer.elapsed:.2f}s '
+                    f'({timer.elapsed / len(searches) * 1000:.2f} ms/search, {hits} hits)'
+                )
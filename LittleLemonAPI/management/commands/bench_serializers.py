@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from LittleLemonAPI.models import MenuItem, Cart, Order
+from LittleLemonAPI.projections import get_plan
+from LittleLemonAPI.serializers import MenuItemSerializer, CartSerializer, OrderSerializer
+from LittleLemonAPI.views import ORDER_ITEMS_PREFETCH
+from ._bench import scratch_database, seed_users, seed_menu, seed_orders, insert_rows, Timer
+
+
+class Command(BaseCommand):
+    """
+    Management command comparing the list rendering of the model serializers with their precompiled read plans
+    """
+
+    help = 'Benchmark ModelSerializer list rendering against the projected read path'
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000, help='number of rows rendered per list')
+        parser.add_argument('--repeat', type=int, default=3, help='runs per path, the best one is reported')
+
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        with scratch_database():
+            users = seed_users(customers=1)
+            menuitem_ids = seed_menu(rows)
+            seed_orders(rows, users, menuitem_ids)
+            customer = users['customer'][0]
+            insert_rows(Cart, ['user_id', 'menuitem_id', 'quantity', 'unit_price', 'price'], (
+                (customer.pk, menuitem_id, 2, '4.50', '9.00') for menuitem_id in menuitem_ids
+            ))
+
+            lists = [
+                (MenuItemSerializer, MenuItem.objects.select_related('category').order_by('pk')),
+                (CartSerializer, Cart.objects.select_related('user', 'menuitem__category').order_by('pk')),
+                (OrderSerializer, Order.objects.prefetch_related(ORDER_ITEMS_PREFETCH).order_by('pk')),
+            ]
+            for serializer_class, queryset in lists:
+                plan = get_plan(serializer_class)
+                serializer_time = min(self.measure(lambda: serializer_class(list(queryset), many=True).data) for _ in range(options['repeat']))
+                plan_time = min(self.measure(lambda: plan.render(list(plan.project(queryset)))) for _ in range(options['repeat']))
+                self.stdout.write(
+                    f'{serializer_class.__name__}: serializer {rows / serializer_time:,.0f} rows/s, '
+                    f'projection {rows / plan_time:,.0f} rows/s ({serializer_time / plan_time:.1f}x)'
+                )
+
+
+    def measure(self, render):
+        with Timer() as timer:
+            render()
+        return timer.elapsed
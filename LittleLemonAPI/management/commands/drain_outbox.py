@@ -0,0 +1,49 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from LittleLemonAPI.conf import get_setting
+from LittleLemonAPI.models import OutboxEvent
+from LittleLemonAPI.outbox import OutboxDrain
+
+
+class Command(BaseCommand):
+    """
+    Management command delivering the outbox events to the configured integrations.
+    Runs as a long-lived worker polling for due events, or drains what is due and exits with '--once'
+    """
+
+    help = 'Deliver the outbox events to the destinations of OUTBOX_DESTINATIONS'
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='events claimed per batch')
+        parser.add_argument('--interval', type=float, default=1.0, help='seconds to wait when no event is due')
+        parser.add_argument('--once', action='store_true', help='exit once no event is due instead of polling')
+        parser.add_argument('--retry-failed', action='store_true', help='schedule the given up events again before draining')
+
+
+    def handle(self, *args, **options):
+        if not get_setting('OUTBOX_DESTINATIONS'):
+            raise CommandError('No outbox destinations are configured, add them to OUTBOX_DESTINATIONS')
+        if options['retry_failed']:
+            count = OutboxEvent.objects.filter(failed=True).update(failed=False, attempts=0, next_attempt_at=timezone.now())
+            self.stdout.write(f'Scheduled {count} failed events again')
+
+        drain = OutboxDrain(batch_size=options['batch_size'])
+        totals = [0, 0]
+        try:
+            while True:
+                claimed, delivered, failed = drain.drain_once()
+                totals[0] += delivered
+                totals[1] += failed
+                if claimed:
+                    self.stdout.write(f'Delivered {delivered} events, {failed} failed')
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            drain.close()
+        self.stdout.write(self.style.SUCCESS(f'Outbox drained: {totals[0]} delivered, {totals[1]} failed deliveries'))
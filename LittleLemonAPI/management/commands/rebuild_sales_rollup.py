@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from LittleLemonAPI.sales import rebuild_sales_rollup
+
+
+class Command(BaseCommand):
+    """
+    Management command rebuilding the daily sales rollup tables from the order history
+    """
+
+    help = 'Rebuild the daily sales rollup tables from scratch'
+
+
+    def handle(self, *args, **options):
+        days, day_items = rebuild_sales_rollup()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the sales rollup: {days} days, {day_items} menu item days'))
@@ -0,0 +1,295 @@
+import contextlib
+import multiprocessing
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User, Group
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from LittleLemonAPI.cache import bump_menu_version
+from LittleLemonAPI.models import Category, MenuItem, Cart, Order, OrderItem
+from LittleLemonAPI.roles import MANAGER, DELIVERY_CREW, invalidate_roles
+from LittleLemonAPI.sales import rebuild_sales_rollup
+from ._bench import WORDS, Timer, insert_rows, insert_statement
+
+
+# Columns written for the generated orders and their items
+ORDER_COLUMNS = ['id', 'user_id', 'delivery_crew_id', 'status', 'total', 'date', 'updated_at']
+ITEM_COLUMNS = ['order_id', 'menuitem_id', 'quantity', 'unit_price', 'price']
+
+
+def generate_orders(task):
+    """
+    Method to generate the rows of a chunk of orders and their items.
+    Runs in the worker processes, every chunk has a random generator of its own,
+    so the data only depends on the seed and never on the number of workers
+
+    Args:
+        task (tuple): seed, chunk index, first order id, number of orders and the shared generation context
+
+    Returns:
+        tuple: order rows and item rows of the chunk
+    """
+
+    seed, index, first_id, count, context = task
+    rng = random.Random(f'{seed}:orders:{index}')
+    menu, customer_ids, crew_ids, lines, days, today, now = context
+    orders, items = [], []
+    for order_id in range(first_id, first_id + count):
+        total = Decimal(0)
+        for menuitem_id, price in rng.sample(menu, rng.randint(1, lines)):
+            quantity = rng.randint(1, 3)
+            total += price * quantity
+            items.append((order_id, menuitem_id, quantity, str(price), str(price * quantity)))
+        delivered = rng.random() < 0.8
+        orders.append((
+            order_id, rng.choice(customer_ids), rng.choice(crew_ids) if delivered or rng.random() < 0.5 else None,
+            delivered, str(total), (today - timedelta(days=rng.randrange(days))).isoformat(), now,
+        ))
+    return orders, items
+
+
+
+class Command(BaseCommand):
+    """
+    Management command loading large amounts of realistic data into the project database.
+    Users, groups, categories and menu items are created with batched 'bulk_create()',
+    orders, their items and carts are generated in chunks, optionally by worker processes,
+    and written with batched 'executemany()' calls
+    """
+
+    help = 'Seed users, menu, carts and orders in bulk with a deterministic seed'
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=1000, help='number of customers')
+        parser.add_argument('--crews', type=int, default=50, help='number of delivery crew members')
+        parser.add_argument('--managers', type=int, default=5, help='number of managers')
+        parser.add_argument('--categories', type=int, default=20, help='number of categories')
+        parser.add_argument('--items', type=int, default=10000, help='number of menu items')
+        parser.add_argument('--orders', type=int, default=100000, help='number of orders')
+        parser.add_argument('--lines', type=int, default=5, help='largest number of items in an order')
+        parser.add_argument('--carts', type=int, default=5000, help='number of cart rows')
+        parser.add_argument('--days', type=int, default=365, help='past days over which the orders are spread')
+        parser.add_argument('--seed', type=int, default=0, help='seed of the random generators')
+        parser.add_argument('--batch-size', type=int, default=10000, help='rows written per batch')
+        parser.add_argument('--workers', type=int, default=1, help='processes generating the orders, 1 generates them in-process')
+        parser.add_argument('--prefix', default='seed', help='prefix of the generated usernames and slugs')
+        parser.add_argument('--password', default='lemon@seed!', help='password of all generated users')
+
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}-').exists():
+            raise CommandError(f'Users with the prefix "{prefix}" exist already, pass another --prefix')
+        if options['lines'] > options['items'] or options['customers'] < 1 or options['crews'] < 1:
+            raise CommandError('At least one customer and crew member and no more lines than menu items are required')
+
+        with Timer() as total, self.fast_writes():
+            with Timer() as timer, transaction.atomic():
+                users = self.seed_users(options)
+            self.report('users', sum(len(group) for group in users.values()), timer)
+
+            with Timer() as timer, transaction.atomic():
+                menu = self.seed_menu(options)
+            self.report('menu items', len(menu), timer)
+
+            with Timer() as timer, transaction.atomic():
+                carts = self.seed_carts(options, users, menu)
+            self.report('cart rows', carts, timer)
+
+            with Timer() as timer, transaction.atomic(), self.deferred_indexes(Order, OrderItem):
+                orders, items = self.seed_orders(options, users, menu)
+            self.report(f'orders with {items} items', orders, timer)
+
+            with Timer() as timer:
+                days, _ = rebuild_sales_rollup()
+            self.report('sales rollup days', days, timer)
+
+        # Raw inserts skip the signal handlers, so the caches are invalidated here
+        bump_menu_version()
+        invalidate_roles()
+        self.stdout.write(self.style.SUCCESS(f'Seeding finished in {total.elapsed:.1f}s'))
+
+
+    @contextlib.contextmanager
+    def fast_writes(self):
+        """
+        Context manager relaxing the durability of SQLite while seeding, the data can be generated again
+        """
+
+        if connection.vendor != 'sqlite':
+            yield
+            return
+        with connection.cursor() as cursor:
+            pragmas = {}
+            changes = {'cache_size': -256000} # Safety level and temporary storage are fixed inside a transaction
+            if not connection.in_atomic_block:
+                changes.update(synchronous='OFF', temp_store='MEMORY')
+            for pragma, value in changes.items():
+                cursor.execute(f'PRAGMA {pragma}')
+                pragmas[pragma] = cursor.fetchone()[0]
+                cursor.execute(f'PRAGMA {pragma} = {value}')
+            try:
+                yield
+            finally:
+                for pragma, value in pragmas.items():
+                    cursor.execute(f'PRAGMA {pragma} = {value}')
+
+
+    @contextlib.contextmanager
+    def deferred_indexes(self, *models):
+        """
+        Context manager dropping the secondary indexes of SQLite tables while they are loaded.
+        Building an index once from the sorted rows is much cheaper than updating it for every row
+        """
+
+        if connection.vendor != 'sqlite':
+            yield
+            return
+        tables = [model._meta.db_table for model in models]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT name, sql FROM sqlite_master WHERE type = %s AND sql IS NOT NULL '
+                f'AND tbl_name IN ({", ".join(["%s"] * len(tables))})',
+                ['index', *tables],
+            )
+            indexes = cursor.fetchall()
+            for name, _ in indexes:
+                cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+            yield
+            for _, sql in indexes:
+                cursor.execute(sql)
+
+
+    def seed_users(self, options):
+        """
+        Method to create the users of every role with their group memberships and tokens
+
+        Returns:
+            dict: ids of the created users against 'manager', 'crew' and 'customer'
+        """
+
+        prefix, batch_size = options['prefix'], options['batch_size']
+        password = make_password(options['password']) # Hashing once for every user
+        managers, _ = Group.objects.get_or_create(name=MANAGER)
+        crews, _ = Group.objects.get_or_create(name=DELIVERY_CREW)
+
+        users = {}
+        for role, count in (('manager', options['managers']), ('crew', options['crews']), ('customer', options['customers'])):
+            User.objects.bulk_create(
+                [User(username=f'{prefix}-{role}-{i}', password=password) for i in range(count)], batch_size=batch_size
+            )
+            users[role] = list(User.objects.filter(username__startswith=f'{prefix}-{role}-').values_list('id', flat=True))
+
+        memberships = User.groups.through
+        memberships.objects.bulk_create(
+            [memberships(user_id=user_id, group_id=managers.pk) for user_id in users['manager']]
+            + [memberships(user_id=user_id, group_id=crews.pk) for user_id in users['crew']],
+            batch_size=batch_size,
+        )
+        Token.objects.bulk_create(
+            [Token(key=Token.generate_key(), user_id=user_id) for group in users.values() for user_id in group],
+            batch_size=batch_size,
+        )
+        return users
+
+
+    def seed_menu(self, options):
+        """
+        Method to create the categories and menu items
+
+        Returns:
+            list: pairs of id and price of the created menu items
+        """
+
+        rng = random.Random(f'{options["seed"]}:menu')
+        prefix = options['prefix']
+        Category.objects.bulk_create([
+            Category(slug=f'{prefix}-category-{i}', title=f'{WORDS[i % len(WORDS)].title()} {i}') for i in range(options['categories'])
+        ])
+        category_ids = list(Category.objects.filter(slug__startswith=f'{prefix}-category-').values_list('id', flat=True))
+
+        first_id = (MenuItem.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        MenuItem.objects.bulk_create(
+            [
+                MenuItem(
+                    id=first_id + i,
+                    title=f'{" ".join(rng.sample(WORDS, 3)).title()} {prefix} {i}',
+                    price=Decimal(rng.randrange(200, 6000)) / 100,
+                    featured=rng.random() < 0.1,
+                    category_id=rng.choice(category_ids),
+                )
+                for i in range(options['items'])
+            ],
+            batch_size=options['batch_size'],
+        )
+        return list(MenuItem.objects.filter(id__gte=first_id).values_list('id', 'price'))
+
+
+    def seed_carts(self, options, users, menu):
+        """
+        Method to fill the carts of the customers, no customer holds the same menu item twice
+
+        Returns:
+            int: number of created cart rows
+        """
+
+        rng = random.Random(f'{options["seed"]}:carts')
+        customer_ids = users['customer']
+        per_customer = min(len(menu), -(-options['carts'] // len(customer_ids)))
+        rows, remaining = [], options['carts']
+        for customer_id in customer_ids:
+            for menuitem_id, price in rng.sample(menu, min(per_customer, remaining)):
+                quantity = rng.randint(1, 3)
+                rows.append((customer_id, menuitem_id, quantity, str(price), str(price * quantity)))
+            remaining -= min(per_customer, remaining)
+        insert_rows(Cart, ['user_id', 'menuitem_id', 'quantity', 'unit_price', 'price'], rows, options['batch_size'])
+        return len(rows)
+
+
+    def seed_orders(self, options, users, menu):
+        """
+        Method to generate the orders with their items in chunks and write them in batches
+
+        Returns:
+            tuple: number of created orders and order items
+        """
+
+        count, batch_size = options['orders'], options['batch_size']
+        first_id = (Order.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        context = (menu, users['customer'], users['crew'], options['lines'], options['days'], date.today(), now)
+        tasks = [
+            (options['seed'], index, first_id + start, min(batch_size, count - start), context)
+            for index, start in enumerate(range(0, count, batch_size))
+        ]
+
+        if options['workers'] > 1:
+            pool = multiprocessing.get_context('fork').Pool(options['workers'])
+            chunks = pool.imap(generate_orders, tasks) # Chunks are written in order while the next ones are generated
+        else:
+            pool, chunks = None, map(generate_orders, tasks)
+
+        orders = items = 0
+        try:
+            with connection.cursor() as cursor:
+                cursor = cursor.cursor # DB-API cursor, skipping the per-row parameter handling of the wrapper
+                order_sql, item_sql = insert_statement(Order, ORDER_COLUMNS), insert_statement(OrderItem, ITEM_COLUMNS)
+                if connection.vendor == 'sqlite':
+                    order_sql, item_sql = order_sql.replace('%s', '?'), item_sql.replace('%s', '?')
+                for order_rows, item_rows in chunks:
+                    cursor.executemany(order_sql, order_rows)
+                    cursor.executemany(item_sql, item_rows)
+                    orders, items = orders + len(order_rows), items + len(item_rows)
+        finally:
+            if pool is not None:
+                pool.terminate()
+        return orders, items
+
+
+    def report(self, name, count, timer):
+        self.stdout.write(f'{count:,} {name} in {timer.elapsed:.1f}s')
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from LittleLemonAPI.conf import get_setting
+
+
+class Command(BaseCommand):
+    """
+    Management command copying the primary SQLite database into the local read replicas.
+    Stands in for replication when the replicas are plain SQLite files, the copy is made
+    with the online backup API so the primary stays usable meanwhile
+    """
+
+    help = 'Copy the primary SQLite database into the configured read replicas'
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('aliases', nargs='*', help='replica aliases to refresh, all replicas by default')
+
+
+    def handle(self, *args, **options):
+        aliases = options['aliases'] or get_setting('READ_REPLICAS')
+        if not aliases:
+            raise CommandError('No read replicas are configured, list their files in LITTLELEMON_REPLICAS')
+
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('Replicas can only be copied from a SQLite primary, use the replication of the database')
+        primary.ensure_connection()
+        for alias in aliases:
+            if alias not in connections or connections[alias].vendor != 'sqlite':
+                raise CommandError(f'"{alias}" is not a SQLite database alias')
+            replica = connections[alias]
+            replica.ensure_connection()
+            primary.connection.backup(replica.connection)
+            self.stdout.write(self.style.SUCCESS(f'Copied the primary database into "{alias}" ({replica.settings_dict["NAME"]})'))
@@ -0,0 +1,106 @@
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from .cache import bump_menu_version
+from .models import Category, MenuItem
+from .serializers import MenuItemImportSerializer
+
+# Largest number of rows accepted by a single import
+MAX_IMPORT_ROWS = 5000
+
+# Rows written per 'bulk_create()' and 'bulk_update()' statement
+IMPORT_BATCH_SIZE = 500
+
+
+def validate_rows(rows):
+    """
+    Method to validate the fields of every row on its own, no query is made
+
+    Args:
+        rows (list): rows of the import
+
+    Returns:
+        tuple: validated rows and field errors, both keyed by row index
+    """
+
+    serializer = MenuItemImportSerializer()
+    valid, errors = {}, {}
+    for index, row in enumerate(rows):
+        try:
+            valid[index] = serializer.run_validation(row)
+        except ValidationError as exc:
+            errors[index] = exc.detail
+    return valid, errors
+
+
+def import_menu_items(rows, retry=True):
+    """
+    Method to create and update many menu items at once.
+    Category existence, the ids to update and title uniqueness are checked for the whole import
+    with three set-based queries, then the rows are written by 'bulk_create()' and 'bulk_update()'
+    in one transaction. Nothing is written if any row is invalid
+
+    Args:
+        rows (list): dictionaries of menu item fields, rows with an 'id' update that menu item
+        retry (bool, optional): whether a write violating the unique constraint is validated again. Defaults to True.
+
+    Returns:
+        tuple: result of every row and errors of the invalid rows, errors are empty on success
+    """
+
+    valid, errors = validate_rows(rows)
+    add_error = lambda index, field, message: errors.setdefault(index, {}).setdefault(field, []).append(message)
+
+    ids = {row['id'] for row in valid.values() if 'id' in row}
+    category_ids = {row['category_id'] for row in valid.values()}
+    titles = {row['title'] for row in valid.values()}
+    categories = set(Category.objects.filter(pk__in=category_ids).values_list('pk', flat=True))
+    existing = MenuItem.objects.in_bulk(ids)
+    owners = dict(MenuItem.objects.filter(title__in=titles).values_list('title', 'pk'))
+
+    seen_ids, seen_titles = set(), set()
+    for index, row in valid.items():
+        pk = row.get('id')
+        if pk is not None:
+            if pk not in existing:
+                add_error(index, 'id', f'Invalid pk "{pk}" - object does not exist.')
+            elif pk in seen_ids:
+                add_error(index, 'id', 'Menu item is updated by another row of the import.')
+            seen_ids.add(pk)
+        if row['category_id'] not in categories:
+            add_error(index, 'category_id', f'Invalid pk "{row["category_id"]}" - object does not exist.')
+        owner = owners.get(row['title'])
+        if row['title'] in seen_titles or (owner is not None and owner != pk):
+            add_error(index, 'title', 'This field must be unique.')
+        seen_titles.add(row['title'])
+
+    if errors:
+        return [], [{'row': index, 'errors': errors[index]} for index in sorted(errors)]
+
+    created, updated, results = [], [], []
+    now = timezone.now()
+    for index, row in valid.items():
+        if 'id' in row:
+            item = existing[row['id']]
+            item.title, item.price, item.featured = row['title'], row['price'], row['featured']
+            item.category_id, item.updated_at = row['category_id'], now # 'bulk_update()' skips 'auto_now'
+            updated.append(item)
+            results.append((index, item, 'updated'))
+        else:
+            item = MenuItem(title=row['title'], price=row['price'], featured=row['featured'], category_id=row['category_id'])
+            created.append(item)
+            results.append((index, item, 'created'))
+
+    try:
+        with transaction.atomic():
+            MenuItem.objects.bulk_create(created, batch_size=IMPORT_BATCH_SIZE)
+            MenuItem.objects.bulk_update(updated, ['title', 'price', 'featured', 'category', 'updated_at'], batch_size=IMPORT_BATCH_SIZE)
+            # Bulk writes send no signals, the cached menu responses are invalidated here
+            transaction.on_commit(bump_menu_version)
+    except IntegrityError:
+        if not retry:
+            raise
+        # Another write took a title after the checks, validating again reports the rows against it
+        return import_menu_items(rows, retry=False)
+
+    return [{'row': index, 'id': item.pk, 'result': result} for index, item, result in results], []
@@ -0,0 +1,268 @@
+import bisect
+import contextlib
+import threading
+from contextvars import ContextVar
+from time import perf_counter
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+# Upper bounds in seconds of the buckets of the timing histograms
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Upper bounds of the buckets of the query count histogram
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+# Exported histograms with their help texts and buckets, keyed by the phase they aggregate
+HISTOGRAMS = {
+    'total': ('littlelemon_request_duration_seconds', 'Total time spent on a request', TIME_BUCKETS),
+    'db': ('littlelemon_request_db_seconds', 'Time spent executing database queries of a request', TIME_BUCKETS),
+    'serialize': ('littlelemon_request_serializer_seconds', 'Time spent building serializer output of a request', TIME_BUCKETS),
+    'render': ('littlelemon_request_render_seconds', 'Time spent rendering the response body of a request', TIME_BUCKETS),
+    'queries': ('littlelemon_request_queries', 'Number of database queries of a request', QUERY_BUCKETS),
+}
+
+# Number of statements kept for the slow request log, later statements are only counted
+MAX_CAPTURED_QUERIES = 200
+
+# Metrics of the request being handled, None outside of instrumented requests
+_current = ContextVar('littlelemon_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """
+    Timings and captured statements of a single request
+    """
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.phases = {'db': 0.0, 'serialize': 0.0, 'render': 0.0}
+        self.queries = []
+        self.query_count = 0
+
+
+    def add(self, phase, elapsed):
+        self.phases[phase] += elapsed
+
+
+    def add_query(self, sql, elapsed):
+        self.phases['db'] += elapsed
+        self.query_count += 1
+        if len(self.queries) < MAX_CAPTURED_QUERIES:
+            self.queries.append((sql, elapsed))
+
+
+    def finish(self):
+        """
+        Method to close the measurement of the request
+
+        Returns:
+            dict: seconds spent in every phase, the total and the number of queries
+        """
+
+        return {**self.phases, 'total': perf_counter() - self.start, 'queries': self.query_count}
+
+
+
+class Histogram:
+    """
+    Thread safe cumulative histogram in the layout of the Prometheus exposition format
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # Last slot counts the values above every bound
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+
+    def snapshot(self):
+        """
+        Method to read the histogram consistently
+
+        Returns:
+            tuple: cumulative counts per bucket including '+Inf', sum and count of the values
+        """
+
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative, running = [], 0
+        for value in counts:
+            running += value
+            cumulative.append(running)
+        return cumulative, total, count
+
+
+
+class MetricsRegistry:
+    """
+    Process-wide histograms of the request measurements per route and method
+    """
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+
+    def observe(self, route, method, measurements):
+        """
+        Method to add the measurements of a finished request to the histograms
+
+        Args:
+            route (str): name of the route which handled the request
+            method (str): HTTP method of the request
+            measurements (dict): values produced by 'RequestMetrics.finish()'
+        """
+
+        for phase, (_, _, buckets) in HISTOGRAMS.items():
+            key = (phase, route, method)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                with self._lock:
+                    histogram = self._histograms.setdefault(key, Histogram(buckets))
+            histogram.observe(measurements[phase])
+
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+    def export(self):
+        """
+        Method to write the histograms in the Prometheus text exposition format
+
+        Returns:
+            str: metrics document
+        """
+
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+
+        lines = []
+        for phase, (name, help_text, buckets) in HISTOGRAMS.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+            for (key_phase, route, method), histogram in histograms:
+                if key_phase != phase:
+                    continue
+                labels = f'route="{escape_label(route)}",method="{method}"'
+                counts, total, count = histogram.snapshot()
+                for bound, value in zip([*map(format_bound, buckets), '+Inf'], counts):
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {value}')
+                lines += [f'{name}_sum{{{labels}}} {total!r}', f'{name}_count{{{labels}}} {count}']
+        return '\n'.join(lines) + '\n'
+
+
+
+# Histograms of this process, every worker process exports its own
+registry = MetricsRegistry()
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_bound(bound):
+    return repr(float(bound))
+
+
+def current_metrics():
+    """
+    Method to get the metrics of the request being handled
+
+    Returns:
+        RequestMetrics: metrics of the current request or None if it is not instrumented
+    """
+
+    return _current.get()
+
+
+@contextlib.contextmanager
+def collect():
+    """
+    Context manager instrumenting the enclosed request handling
+
+    Yields:
+        RequestMetrics: metrics filled while the block runs
+    """
+
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+@contextlib.contextmanager
+def timed(phase):
+    """
+    Context manager adding the time spent in the block to a phase of the current request,
+    does nothing outside of instrumented requests
+
+    Args:
+        phase (str): 'serialize' or 'render'
+    """
+
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(phase, perf_counter() - start)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper adding the time and statement of every query to the current request
+    """
+
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(sql, perf_counter() - start)
+
+
+def add_query_wrapper(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+def install():
+    """
+    Method to hook the measurements into the database connections.
+    Runs once per process and only when the instrumentation is enabled,
+    so disabled deployments keep the plain code paths.
+    Serializer output is timed explicitly by the views with 'timed()' 
+    """
+
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        _installed = True
+
+        # Connections opened from now on, in every thread, get the wrapper when they connect
+        connection_created.connect(add_query_wrapper, dispatch_uid='littlelemon_record_query')
+        for connection in connections.all(initialized_only=True):
+            add_query_wrapper(connection)
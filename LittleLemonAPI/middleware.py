@@ -0,0 +1,110 @@
+import logging
+from time import perf_counter
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from .conf import get_setting
+from . import metrics
+
+logger = logging.getLogger('LittleLemonAPI.performance')
+
+# Methods labelled by name in the histograms, any other method is labelled 'OTHER' to bound the label values
+KNOWN_METHODS = frozenset(['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE'])
+
+
+class PerformanceMiddleware:
+    """
+    Middleware measuring the query count, database time, serializer time, render time and total time
+    of every request. The measurements are sent back in a 'Server-Timing' header to staff users or under DEBUG,
+    aggregated into histograms per route for the metrics endpoint, and requests slower than 'SLOW_REQUEST_SECONDS'
+    are logged together with their SQL. Should be the first middleware so the total covers the others,
+    it removes itself from the stack when 'PERFORMANCE_METRICS' is disabled
+    """
+
+    def __init__(self, get_response):
+        if not get_setting('PERFORMANCE_METRICS'):
+            raise MiddlewareNotUsed('Performance metrics are disabled')
+        self.get_response = get_response
+        metrics.install()
+
+
+    def __call__(self, request):
+        with metrics.collect() as request_metrics:
+            response = self.get_response(request)
+        measurements = request_metrics.finish()
+
+        route = self.get_route(request)
+        if settings.DEBUG or getattr(getattr(request, 'user', None), 'is_staff', False): # Timings reveal the database work
+            response['Server-Timing'] = self.server_timing(measurements)
+        method = request.method if request.method in KNOWN_METHODS else 'OTHER'
+        metrics.registry.observe(route, method, measurements)
+        if measurements['total'] >= get_setting('SLOW_REQUEST_SECONDS'):
+            self.log_slow_request(request, route, response, measurements, request_metrics.queries)
+        return response
+
+
+    def process_template_response(self, request, response):
+        """
+        Method to time the rendering of rest framework responses, runs right before 'response.render()'
+
+        Returns:
+            SimpleTemplateResponse: response object with a callback closing the render timer
+        """
+
+        request_metrics = metrics.current_metrics()
+        if request_metrics is not None:
+            start = perf_counter()
+            response.add_post_render_callback(lambda response: request_metrics.add('render', perf_counter() - start))
+        return response
+
+
+    def get_route(self, request):
+        """
+        Method to name the route of the request for the metric labels
+
+        Args:
+            request (HttpRequest): request object from the client side
+
+        Returns:
+            str: url name of the matched route, its pattern if unnamed or 'unmatched'
+        """
+
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unmatched'
+        return match.view_name or match.route
+
+
+    def server_timing(self, measurements):
+        """
+        Method to build the 'Server-Timing' header value, durations are given in milliseconds
+
+        Args:
+            measurements (dict): values produced by 'RequestMetrics.finish()'
+
+        Returns:
+            str: header value
+        """
+
+        return ', '.join([
+            f'db;dur={measurements["db"] * 1000:.2f};desc="{measurements["queries"]} queries"',
+            f'serialize;dur={measurements["serialize"] * 1000:.2f}',
+            f'render;dur={measurements["render"] * 1000:.2f}',
+            f'total;dur={measurements["total"] * 1000:.2f}',
+        ])
+
+
+    def log_slow_request(self, request, route, response, measurements, queries):
+        """
+        Method to log a slow request with its timings and captured statements, parameters are never logged
+        """
+
+        statements = '\n'.join(f'  {elapsed * 1000:.2f}ms {sql}' for sql, elapsed in queries)
+        if measurements['queries'] > len(queries):
+            statements += f'\n  ... {measurements["queries"] - len(queries)} more queries'
+        logger.warning(
+            'Slow request %s %s (%s) %s: total %.1fms, db %.1fms in %d queries, serialize %.1fms, render %.1fms\n%s',
+            request.method, request.path, route, response.status_code,
+            measurements['total'] * 1000, measurements['db'] * 1000, measurements['queries'],
+            measurements['serialize'] * 1000, measurements['render'] * 1000, statements,
+            extra={'route': route, 'measurements': measurements},
+        )
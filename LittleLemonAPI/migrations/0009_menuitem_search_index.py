@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:31
+
+from django.db import migrations
+
+
+INDEX = '"LittleLemonAPI_menuitem_fts"'
+VOCABULARY = '"LittleLemonAPI_menuitem_fts_vocab"'
+MENUITEM = '"LittleLemonAPI_menuitem"'
+CATEGORY = '"LittleLemonAPI_category"'
+
+CREATE_SQL = [
+    f"CREATE VIRTUAL TABLE {INDEX} USING fts5(title, category, tokenize = 'unicode61 remove_diacritics 2')",
+    f"CREATE VIRTUAL TABLE {VOCABULARY} USING fts5vocab({INDEX}, 'row')",
+    f"""CREATE TRIGGER "LittleLemonAPI_menuitem_fts_insert" AFTER INSERT ON {MENUITEM} BEGIN
+        INSERT INTO {INDEX} (rowid, title, category)
+        SELECT new.id, new.title, c.title FROM {CATEGORY} c WHERE c.id = new.category_id;
+    END""",
+    f"""CREATE TRIGGER "LittleLemonAPI_menuitem_fts_update" AFTER UPDATE OF title, category_id ON {MENUITEM} BEGIN
+        DELETE FROM {INDEX} WHERE rowid = old.id;
+        INSERT INTO {INDEX} (rowid, title, category)
+        SELECT new.id, new.title, c.title FROM {CATEGORY} c WHERE c.id = new.category_id;
+    END""",
+    f"""CREATE TRIGGER "LittleLemonAPI_menuitem_fts_delete" AFTER DELETE ON {MENUITEM} BEGIN
+        DELETE FROM {INDEX} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER "LittleLemonAPI_category_fts_update" AFTER UPDATE OF title ON {CATEGORY} BEGIN
+        UPDATE {INDEX} SET category = new.title
+        WHERE rowid IN (SELECT id FROM {MENUITEM} WHERE category_id = new.id);
+    END""",
+    f"""INSERT INTO {INDEX} (rowid, title, category)
+        SELECT m.id, m.title, c.title FROM {MENUITEM} m JOIN {CATEGORY} c ON c.id = m.category_id""",
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS "LittleLemonAPI_category_fts_update"',
+    'DROP TRIGGER IF EXISTS "LittleLemonAPI_menuitem_fts_delete"',
+    'DROP TRIGGER IF EXISTS "LittleLemonAPI_menuitem_fts_update"',
+    'DROP TRIGGER IF EXISTS "LittleLemonAPI_menuitem_fts_insert"',
+    f'DROP TABLE IF EXISTS {VOCABULARY}',
+    f'DROP TABLE IF EXISTS {INDEX}',
+]
+
+
+def fts5_available(schema_editor):
+    """
+    Method to check whether the database is SQLite with the FTS5 extension compiled in
+    """
+
+    if schema_editor.connection.vendor != 'sqlite':
+        return False
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Method to create and fill the full-text index of the menu items, other databases keep the 'LIKE' search
+    """
+
+    if fts5_available(schema_editor):
+        for sql in CREATE_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in DROP_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0008_order_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:08
+
+from importlib import import_module
+from django.db import migrations, models
+
+# SQLite adds the constraint by rebuilding the table, which drops the triggers of the full-text index
+search_index = import_module('LittleLemonAPI.migrations.0009_menuitem_search_index')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0010_sales_rollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(search_index.drop_search_index, search_index.create_search_index),
+        migrations.AddConstraint(
+            model_name='menuitem',
+            constraint=models.UniqueConstraint(fields=('title',), name='menuitem_title_unique'),
+        ),
+        migrations.RunPython(search_index.create_search_index, search_index.drop_search_index),
+    ]
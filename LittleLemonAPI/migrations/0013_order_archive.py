@@ -0,0 +1,104 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Columns shared by the live and the archived tables, read together through the history views.
+# Like the search triggers of 0009, the views have to be dropped around later SQLite rebuilds of these tables
+HISTORY_VIEWS = [
+    ('LittleLemonAPI_orderhistory', 'LittleLemonAPI_order', 'LittleLemonAPI_archivedorder',
+     ['id', 'user_id', 'delivery_crew_id', 'status', 'total', 'date', 'updated_at']),
+    ('LittleLemonAPI_orderhistoryitem', 'LittleLemonAPI_orderitem', 'LittleLemonAPI_archivedorderitem',
+     ['id', 'order_id', 'menuitem_id', 'quantity', 'unit_price', 'price']),
+]
+
+
+def create_history_views(apps, schema_editor):
+    quote = schema_editor.quote_name
+    for view, live, archive, columns in HISTORY_VIEWS:
+        names = ', '.join(quote(column) for column in columns)
+        schema_editor.execute(
+            f'CREATE VIEW {quote(view)} ({names}) AS '
+            f'SELECT {names} FROM {quote(live)} UNION ALL SELECT {names} FROM {quote(archive)}'
+        )
+
+
+def drop_history_views(apps, schema_editor):
+    for view, _, _, _ in HISTORY_VIEWS:
+        schema_editor.execute(f'DROP VIEW IF EXISTS {schema_editor.quote_name(view)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0012_outbox_event'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderHistory',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('status', models.BooleanField()),
+                ('total', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('date', models.DateField()),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'LittleLemonAPI_orderhistory',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderHistoryItem',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.SmallIntegerField()),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=6)),
+            ],
+            options={
+                'db_table': 'LittleLemonAPI_orderhistoryitem',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('status', models.BooleanField(default=True)),
+                ('total', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('date', models.DateField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+                ('delivery_crew', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_deliveries', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.SmallIntegerField()),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('menuitem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='LittleLemonAPI.menuitem')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_items', to='LittleLemonAPI.archivedorder')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['date', 'id'], name='archived_order_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['user', 'date'], name='archived_order_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['delivery_crew', 'date'], name='archived_order_crew_date_idx'),
+        ),
+        migrations.RunPython(create_history_views, drop_history_views),
+    ]
@@ -0,0 +1,343 @@
+import hashlib
+from django.db.models import Count, Max, prefetch_related_objects
+from django.db.models.constants import LOOKUP_SEP
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+from .cache import get_menu_version, get_or_build
+from .conf import get_setting
+from .metrics import timed
+from .models import MenuItem
+from .projections import get_plan
+from .routers import use_replica
+
+
+def plain_data(data):
+    """
+    Method to strip the serializer references from response data so it can be pickled into a cache
+
+    Args:
+        data (object): data produced by a serializer or paginator
+
+    Returns:
+        object: same data built from plain dicts and lists
+    """
+
+    if isinstance(data, (dict, ReturnDict)):
+        return {key: plain_data(value) for key, value in data.items()}
+    if isinstance(data, (list, ReturnList)):
+        return [plain_data(value) for value in data]
+    return data
+
+
+
+class ListResponseMixin:
+    """
+    View mixin splitting the list action so the building of the list response can be replaced
+    """
+
+    def list_response(self, request, queryset):
+        """
+        Method to paginate and serialize the filtered queryset of a list
+
+        Returns:
+            Response: response object with the serialized list
+        """
+
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(queryset if page is None else page, many=True)
+        with timed('serialize'):
+            data = serializer.data
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+
+    def list(self, request, *args, **kwargs):
+        """
+        Method to display the list
+
+        Args:
+            request (Request): request object from the client side
+
+        Returns:
+            Response: response object for the client
+        """
+
+        return self.list_response(request, self.filter_queryset(self.get_queryset()))
+
+
+
+class ProjectedListMixin(ListResponseMixin):
+    """
+    View mixin serving GET lists through the precompiled read plan of the serializer.
+    Only the needed columns are read and the output is built without model objects,
+    the result is identical to the one of the serializer
+    """
+
+    def list_response(self, request, queryset):
+        """
+        Method to paginate and render the projected rows of the filtered queryset
+
+        Returns:
+            Response: response object with the rendered list
+        """
+
+        plan = get_plan(self.get_serializer_class()) if get_setting('FAST_LIST_SERIALIZATION') else None
+        if plan is None: # Serializer can not be projected
+            return super().list_response(request, queryset)
+
+        rows = plan.project(queryset)
+        page = self.paginate_queryset(rows)
+        rows = list(rows) if page is None else page
+        with timed('serialize'):
+            data = plan.render(rows)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+
+class ConditionalGetMixin(ListResponseMixin):
+    """
+    View mixin answering conditional GET requests with '304 Not Modified' before any serializer runs.
+    Validators come from the 'updated_at' change markers of the rows, for lists from an aggregate
+    of the filtered queryset so the rendered body is never hashed.
+    Views embedding menu items also follow the menu version and the last menu item change
+    """
+
+    # Change marker fields of the model, related fields are given in lookup form
+    conditional_fields = ['updated_at']
+
+    # Whether the responses embed menu items, which change without touching the rows of the view
+    conditional_menu = False
+
+    # Related lookups prefetched for a single object only when it is actually serialized
+    object_prefetch = []
+
+
+    def get_list_validators(self, request, queryset):
+        """
+        Method to compute the validators of a list from max(change markers) and the row count
+
+        Args:
+            request (Request): request object from the client side
+            queryset (QuerySet): filtered queryset of the list
+
+        Returns:
+            tuple: quoted etag and last modified timestamp of the list
+        """
+
+        aggregates = queryset.order_by().aggregate(
+            count=Count('pk'),
+            **{field: Max(field) for field in self.conditional_fields}
+        )
+        count = aggregates.pop('count')
+        markers = [marker for marker in aggregates.values() if marker is not None]
+        last_modified = max(markers).timestamp() if markers else None
+        query = sorted((key, value) for key in request.query_params for value in request.query_params.getlist(key))
+        return self.make_validators(last_modified, count, query)
+
+
+    def get_object_validators(self, request, instance):
+        """
+        Method to compute the validators of a single object from its change markers
+
+        Args:
+            request (Request): request object from the client side
+            instance (Model): object to be displayed
+
+        Returns:
+            tuple: quoted etag and last modified timestamp of the object
+        """
+
+        markers = []
+        for field in self.conditional_fields:
+            value = instance
+            for attr in field.split(LOOKUP_SEP): # Following the related objects of the lookup
+                value = getattr(value, attr, None) if value is not None else None
+            if value is not None:
+                markers.append(value)
+        last_modified = max(markers).timestamp() if markers else None
+        return self.make_validators(last_modified, instance.pk)
+
+
+    def get_menu_validators(self):
+        """
+        Method to read the menu version and the timestamp of the last menu item change.
+        The timestamp is aggregated once per menu version
+
+        Returns:
+            tuple: current menu version and timestamp of the last menu item change
+        """
+
+        version = get_menu_version()
+
+        def build():
+            with use_replica(None): # A lagging replica would store an old timestamp under the new version
+                last_changed = MenuItem.objects.aggregate(last_changed=Max('updated_at'))['last_changed']
+            return last_changed.timestamp() if last_changed is not None else 0.0
+
+        return version, get_or_build(f'littlelemon:menu-modified:{version}', build, get_setting('RESPONSE_CACHE_TTL'))
+
+
+    def make_validators(self, last_modified, *parts):
+        """
+        Method to build the validators from the last change of the rows and the etag parts
+
+        Args:
+            last_modified (float): timestamp of the last change of the rows or None
+
+        Returns:
+            tuple: quoted etag and last modified timestamp
+        """
+
+        if self.conditional_menu:
+            version, menu_modified = self.get_menu_validators()
+            last_modified = max(last_modified or 0.0, menu_modified) or None
+            parts += (version,)
+        return self.make_etag(*parts, last_modified), last_modified
+
+
+    def make_etag(self, *parts):
+        """
+        Method to build a strong etag from the validator parts and the negotiated format
+
+        Returns:
+            str: quoted etag
+        """
+
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        parts = (self.__class__.__name__, getattr(renderer, 'format', None)) + parts
+        return quote_etag(hashlib.sha1(repr(parts).encode()).hexdigest())
+
+
+    def not_modified(self, request, etag, last_modified):
+        """
+        Method to check the conditional headers of the request against the validators
+
+        Returns:
+            HttpResponse: '304 Not Modified' response if the client copy is fresh else None
+        """
+
+        if etag is None:
+            return None
+        return get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(last_modified) if last_modified is not None else None,
+        )
+
+
+    def set_validators(self, response, etag, last_modified):
+        """
+        Method to attach the 'ETag' and 'Last-Modified' headers to a response
+
+        Returns:
+            Response: response object with the validator headers
+        """
+
+        if etag is None: # View opted out of validators for this response
+            return response
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+    def list(self, request, *args, **kwargs):
+        """
+        Method to display the list unless the client copy is still fresh
+
+        Args:
+            request (Request): request object from the client side
+
+        Returns:
+            Response: response object for the client
+        """
+
+        queryset = self.filter_queryset(self.get_queryset())
+        etag, last_modified = self.get_list_validators(request, queryset)
+        response = self.not_modified(request, etag, last_modified)
+        if response is None:
+            response = self.list_response(request, queryset)
+        return self.set_validators(response, etag, last_modified)
+
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Method to display a single object unless the client copy is still fresh
+
+        Args:
+            request (Request): request object from the client side
+
+        Returns:
+            Response: response object for the client
+        """
+
+        instance = self.get_object()
+        etag, last_modified = self.get_object_validators(request, instance)
+        response = self.not_modified(request, etag, last_modified)
+        if response is None:
+            prefetch_related_objects([instance], *self.object_prefetch)
+            with timed('serialize'):
+                data = self.get_serializer(instance).data
+            response = Response(data)
+        return self.set_validators(response, etag, last_modified)
+
+
+
+class MenuCachedListMixin(ConditionalGetMixin):
+    """
+    View mixin caching the list responses of menu data in the shared cache.
+    Responses and their validators are keyed by the normalized query string and the global menu version,
+    so any change of a menu item or category invalidates all of them at once.
+    Cache misses are always built from the primary database, a lagging replica would otherwise
+    store the old menu under the new version for the whole cache lifetime
+    """
+
+    def get_list_cache_key(self, request):
+        """
+        Method to build the cache key of the list response for the request
+
+        Args:
+            request (Request): request object from the client side
+
+        Returns:
+            str: cache key independent of the order of query parameters
+        """
+
+        query = sorted((key, value) for key in request.query_params for value in request.query_params.getlist(key))
+        renderer = getattr(request, 'accepted_renderer', None)
+        digest = hashlib.sha1(repr((request.get_host(), request.scheme, getattr(renderer, 'format', None), query)).encode()).hexdigest()
+        return f'littlelemon:{self.__class__.__name__}:{get_menu_version()}:{digest}'
+
+
+    def get_list_validators(self, request, queryset):
+        """
+        Method to read the list validators from the cache, the aggregate runs once per menu version
+        """
+
+        def build():
+            with use_replica(None):
+                return super(MenuCachedListMixin, self).get_list_validators(request, queryset)
+
+        key = f'{self.get_list_cache_key(request)}:validators'
+        return get_or_build(key, build, get_setting('RESPONSE_CACHE_TTL'))
+
+
+    def list_response(self, request, queryset):
+        """
+        Method to serve the list from the cache, building it only once on concurrent misses
+        """
+
+        def build():
+            with use_replica(None):
+                return plain_data(super(MenuCachedListMixin, self).list_response(request, queryset).data)
+
+        data = get_or_build(self.get_list_cache_key(request), build, get_setting('RESPONSE_CACHE_TTL'))
+        return Response(data)
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 # Create your models here.
 class Category(models.Model):
@@ -14,6 +15,9 @@ class Category(models.Model):
     # title field for describing the title of food category
     title = models.CharField(max_length=255, db_index=True)
     
+    # updated_at field for keeping record of the last change, used as the change marker for caching
+    updated_at = models.DateTimeField(auto_now=True)
+    
     
     def __str__(self):
         """
@@ -44,6 +48,9 @@ class MenuItem(models.Model):
     # category field for describing the category of the food item
     category = models.ForeignKey(Category, on_delete=models.PROTECT)
     
+    # updated_at field for keeping record of the last change, used as the change marker for caching
+    updated_at = models.DateTimeField(auto_now=True)
+    
     def __str__(self):
         """
         The dunder string method for the model to display the random print statement
@@ -53,6 +60,18 @@ class MenuItem(models.Model):
         """        
         
         return self.title
+    
+    
+    class Meta:
+        """
+        The meta classs for handling the meta data of the model.
+        It contains the unique constraint the menuitem writes rely on instead of pre-check queries
+        """        
+        
+        # constraint to keep menuitem titles unique, which makes every (title, category) pair unique as well
+        constraints = [
+            models.UniqueConstraint(fields=['title'], name='menuitem_title_unique'),
+        ]
 
 
 class Cart(models.Model):
@@ -119,6 +138,9 @@ class Order(models.Model):
     # date field for keeping record of order placing date
     date = models.DateField(db_index=True)
     
+    # updated_at field for keeping record of the last change, used as the change marker for caching
+    updated_at = models.DateTimeField(auto_now=True)
+    
     def __str__(self): 
         """
         The dunder string method for the model to display the random print statement
@@ -129,6 +151,17 @@ class Order(models.Model):
         
         return f'{self.user} - {self.delivery_crew}, {self.status}'
 
+    class Meta:
+        """
+        The meta classs for handling the meta data of the model.
+        It contains the composite index used by the keyset pagination of the order list
+        """        
+        
+        # index to walk the orders by date with the id as tie breaker
+        indexes = [
+            models.Index(fields=['date', 'id'], name='order_date_id_idx'),
+        ]
+
     
 class OrderItem(models.Model):
     """
@@ -138,7 +171,7 @@ class OrderItem(models.Model):
     """    
     
     # order field for to show which order this item represents
-    order = models.ForeignKey(Order, on_delete=models.CASCADE)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='order_items')
     
     # menuitem field for describing the items ordered
     menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
@@ -170,3 +203,257 @@ class OrderItem(models.Model):
         
         # constraint to ensure single menuitem could be placed in multiple orders
         unique_together = ('order', 'menuitem')
+
+
+class DailySales(models.Model):
+    """
+    The 'DailySales' model for keeping the materialized sales figures of a single day.
+    Rows are updated incrementally by every checkout, so sales reports read one row per day
+    """    
+    
+    # date field for the day the figures belong to
+    date = models.DateField(unique=True)
+    
+    # orders field for keeping record of the number of orders placed on the day
+    orders = models.IntegerField(default=0)
+    
+    # units field for keeping record of the number of menu items sold on the day
+    units = models.IntegerField(default=0)
+    
+    # revenue field for keeping record of the total of all orders placed on the day
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    def __str__(self):
+        """
+        The dunder string method for the model to display the random print statement
+
+        Returns:
+            str: date with revenue of the day
+        """        
+        
+        return f'{self.date}, {self.revenue}'
+
+
+class DailyItemSales(models.Model):
+    """
+    The 'DailyItemSales' model for keeping the materialized sales figures of a menu item on a single day.
+    Category figures are grouped from these rows through the menu item
+    """    
+    
+    # date field for the day the figures belong to
+    date = models.DateField()
+    
+    # menuitem field for describing the item sold
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    
+    # units field for keeping record of the quantity of the item sold on the day
+    units = models.IntegerField(default=0)
+    
+    # revenue field for keeping record of the total price of the item sold on the day
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    def __str__(self):
+        """
+        The dunder string method for the model to display the random print statement
+
+        Returns:
+            str: date with menuitem and its units
+        """        
+        
+        return f'{self.date} - {self.menuitem}, {self.units}'
+    
+    class Meta:
+        """
+        The meta classs for handling the meta data of the model.
+        It contains the unique together constraint the incremental updates conflict on
+        """        
+        
+        # constraint to keep a single row per menuitem and day
+        unique_together = ('date', 'menuitem')
+
+
+class OutboxEvent(models.Model):
+    """
+    The 'OutboxEvent' model for keeping an event for an integration until it is delivered.
+    Rows are written in the transaction of the change they announce, one row per destination,
+    and deleted by the 'drain_outbox' command once the destination accepted them
+    """    
+    
+    # destination field for naming the integration from the 'OUTBOX_DESTINATIONS' setting
+    destination = models.CharField(max_length=100)
+    
+    # topic field for describing the kind of event, e.g. 'order.created'
+    topic = models.CharField(max_length=100)
+    
+    # payload field for keeping the body of the event
+    payload = models.JSONField()
+    
+    # created_at field for keeping record of the time of the change
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    # attempts field for counting the failed deliveries
+    attempts = models.IntegerField(default=0)
+    
+    # next_attempt_at field for keeping the time before which the event is not delivered, also the lease of a claimed event
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    
+    # failed field for marking events given up after 'OUTBOX_MAX_ATTEMPTS' deliveries
+    failed = models.BooleanField(default=False)
+    
+    # last_error field for keeping the reason of the last failed delivery
+    last_error = models.TextField(blank=True)
+    
+    def __str__(self):
+        """
+        The dunder string method for the model to display the random print statement
+
+        Returns:
+            str: topic with its destination and attempts
+        """        
+        
+        return f'{self.topic} -> {self.destination}, {self.attempts}'
+    
+    class Meta:
+        """
+        The meta classs for handling the meta data of the model.
+        It contains the index the drain reads the due events with
+        """        
+        
+        # index to find the due events in order of their due time
+        indexes = [
+            models.Index(fields=['failed', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+
+class ArchivedOrder(models.Model):
+    """
+    The 'ArchivedOrder' model for keeping delivered orders moved out of the live 'Order' table.
+    Rows keep the id of their order, so an order has the same id before and after archiving
+    """    
+    
+    # id field for keeping the primary key of the archived order
+    id = models.BigIntegerField(primary_key=True)
+    
+    # user field for the customer who placed the order
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders')
+    
+    # crew field for the crew member who delivered the order
+    delivery_crew = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='archived_deliveries', null=True)
+    
+    # status field copied from the order, always true as only delivered orders are archived
+    status = models.BooleanField(default=True)
+    
+    # total field for keeping record of total price of the order
+    total = models.DecimalField(max_digits=6, decimal_places=2)
+    
+    # date field for keeping record of order placing date
+    date = models.DateField()
+    
+    # updated_at field for keeping the last change of the order before it was archived
+    updated_at = models.DateTimeField()
+    
+    # archived_at field for keeping record of the time the order was moved
+    archived_at = models.DateTimeField()
+    
+    def __str__(self): 
+        """
+        The dunder string method for the model to display the random print statement
+
+        Returns:
+            str: user name with the order date
+        """        
+        
+        return f'{self.user} - {self.date} (archived)'
+
+    class Meta:
+        """
+        The meta classs for handling the meta data of the model.
+        It contains the indexes of the date range queries per role
+        """        
+        
+        # indexes to read the archive by date for managers, customers and crew members
+        indexes = [
+            models.Index(fields=['date', 'id'], name='archived_order_date_id_idx'),
+            models.Index(fields=['user', 'date'], name='archived_order_user_date_idx'),
+            models.Index(fields=['delivery_crew', 'date'], name='archived_order_crew_date_idx'),
+        ]
+
+
+class ArchivedOrderItem(models.Model):
+    """
+    The 'ArchivedOrderItem' model for keeping the items of an archived order, ids are kept as well
+    """    
+    
+    # id field for keeping the primary key of the archived orderitem
+    id = models.BigIntegerField(primary_key=True)
+    
+    # order field for the archived order the item belongs to
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='order_items')
+    
+    # menuitem field for describing the items ordered
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    
+    # quantity field for describing the quantity of specific menu item
+    quantity = models.SmallIntegerField()
+    
+    # unit_price field for keeping record of items unit price
+    unit_price = models.DecimalField(max_digits=6, decimal_places=2)
+    
+    # price field for keeping record of total price of items
+    price = models.DecimalField(max_digits=6, decimal_places=2)
+    
+    def __str__(self): 
+        """
+        The dunder string method for the model to display the random print statement.
+
+        Returns:
+            str: order representation with total price
+        """        
+        
+        return f'{self.order}, {self.price}'
+
+
+class OrderHistory(models.Model):
+    """
+    The 'OrderHistory' model reading the live and the archived orders together.
+    Backed by a database view with 'UNION ALL' of both tables, read only
+    """    
+    
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    delivery_crew = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+', null=True)
+    status = models.BooleanField()
+    total = models.DecimalField(max_digits=6, decimal_places=2)
+    date = models.DateField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        """
+        The meta classs for handling the meta data of the model.
+        The view is created by the migrations, Django never changes it
+        """        
+        
+        managed = False
+        db_table = 'LittleLemonAPI_orderhistory'
+
+
+class OrderHistoryItem(models.Model):
+    """
+    The 'OrderHistoryItem' model reading the live and the archived orderitems together, backed by a database view
+    """    
+    
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(OrderHistory, on_delete=models.DO_NOTHING, db_constraint=False, related_name='order_items')
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    quantity = models.SmallIntegerField()
+    unit_price = models.DecimalField(max_digits=6, decimal_places=2)
+    price = models.DecimalField(max_digits=6, decimal_places=2)
+
+    class Meta:
+        """
+        The meta classs for handling the meta data of the model.
+        The view is created by the migrations, Django never changes it
+        """        
+        
+        managed = False
+        db_table = 'LittleLemonAPI_orderhistoryitem'
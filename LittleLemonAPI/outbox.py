@@ -0,0 +1,263 @@
+import hashlib
+import hmac
+import logging
+import random
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import orjson
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .conf import get_setting
+from .events import order_event
+from .models import OutboxEvent
+
+logger = logging.getLogger('LittleLemonAPI.outbox')
+
+# Seconds a claimed event stays hidden from other drains while it is delivered
+CLAIM_SECONDS = 120
+
+
+def enqueue(topic, payloads):
+    """
+    Method to write events into the outbox, one row for every destination subscribed to the topic.
+    Has to run inside the transaction of the change, so the events exist exactly when the change does
+
+    Args:
+        topic (str): kind of the events, e.g. 'order.created'
+        payloads (list): bodies of the events
+    """
+
+    destinations = [
+        name for name, options in get_setting('OUTBOX_DESTINATIONS').items()
+        if options.get('topics') is None or topic in options['topics']
+    ]
+    if destinations and payloads:
+        OutboxEvent.objects.bulk_create([
+            OutboxEvent(destination=name, topic=topic, payload=payload) for payload in payloads for name in destinations
+        ])
+
+
+def order_created(order, cart_items):
+    """
+    Method to build the payload announcing a placed order together with its items
+
+    Args:
+        order (Order): placed order
+        cart_items (list): id, menuitem id, quantity, unit price and price of the checked out cart rows
+
+    Returns:
+        dict: event payload
+    """
+
+    return {
+        **order_event(order.pk, order.user_id, order.status, order.delivery_crew_id, order.updated_at),
+        'total': f'{order.total:.2f}',
+        'date': str(order.date),
+        'items': [
+            {'menuitem': menuitem_id, 'quantity': quantity, 'unit_price': str(unit_price), 'price': str(price)}
+            for _, menuitem_id, quantity, unit_price, price in cart_items
+        ],
+    }
+
+
+def log_sink(destination, events):
+    """
+    Local sink writing the events to the 'LittleLemonAPI.outbox' logger, usable as the 'sink' of a destination
+    """
+
+    for event in events:
+        logger.info('%s %s #%d: %s', destination, event['topic'], event['id'], orjson.dumps(event['payload']).decode())
+
+
+
+class Destination:
+    """
+    Integration receiving outbox events, either an HTTP webhook or a local sink callable.
+    Every destination delivers through a thread pool of its own sized by its concurrency limit,
+    so a slow integration never takes the threads of the others. The events are split into one lane
+    per thread by their order, so the events of one order are always sent one after the other
+    """
+
+    def __init__(self, name, options):
+        """
+        Constructor for the destination object
+
+        Args:
+            name (str): key of the destination in 'OUTBOX_DESTINATIONS'
+            options (dict): 'url' or 'sink' (dotted path) with the optional 'concurrency', 'batch_size', 'timeout' and 'secret'
+        """
+
+        if ('url' in options) == ('sink' in options):
+            raise ValueError(f'Outbox destination "{name}" needs either a "url" or a "sink"')
+        self.name = name
+        self.url = options.get('url')
+        self.sink = import_string(options['sink']) if 'sink' in options else None
+        self.batch_size = options.get('batch_size', 50)
+        self.timeout = options.get('timeout', 5)
+        self.secret = options.get('secret')
+        self.concurrency = options.get('concurrency', 1)
+        self.executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix=f'outbox-{name}')
+
+
+    def lanes(self, events):
+        """
+        Method to split events into lanes delivered in parallel, all events of an order share a lane
+
+        Args:
+            events (list): outbox rows of this destination ordered by id
+
+        Returns:
+            list: non empty lanes, every lane ordered by id
+        """
+
+        lanes = [[] for _ in range(self.concurrency)]
+        for event in events:
+            key = event.payload.get('id', event.pk) if isinstance(event.payload, dict) else event.pk
+            lanes[hash(key) % self.concurrency].append(event)
+        return [lane for lane in lanes if lane]
+
+
+    def send_lane(self, events):
+        """
+        Method to deliver a lane in batches one after the other, stopping at the first failed batch
+        so no later event of an order overtakes an earlier one
+
+        Args:
+            events (list): outbox rows of a single lane
+
+        Returns:
+            tuple: delivered rows, rows not delivered and the exception of the failed batch or None
+        """
+
+        for start in range(0, len(events), self.batch_size):
+            try:
+                self.send(events[start:start + self.batch_size])
+            except Exception as exc:
+                return events[:start], events[start:], exc
+        return events, [], None
+
+
+    def send(self, events):
+        """
+        Method to deliver a batch of events, any exception marks the whole batch as failed
+
+        Args:
+            events (list): outbox rows of this destination
+        """
+
+        body = [
+            {'id': event.pk, 'topic': event.topic, 'created_at': event.created_at.isoformat(), 'payload': event.payload}
+            for event in events
+        ]
+        if self.sink is not None:
+            self.sink(self.name, body)
+            return
+
+        content = orjson.dumps({'events': body})
+        headers = {'Content-Type': 'application/json', 'User-Agent': 'LittleLemonAPI-outbox'}
+        if self.secret:
+            signature = hmac.new(self.secret.encode(), content, hashlib.sha256).hexdigest()
+            headers['X-LittleLemon-Signature'] = f'sha256={signature}'
+        request = urllib.request.Request(self.url, data=content, headers=headers, method='POST')
+        with urllib.request.urlopen(request, timeout=self.timeout): # Raises for statuses from 400 upwards
+            pass
+
+
+
+class OutboxDrain:
+    """
+    Worker delivering the due outbox events in batches.
+    A batch is claimed by pushing its due time forward, split into chunks per destination and sent
+    through the pools of the destinations. Delivered rows are deleted, failed rows are retried with an
+    exponential backoff and given up after 'OUTBOX_MAX_ATTEMPTS'. Delivery is at least once, receivers
+    can drop repeated events by their id.
+    Within a drain the events of an order arrive in the order they were written. A retried event can still
+    arrive after a newer event of its order, the event ids grow with every write so receivers can drop
+    an event older than the last one they applied for the order
+    """
+
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+        self.destinations = {name: Destination(name, options) for name, options in get_setting('OUTBOX_DESTINATIONS').items()}
+
+
+    def close(self):
+        for destination in self.destinations.values():
+            destination.executor.shutdown()
+
+
+    def claim(self):
+        """
+        Method to take the next due events, events claimed by another drain in the meantime are skipped
+
+        Returns:
+            list: claimed outbox rows
+        """
+
+        now = timezone.now()
+        ids = list(
+            OutboxEvent.objects.filter(failed=False, next_attempt_at__lte=now, destination__in=self.destinations)
+            .order_by('next_attempt_at', 'id').values_list('id', flat=True)[:self.batch_size]
+        )
+        if not ids:
+            return []
+        lease = now + timedelta(seconds=CLAIM_SECONDS)
+        OutboxEvent.objects.filter(pk__in=ids, next_attempt_at__lte=now).update(next_attempt_at=lease)
+        return list(OutboxEvent.objects.filter(pk__in=ids, next_attempt_at=lease).order_by('id'))
+
+
+    def backoff(self, attempts):
+        """
+        Method to compute the delay before the next delivery, doubling per attempt with jitter
+
+        Args:
+            attempts (int): failed deliveries so far
+
+        Returns:
+            timedelta: delay before the next attempt
+        """
+
+        delay = min(get_setting('OUTBOX_BACKOFF_SECONDS') * 2 ** (attempts - 1), get_setting('OUTBOX_BACKOFF_MAX_SECONDS'))
+        return timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+    def drain_once(self):
+        """
+        Method to claim and deliver a single batch.
+        The network calls run in the lanes of the destination pools, the outcome is written back with one delete
+        and one bulk update from the calling thread
+
+        Returns:
+            tuple: number of claimed, delivered and failed events
+        """
+
+        events = self.claim()
+        chunks = {}
+        for event in events:
+            chunks.setdefault(event.destination, []).append(event)
+        futures = []
+        for name, destination_events in chunks.items():
+            destination = self.destinations[name]
+            for lane in destination.lanes(destination_events):
+                futures.append((destination, destination.executor.submit(destination.send_lane, lane)))
+
+        delivered, failed = [], []
+        for destination, future in futures:
+            sent, unsent, exc = future.result()
+            delivered.extend(event.pk for event in sent)
+            if exc is not None:
+                logger.warning('Delivery of %d events to %s failed: %s', len(unsent), destination.name, exc)
+                failed.extend((event, repr(exc)) for event in unsent)
+
+        if delivered:
+            OutboxEvent.objects.filter(pk__in=delivered).delete()
+        if failed:
+            now, max_attempts = timezone.now(), get_setting('OUTBOX_MAX_ATTEMPTS')
+            for event, error in failed:
+                event.attempts += 1
+                event.failed = event.attempts >= max_attempts
+                event.next_attempt_at = now + self.backoff(event.attempts)
+                event.last_error = error[:1000]
+            OutboxEvent.objects.bulk_update([event for event, _ in failed], ['attempts', 'failed', 'next_attempt_at', 'last_error'])
+        return len(events), len(delivered), len(failed)
@@ -0,0 +1,283 @@
+import base64
+from datetime import date
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class AsyncPaginationMixin:
+    """
+    Pagination mixin counting and slicing the queryset with the async ORM.
+    The page is located by a Django paginator over the row count, so page numbers,
+    error messages and links are the same as the ones of the synchronous paginator
+    """
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Method to fetch the rows of the requested page
+
+        Args:
+            queryset (QuerySet): filtered queryset of the list
+            request (Request): request object from the client side
+            view (View, optional): view object performing the pagination
+
+        Returns:
+            list: rows of the requested page or None if pagination is disabled
+        """
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(range(await queryset.acount()), page_size)
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+
+        offset = (self.page.number - 1) * page_size
+        return [row async for row in queryset[offset:offset + page_size]]
+
+
+
+class AsyncPageNumberPagination(AsyncPaginationMixin, PageNumberPagination):
+    """
+    Page number pagination for async views
+    """
+
+
+
+class OrderPageNumberPagination(PageNumberPagination):
+    """
+    Page number pagination for orders with a client selectable page size.
+    Passing 'count=false' skips the 'COUNT(*)' query, the response then has no 'count'
+    """
+
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    count_query_param = 'count'
+
+
+    def is_count_free(self, request):
+        """
+        Method to check whether the client asked to skip the count query
+
+        Args:
+            request (Request): request object from the client side
+
+        Returns:
+            bool: true if 'count=false' is present in the query string
+        """
+
+        return request.query_params.get(self.count_query_param, '').lower() in ('false', '0', 'no')
+
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Method to paginate the queryset, fetching one extra row instead of counting in count-free mode
+
+        Args:
+            queryset (QuerySet): filtered queryset of the list
+            request (Request): request object from the client side
+            view (View, optional): view object performing the pagination
+
+        Returns:
+            list: objects of the requested page
+        """
+
+        self.count_free = self.is_count_free(request)
+        if not self.count_free:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        try:
+            self.page_number = _positive_int(request.query_params.get(self.page_query_param) or 1, strict=True)
+        except ValueError:
+            raise NotFound(self.invalid_page_message)
+
+        offset = (self.page_number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        self.has_next = len(rows) > page_size
+        return rows[:page_size]
+
+
+    def get_next_link(self):
+        if not getattr(self, 'count_free', False):
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.page_number + 1)
+
+
+    def get_previous_link(self):
+        if not getattr(self, 'count_free', False):
+            return super().get_previous_link()
+        if self.page_number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
+
+
+    def get_paginated_response(self, data):
+        if not getattr(self, 'count_free', False):
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+
+class OrderKeysetPagination(BasePagination):
+    """
+    Keyset pagination for orders on '(date, id)', newest orders first.
+    Pages are located with a range condition on the composite index instead of an 'OFFSET'
+    and no count is performed, so every page costs the same as the first one
+    """
+
+    cursor_query_param = 'cursor'
+    page_size = OrderPageNumberPagination.page_size
+    page_size_query_param = 'page_size'
+    max_page_size = OrderPageNumberPagination.max_page_size
+    invalid_cursor_message = 'Invalid cursor'
+
+
+    def get_page_size(self, request):
+        """
+        Method to read the page size requested by the client, limited by 'max_page_size'
+
+        Args:
+            request (Request): request object from the client side
+
+        Returns:
+            int: number of orders in a single page
+        """
+
+        try:
+            return _positive_int(request.query_params[self.page_size_query_param], strict=True, cutoff=self.max_page_size)
+        except (KeyError, ValueError):
+            return self.page_size
+
+
+    def encode_cursor(self, order, reverse):
+        """
+        Method to encode the position of an order into an opaque cursor
+
+        Args:
+            order (Order | Row): order or projected order row at the edge of the current page
+            reverse (bool): true if the cursor points towards newer orders
+
+        Returns:
+            str: url-safe cursor
+        """
+
+        position = f'{"p" if reverse else "n"}|{order.date.isoformat()}|{order.pk}'
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+    def decode_cursor(self, request):
+        """
+        Method to decode the cursor of the request
+
+        Args:
+            request (Request): request object from the client side
+
+        Returns:
+            tuple: direction flag, date and id of the position or None for the first page
+        """
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            direction, day, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            if direction not in ('n', 'p'):
+                raise ValueError(direction)
+            return direction == 'p', date.fromisoformat(day), int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Method to fetch a single page of orders after or before the cursor position
+
+        Args:
+            queryset (QuerySet): filtered queryset of the list
+            request (Request): request object from the client side
+            view (View, optional): view object performing the pagination
+
+        Returns:
+            list: orders of the requested page, newest first
+        """
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        reverse = False
+        if position is None:
+            queryset = queryset.order_by('-date', '-id')
+        else:
+            reverse, day, pk = position
+            if reverse: # Walking back towards newer orders
+                queryset = queryset.filter(Q(date__gt=day) | Q(date=day, id__gt=pk), date__gte=day).order_by('date', 'id')
+            else:
+                queryset = queryset.filter(Q(date__lt=day) | Q(date=day, id__lt=pk), date__lte=day).order_by('-date', '-id')
+
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next_cursor = self.previous_cursor = None
+        if rows:
+            if has_more or reverse:
+                self.next_cursor = self.encode_cursor(rows[-1], reverse=False)
+            if (has_more and reverse) or (position is not None and not reverse):
+                self.previous_cursor = self.encode_cursor(rows[0], reverse=True)
+        return rows
+
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_link(self.next_cursor),
+            'previous': self.get_link(self.previous_cursor),
+            'results': data,
+        })
+
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+
+class AsyncOrderPageNumberPagination(AsyncPaginationMixin, OrderPageNumberPagination):
+    """
+    Page number pagination for orders in async views, the count-free mode is not available here
+    """
+
@@ -0,0 +1,104 @@
+import codecs
+import csv
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from .renderers import ORJSONRenderer, MessagePackRenderer, orjson, msgpack
+
+
+class ORJSONParser(JSONParser):
+    """
+    Parses JSON-serialized data with orjson.
+    Bodies in encodings other than UTF-8 fall back to 'JSONParser'
+    """
+
+    renderer_class = ORJSONRenderer
+
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """
+        Method to parse the incoming bytestream as JSON
+
+        Args:
+            stream (IO): request body
+            media_type (str, optional): media type of the body. Defaults to None.
+            parser_context (dict, optional): context of the parsing view. Defaults to None.
+
+        Returns:
+            object: parsed data
+        """
+
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or not self.strict or encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+
+class MessagePackParser(BaseParser):
+    """
+    Parses MessagePack-serialized data
+    """
+
+    media_type = 'application/msgpack'
+    renderer_class = MessagePackRenderer
+
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """
+        Method to parse the incoming bytestream as MessagePack
+
+        Args:
+            stream (IO): request body
+            media_type (str, optional): media type of the body. Defaults to None.
+            parser_context (dict, optional): context of the parsing view. Defaults to None.
+
+        Returns:
+            object: parsed data
+        """
+
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (msgpack.ExtraData, msgpack.FormatError, msgpack.StackError, ValueError) as exc:
+            raise ParseError('MessagePack parse error - %s' % str(exc))
+
+
+
+class CSVParser(BaseParser):
+    """
+    Parses CSV documents with a header row into a list of dictionaries.
+    Empty cells are left out of the rows so they count as missing values
+    """
+
+    media_type = 'text/csv'
+
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """
+        Method to parse the incoming bytestream as CSV
+
+        Args:
+            stream (IO): request body
+            media_type (str, optional): media type of the body. Defaults to None.
+            parser_context (dict, optional): context of the parsing view. Defaults to None.
+
+        Returns:
+            list: dictionaries of the non-empty cells of every row against the header names
+        """
+
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            reader = csv.DictReader(codecs.getreader(encoding)(stream))
+            # Byte order marks of spreadsheet exports are dropped from the header names
+            return [
+                {key.strip().lstrip('\ufeff'): value.strip() for key, value in row.items() if key is not None and value not in (None, '')}
+                for row in reader
+            ]
+        except (csv.Error, UnicodeDecodeError, LookupError) as exc:
+            raise ParseError('CSV parse error - %s' % str(exc))
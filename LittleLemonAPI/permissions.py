@@ -1,4 +1,5 @@
 from rest_framework.permissions import BasePermission
+from .roles import MANAGER, DELIVERY_CREW, get_roles
 
 
 class IsManagerUser(BasePermission):
@@ -123,7 +124,7 @@ def isManager(request):
     return bool(
         request.user
         and request.user.is_authenticated
-        and request.user.groups.filter(name='Manager').exists()
+        and MANAGER in get_roles(request)
     )
 
 
@@ -141,5 +142,5 @@ def isCrew(request):
     return bool(
         request.user
         and request.user.is_authenticated
-        and request.user.groups.filter(name='Delivery crew').exists()
+        and DELIVERY_CREW in get_roles(request)
     )
@@ -0,0 +1,272 @@
+import datetime
+import decimal
+from operator import itemgetter
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+
+class UnsupportedField(Exception):
+    """
+    Raised when a serializer contains a field that can not be read from plain column values
+    """
+
+
+
+class ProjectionPlan:
+    """
+    Precompiled read plan of a serializer.
+    Holds the columns to be read with 'values_list()' and the steps building the
+    serializer output from a row tuple, so no model objects or serializer fields are used per row
+    """
+
+    __slots__ = ('model', 'columns', 'steps', 'children')
+
+
+    def __init__(self, model, columns, steps, children):
+        """
+        Constructor for the plan object
+
+        Args:
+            model (Model): model read by the plan
+            columns (list): lookups read with 'values_list()', the primary key comes first
+            steps (list): pairs of output key and method building the value from a row
+            children (list): pairs of output key and 'ManyRelation' for nested lists
+        """
+
+        self.model = model
+        self.columns = columns
+        self.steps = steps
+        self.children = children
+
+
+    def project(self, queryset):
+        """
+        Method to turn a queryset of the model into a queryset of named row tuples
+
+        Args:
+            queryset (QuerySet): filtered and ordered queryset of the model
+
+        Returns:
+            QuerySet[Row]: queryset of the plan columns
+        """
+
+        return queryset.select_related(None).prefetch_related(None).values_list(*self.columns, named=True)
+
+
+    def render(self, rows):
+        """
+        Method to build the serializer output of the given rows
+
+        Args:
+            rows (list): rows produced by 'project()'
+
+        Returns:
+            list: dictionaries equal to the output of the serializer
+        """
+
+        steps = self.steps
+        data = [{key: build(row) for key, build in steps} for row in rows]
+        for key, relation in self.children:
+            grouped = relation.fetch([row[0] for row in rows])
+            for item, row in zip(data, rows):
+                item[key] = grouped.get(row[0], [])
+        return data
+
+
+    async def arender(self, rows):
+        """
+        Method to build the serializer output of the given rows, nested lists are read with the async ORM
+
+        Args:
+            rows (list): rows produced by 'project()'
+
+        Returns:
+            list: dictionaries equal to the output of the serializer
+        """
+
+        steps = self.steps
+        data = [{key: build(row) for key, build in steps} for row in rows]
+        for key, relation in self.children:
+            grouped = await relation.afetch([row[0] for row in rows])
+            for item, row in zip(data, rows):
+                item[key] = grouped.get(row[0], [])
+        return data
+
+
+
+class ManyRelation:
+    """
+    Nested list of related rows, read with one query for all parent rows
+    """
+
+    __slots__ = ('model', 'fk_column', 'plan')
+
+
+    def __init__(self, model, fk_column, plan):
+        self.model = model
+        self.fk_column = fk_column
+        self.plan = plan
+
+
+    def fetch(self, parent_ids):
+        """
+        Method to read and render the related rows of the given parents
+
+        Args:
+            parent_ids (list): primary keys of the parent rows
+
+        Returns:
+            dict: rendered related rows against the primary key of their parent
+        """
+
+        rows = list(self.get_queryset(parent_ids))
+        return self.group(self.plan.render(rows), rows)
+
+
+    async def afetch(self, parent_ids):
+        """
+        Method to read and render the related rows of the given parents with the async ORM
+
+        Args:
+            parent_ids (list): primary keys of the parent rows
+
+        Returns:
+            dict: rendered related rows against the primary key of their parent
+        """
+
+        rows = [row async for row in self.get_queryset(parent_ids)]
+        return self.group(await self.plan.arender(rows), rows)
+
+
+    def get_queryset(self, parent_ids):
+        queryset = self.model._default_manager.filter(**{f'{self.fk_column}__in': parent_ids}).order_by('pk')
+        return queryset.values_list(*self.plan.columns, self.fk_column, named=True)
+
+
+    def group(self, items, rows):
+        grouped = {}
+        for item, row in zip(items, rows):
+            grouped.setdefault(row[-1], []).append(item)
+        return grouped
+
+
+
+def get_converter(field):
+    """
+    Method to pick the fastest conversion of a column value giving the same output as the serializer field
+
+    Args:
+        field (Field): serializer field of the column
+
+    Returns:
+        callable: method converting a non null column value or None if the value is used as it is
+    """
+
+    if isinstance(field, serializers.DecimalField):
+        coerce = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+        if not coerce or field.localize or field.normalize_output or field.decimal_places is None:
+            return field.to_representation
+        exponent = decimal.Decimal('.1') ** field.decimal_places
+        context = decimal.getcontext().copy()
+        if field.max_digits is not None:
+            context.prec = field.max_digits
+        return lambda value: f'{value.quantize(exponent, rounding=field.rounding, context=context):f}'
+    if isinstance(field, serializers.DateTimeField):
+        return field.to_representation
+    if isinstance(field, serializers.DateField):
+        if getattr(field, 'format', api_settings.DATE_FORMAT) != api_settings.DATE_FORMAT or api_settings.DATE_FORMAT != 'iso-8601':
+            return field.to_representation
+        return datetime.date.isoformat
+    if isinstance(field, (serializers.BooleanField, serializers.IntegerField, serializers.CharField, serializers.RelatedField)):
+        return None
+    raise UnsupportedField(f'{field.__class__.__name__} {field.field_name}')
+
+
+def column_step(index, converter):
+    """
+    Method to build the step reading a single column of a row
+
+    Args:
+        index (int): position of the column in the row
+        converter (callable): conversion of non null values or None
+
+    Returns:
+        callable: method reading the value from a row
+    """
+
+    if converter is None:
+        return itemgetter(index)
+    return lambda row: None if row[index] is None else converter(row[index])
+
+
+def nested_step(steps):
+    return lambda row: {key: build(row) for key, build in steps}
+
+
+def compile_plan(serializer, model, prefix='', columns=None):
+    """
+    Method to compile the read plan of a model serializer
+
+    Args:
+        serializer (ModelSerializer): serializer instance whose output is reproduced
+        model (Model): model read by the serializer
+        prefix (str, optional): lookup prefix of a nested serializer. Defaults to ''.
+        columns (list, optional): columns shared with the parent serializer. Defaults to a new list.
+
+    Returns:
+        ProjectionPlan: compiled plan of the serializer
+    """
+
+    top = columns is None
+    if top:
+        columns = ['pk'] # Rows always start with the primary key for nested lists
+    steps = []
+    children = []
+
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if field.source == '*' or '.' in field.source:
+            raise UnsupportedField(field.field_name)
+        lookup = prefix + field.source
+
+        if isinstance(field, serializers.ListSerializer): # Nested list of a reverse relation
+            if not top:
+                raise UnsupportedField(field.field_name)
+            relation = model._meta.get_field(field.source)
+            child_plan = compile_plan(field.child, relation.related_model)
+            children.append((field.field_name, ManyRelation(relation.related_model, relation.field.name, child_plan)))
+        elif isinstance(field, serializers.BaseSerializer): # Nested object of a foreign key
+            relation = model._meta.get_field(field.source)
+            if relation.null: # A missing object would need a null check of the whole group
+                raise UnsupportedField(field.field_name)
+            nested = compile_plan(field, relation.related_model, f'{lookup}__', columns)
+            steps.append((field.field_name, nested_step(nested.steps)))
+        else:
+            columns.append(lookup)
+            steps.append((field.field_name, column_step(len(columns) - 1, get_converter(field))))
+
+    return ProjectionPlan(model, columns, steps, children)
+
+
+# Compiled plans against their serializer classes, None for serializers without a plan
+_plans = {}
+
+
+def get_plan(serializer_class):
+    """
+    Method to get the compiled plan of a serializer class, compiling it on first use
+
+    Args:
+        serializer_class (type): model serializer class
+
+    Returns:
+        ProjectionPlan: compiled plan or None if the serializer can not be projected
+    """
+
+    if serializer_class not in _plans:
+        try:
+            _plans[serializer_class] = compile_plan(serializer_class(), serializer_class.Meta.model)
+        except (UnsupportedField, AttributeError):
+            _plans[serializer_class] = None
+    return _plans[serializer_class]
@@ -0,0 +1,127 @@
+import math
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError: # orjson is optional, the stdlib encoder is used without it
+    orjson = None
+
+try:
+    import msgpack
+except ImportError: # msgpack is optional, the renderer is only listed in settings when it is installed
+    msgpack = None
+
+
+def has_non_finite(data):
+    """
+    Method to look for NaN and infinite floats, which orjson writes as null
+
+    Args:
+        data (object): data to be rendered
+
+    Returns:
+        bool: true if a float of the data is not finite
+    """
+
+    if isinstance(data, float):
+        return not math.isfinite(data)
+    if isinstance(data, dict):
+        return any(has_non_finite(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return any(has_non_finite(value) for value in data)
+    return False
+
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Renderer which serializes to JSON with orjson.
+    The output is byte for byte the one of 'JSONRenderer', values orjson does not handle natively
+    (decimals, dates and times) go through the encoder of rest framework.
+    Indented output and settings orjson can not reproduce fall back to 'JSONRenderer',
+    as do NaN and infinite floats so they are rejected like by the strict 'JSONRenderer'
+    """
+
+    options = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """
+        Method to render the data into JSON
+
+        Args:
+            data (object): data to be rendered
+            accepted_media_type (str, optional): media type accepted by the client. Defaults to None.
+            renderer_context (dict, optional): context of the rendering view. Defaults to None.
+
+        Returns:
+            bytes: JSON document
+        """
+
+        if data is None:
+            return b''
+
+        if (
+            orjson is None
+            or self.ensure_ascii
+            or not self.compact
+            or not self.strict
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=self.options)
+        except (orjson.JSONEncodeError, TypeError): # e.g. integers beyond 64 bits
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'null' in ret and has_non_finite(data): # Raises 'ValueError' like 'JSONRenderer'
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Escaping \u2028 and \u2029 like 'JSONRenderer' to keep the output a javascript subset
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+
+def msgpack_default(obj):
+    """
+    Method to convert the values msgpack does not handle natively, the same way as in the JSON output
+
+    Args:
+        obj (object): value to be converted
+
+    Returns:
+        object: msgpack compatible value
+    """
+
+    return encoders.JSONEncoder().default(obj)
+
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Renderer which serializes to MessagePack, the values are the ones of the JSON output
+    """
+
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """
+        Method to render the data into MessagePack
+
+        Args:
+            data (object): data to be rendered
+            accepted_media_type (str, optional): media type accepted by the client. Defaults to None.
+            renderer_context (dict, optional): context of the rendering view. Defaults to None.
+
+        Returns:
+            bytes: MessagePack document
+        """
+
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=msgpack_default, use_bin_type=True, datetime=False)
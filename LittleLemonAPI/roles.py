@@ -0,0 +1,109 @@
+from .cache import SharedTTLCache
+from .conf import get_setting
+
+
+# Names of the groups used for the roles of the users
+MANAGER = 'Manager'
+DELIVERY_CREW = 'Delivery crew'
+
+# Process-wide cache holding the group names of the users against their ids.
+# Entries are invalidated in every worker by the signal handlers in 'signals.py' whenever the groups change
+role_cache = SharedTTLCache(
+    maxsize=lambda: get_setting('ROLE_CACHE_SIZE'),
+    ttl=lambda: get_setting('ROLE_CACHE_TTL'),
+    prefix='littlelemon:roles-changed',
+)
+
+
+def get_user_roles(user):
+    """
+    Method to fetch the group names of a user with a single query, served from the role cache when possible
+
+    Args:
+        user (User): user object whose groups are required
+
+    Returns:
+        frozenset: names of the groups the user is present in
+    """
+
+    if not user or not user.is_authenticated:
+        return frozenset()
+
+    markers, roles = role_cache.read(user.pk)
+    if roles is None: # Fetching all group names at once on a cache miss
+        roles = frozenset(user.groups.values_list('name', flat=True))
+        role_cache.write(user.pk, markers, roles)
+    return roles
+
+
+async def aget_user_roles(user):
+    """
+    Method to fetch the group names of a user with the async ORM, served from the role cache when possible
+
+    Args:
+        user (User): user object whose groups are required
+
+    Returns:
+        frozenset: names of the groups the user is present in
+    """
+
+    if not user or not user.is_authenticated:
+        return frozenset()
+
+    markers, roles = role_cache.read(user.pk)
+    if roles is None:
+        roles = frozenset([name async for name in user.groups.values_list('name', flat=True)])
+        role_cache.write(user.pk, markers, roles)
+    return roles
+
+
+def get_roles(request):
+    """
+    Method to fetch the group names of the requesting user.
+    The result is memoized on the request so repeated permission checks cost nothing
+
+    Args:
+        request (Request): request object obtained from client side
+
+    Returns:
+        frozenset: names of the groups the requesting user is present in
+    """
+
+    user = getattr(request, 'user', None)
+    user_id = getattr(user, 'pk', None)
+    memo = getattr(request, '_littlelemon_roles', None)
+    if memo is not None and memo[0] == user_id: # Memo is only valid for the same user
+        return memo[1]
+
+    roles = get_user_roles(user)
+    request._littlelemon_roles = (user_id, roles)
+    return roles
+
+
+async def aget_roles(request):
+    """
+    Method to fetch the group names of the requesting user from async code.
+    The result is memoized on the request, so the permission classes calling 'get_roles()' afterwards need no query
+
+    Args:
+        request (Request): request object obtained from client side
+
+    Returns:
+        frozenset: names of the groups the requesting user is present in
+    """
+
+    user = getattr(request, 'user', None)
+    roles = await aget_user_roles(user)
+    request._littlelemon_roles = (getattr(user, 'pk', None), roles)
+    return roles
+
+
+def invalidate_roles(*user_ids):
+    """
+    Method to drop the cached roles of users in every worker process, all users are dropped if no id is given
+
+    Args:
+        user_ids (int): ids of the users whose roles changed
+    """
+
+    role_cache.invalidate(*user_ids)
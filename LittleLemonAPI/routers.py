@@ -0,0 +1,153 @@
+import contextlib
+import itertools
+from contextvars import ContextVar
+from django.db import DEFAULT_DB_ALIAS
+from .cache import get_shared_cache
+from .conf import get_setting
+
+# Prefix of the shared cache keys marking the users whose reads stay on the primary database
+PIN_KEY_PREFIX = 'littlelemon:primary-pin'
+
+# Replica alias the reads of the current request are sent to, None reads from the primary
+_read_alias = ContextVar('littlelemon_read_alias', default=None)
+
+# Round robin over the configured replicas
+_counter = itertools.count()
+
+
+def choose_replica():
+    """
+    Method to pick the replica for the next request
+
+    Returns:
+        str: alias of a read replica or None if no replica is configured
+    """
+
+    replicas = get_setting('READ_REPLICAS')
+    if not replicas:
+        return None
+    return replicas[next(_counter) % len(replicas)]
+
+
+@contextlib.contextmanager
+def use_replica(alias):
+    """
+    Context manager sending the reads made inside the block to a replica
+
+    Args:
+        alias (str): alias of the replica, None keeps the reads on the primary
+    """
+
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+def pin_key(user):
+    """
+    Method to build the shared cache key of the pin window of a user
+
+    Args:
+        user (User): authenticated user
+
+    Returns:
+        str: cache key of the pin window
+    """
+
+    return f'{PIN_KEY_PREFIX}:{user.pk}'
+
+
+def pin_user(user):
+    """
+    Method to open the pin window of a user, kept in the shared cache so it reaches every worker
+    and does not depend on the cookie handling of the client
+
+    Args:
+        user (User): user who wrote
+    """
+
+    seconds = get_setting('PRIMARY_PIN_SECONDS')
+    if seconds and user is not None and user.is_authenticated:
+        get_shared_cache().set(pin_key(user), True, timeout=seconds)
+
+
+def is_pinned(request):
+    """
+    Method to check whether a user wrote recently and has to read its own writes from the primary
+
+    Args:
+        request (Request): authenticated request object from the client side
+
+    Returns:
+        bool: true while the pin window set by the last write of the user is open
+    """
+
+    user = request.user
+    return bool(user and user.is_authenticated and get_shared_cache().get(pin_key(user)))
+
+
+
+class ReplicaRouter:
+    """
+    Database router sending the reads of replica-enabled requests to a read replica.
+    Writes and every read outside such requests go to the primary database
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True # Replicas hold copies of the same tables
+
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS # Replicas receive the schema by replication
+
+
+
+class ReplicaReadMixin:
+    """
+    View mixin reading safe requests from a replica.
+    Authentication and permissions are checked on the primary first, users inside their pin window
+    after a write keep reading from the primary so they see their own changes
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.read_database = None
+        if request.method in ('GET', 'HEAD', 'OPTIONS') and not is_pinned(request):
+            self.read_database = choose_replica()
+        self._replica_token = _read_alias.set(self.read_database)
+
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            _read_alias.reset(token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+
+class PrimaryPinMiddleware:
+    """
+    Middleware opening the pin window of the user after every successful write,
+    the following reads of the user within 'PRIMARY_PIN_SECONDS' go to the primary database
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE') and response.status_code < 400:
+            pin_user(getattr(request, 'user', None)) # Set by the API authentication of the view
+        return response
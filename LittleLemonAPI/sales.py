@@ -0,0 +1,130 @@
+from django.db import connections, router, transaction
+from django.db.models import F, Sum
+from .models import OrderItem, OrderHistory, OrderHistoryItem, DailySales, DailyItemSales
+from .sql import upsert_increment
+
+
+def record_sales(date, total, items, orders=1):
+    """
+    Method to add the figures of an order onto the daily rollup tables.
+    Has to run inside the transaction which creates the order, so the rollup commits together with it
+
+    Args:
+        date (date): date of the order
+        total (Decimal): total of the order
+        items (list): tuples of menuitem id, quantity and price of the ordered items
+        orders (int, optional): number of orders added, -1 removes the figures again. Defaults to 1.
+
+    Returns:
+        None
+    """
+
+    sign = 1 if orders >= 0 else -1
+    units = {}
+    revenue = {}
+    for menuitem_id, quantity, price in items:
+        units[menuitem_id] = units.get(menuitem_id, 0) + quantity
+        revenue[menuitem_id] = revenue.get(menuitem_id, 0) + price
+
+    upsert_increment(
+        DailySales,
+        [{'date': date, 'orders': orders, 'units': sign * sum(units.values()), 'revenue': sign * total}],
+        unique_fields=['date'],
+        increment_fields=['orders', 'units', 'revenue'],
+    )
+    upsert_increment(
+        DailyItemSales,
+        [
+            {'date': date, 'menuitem': menuitem_id, 'units': sign * units[menuitem_id], 'revenue': sign * revenue[menuitem_id]}
+            for menuitem_id in units
+        ],
+        unique_fields=['date', 'menuitem'],
+        increment_fields=['units', 'revenue'],
+    )
+
+
+def discard_sales(order):
+    """
+    Method to remove the figures of an order which is about to be deleted from the daily rollup tables
+
+    Args:
+        order (Order): order to be deleted
+
+    Returns:
+        None
+    """
+
+    items = list(OrderItem.objects.filter(order=order).values_list('menuitem_id', 'quantity', 'price'))
+    record_sales(order.date, order.total, items, orders=-1)
+
+
+def rebuild_sales_rollup(order_model=OrderHistory, item_model=OrderHistoryItem, day_model=DailySales, day_item_model=DailyItemSales):
+    """
+    Method to rebuild the daily rollup tables from the whole order history with two set-based statements.
+    Live and archived orders are read together, the models can be replaced by their historical versions inside migrations
+
+    Returns:
+        tuple: number of day rows and day item rows written
+    """
+
+    connection = connections[router.db_for_write(day_model)]
+    quote = connection.ops.quote_name
+    orders, items = quote(order_model._meta.db_table), quote(item_model._meta.db_table)
+    days, day_items = quote(day_model._meta.db_table), quote(day_item_model._meta.db_table)
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {day_items}')
+        cursor.execute(f'DELETE FROM {days}')
+        cursor.execute(
+            f'INSERT INTO {days} ("date", "orders", "units", "revenue") '
+            f'SELECT o."date", COUNT(*), COALESCE(SUM(i."units"), 0), SUM(o."total") FROM {orders} o '
+            f'LEFT JOIN (SELECT "order_id", SUM("quantity") AS "units" FROM {items} GROUP BY "order_id") i '
+            f'ON i."order_id" = o."id" GROUP BY o."date"'
+        )
+        day_count = cursor.rowcount
+        cursor.execute(
+            f'INSERT INTO {day_items} ("date", "menuitem_id", "units", "revenue") '
+            f'SELECT o."date", i."menuitem_id", SUM(i."quantity"), SUM(i."price") FROM {items} i '
+            f'JOIN {orders} o ON o."id" = i."order_id" GROUP BY o."date", i."menuitem_id"'
+        )
+        return day_count, cursor.rowcount
+
+
+def sales_report(start=None, end=None):
+    """
+    Method to read the sales figures of a date range from the rollup tables.
+    The cost depends on the number of days and menu items in the range, not on the number of orders
+
+    Args:
+        start (date, optional): first day of the range. Defaults to the first day with sales.
+        end (date, optional): last day of the range. Defaults to the last day with sales.
+
+    Returns:
+        dict: totals of the range with the figures per day, menu item and category
+    """
+
+    dates = {}
+    if start is not None:
+        dates['date__gte'] = start
+    if end is not None:
+        dates['date__lte'] = end
+
+    days = DailySales.objects.filter(**dates).order_by('date')
+    item_rows = DailyItemSales.objects.filter(**dates)
+    totals = days.aggregate(orders=Sum('orders'), units=Sum('units'), revenue=Sum('revenue'))
+    return {
+        'start': start,
+        'end': end,
+        'orders': totals['orders'] or 0,
+        'units': totals['units'] or 0,
+        'revenue': totals['revenue'] or 0,
+        'days': days.values('date', 'orders', 'units', 'revenue'),
+        'menu_items': (
+            item_rows.values('menuitem', title=F('menuitem__title'))
+            .annotate(units=Sum('units'), revenue=Sum('revenue')).order_by('-revenue', 'menuitem')
+        ),
+        'categories': (
+            item_rows.values(category=F('menuitem__category'), title=F('menuitem__category__title'))
+            .annotate(units=Sum('units'), revenue=Sum('revenue')).order_by('-revenue', 'category')
+        ),
+    }
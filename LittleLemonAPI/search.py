@@ -0,0 +1,187 @@
+import re
+from django.db import connection, connections, router
+from rest_framework.filters import SearchFilter
+from .cache import TTLCache, get_menu_version
+from .models import MenuItem
+
+
+# Full-text index of the menu items, kept in sync with the menu and category tables by database triggers
+INDEX_TABLE = 'LittleLemonAPI_menuitem_fts'
+
+# Vocabulary of the full-text index used to correct misspelled search terms
+VOCABULARY_TABLE = 'LittleLemonAPI_menuitem_fts_vocab'
+
+# Index vocabularies of the current menu versions
+_vocabularies = TTLCache(maxsize=2, ttl=3600)
+
+# Characters indexed as part of a word by the 'unicode61' tokenizer
+_WORD = re.compile(r'\w+')
+
+# Databases known to have the full-text index against their alias and name
+_index_tables = {}
+
+
+def index_available(using=None):
+    """
+    Method to check whether the full-text index exists in the database
+
+    Args:
+        using (BaseDatabaseWrapper, optional): database connection. Defaults to the one menu items are read from.
+
+    Returns:
+        bool: true if the database is SQLite and the index table is present
+    """
+
+    using = using or connections[router.db_for_read(MenuItem)]
+    if using.vendor != 'sqlite':
+        return False
+    key = (using.alias, str(using.settings_dict['NAME']))
+    if key not in _index_tables: # Looking the table up once per database
+        with using.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [INDEX_TABLE])
+            _index_tables[key] = cursor.fetchone() is not None
+    return _index_tables[key]
+
+
+def edit_distance(first, second, limit):
+    """
+    Method to compute the Levenshtein distance of two words, giving up once it exceeds the limit
+
+    Args:
+        first (str): first word
+        second (str): second word
+        limit (int): largest distance of interest
+
+    Returns:
+        int: distance of the words or 'limit + 1' if it is larger than the limit
+    """
+
+    if abs(len(first) - len(second)) > limit:
+        return limit + 1
+    previous = list(range(len(second) + 1))
+    for i, char in enumerate(first, start=1):
+        current = [i]
+        for j, other in enumerate(second, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def get_vocabulary():
+    """
+    Method to read the words of the full-text index grouped by their length,
+    cached for the current menu version. Numbers are left out as they are never misspelled
+
+    Returns:
+        dict: lists of indexed words against their length
+    """
+
+    version = get_menu_version()
+    words = _vocabularies.get(version)
+    if words is None:
+        words = {}
+        using = connections[router.db_for_read(MenuItem)]
+        with using.cursor() as cursor:
+            cursor.execute(f'SELECT term FROM {using.ops.quote_name(VOCABULARY_TABLE)}')
+            for (term,) in cursor.fetchall():
+                if not term.isdigit():
+                    words.setdefault(len(term), []).append(term)
+        _vocabularies.set(version, words)
+    return words
+
+
+def similar_words(word):
+    """
+    Method to find the indexed words a misspelled word could stand for.
+    One typo is tolerated for words of up to five characters and two for longer words
+
+    Args:
+        word (str): word typed by the client
+
+    Returns:
+        list: indexed words close to the given word
+    """
+
+    limit = 1 if len(word) <= 5 else 2
+    vocabulary = get_vocabulary()
+    return [
+        term
+        for length in range(len(word) - limit, len(word) + limit + 1) # Only lengths within the limit can match
+        for term in vocabulary.get(length, [])
+        if term != word and edit_distance(word, term, limit) <= limit
+    ]
+
+
+
+class MenuSearchFilter(SearchFilter):
+    """
+    Search filter for the menu items backed by the SQLite FTS5 index.
+    Every word matches as a prefix by default and results are ranked by relevance unless an ordering is requested.
+    'search_mode=exact' matches whole words only and 'search_mode=typo' also matches words with typos.
+    Falls back to the 'LIKE' based search of 'SearchFilter' when the index is not available
+    """
+
+    search_mode_param = 'search_mode'
+    search_modes = ('prefix', 'exact', 'typo')
+
+
+    def get_search_mode(self, request):
+        mode = request.query_params.get(self.search_mode_param, 'prefix')
+        return mode if mode in self.search_modes else 'prefix'
+
+
+    def build_match(self, terms, mode):
+        """
+        Method to build the FTS5 query matching all search terms
+
+        Args:
+            terms (list): search terms of the client
+            mode (str): search mode of the request
+
+        Returns:
+            str: FTS5 match expression or None if no term contains a word
+        """
+
+        groups = []
+        for term in terms:
+            for word in _WORD.findall(term.lower()):
+                options = [f'"{word}"' if mode == 'exact' else f'"{word}"*']
+                if mode == 'typo':
+                    options += [f'"{similar}"' for similar in similar_words(word)]
+                groups.append(f'({" OR ".join(options)})')
+        return ' AND '.join(groups) or None
+
+
+    def filter_queryset(self, request, queryset, view):
+        """
+        Method to filter and rank the menu items matching the search terms
+
+        Args:
+            request (Request): request object from the client side
+            queryset (QuerySet): queryset of the menu items
+            view (View): view object performing the search
+
+        Returns:
+            QuerySet[MenuItem]: matching menu items
+        """
+
+        terms = self.get_search_terms(request)
+        if not terms or queryset.model is not MenuItem or not index_available():
+            return super().filter_queryset(request, queryset, view)
+
+        match = self.build_match(terms, self.get_search_mode(request))
+        if match is None:
+            return queryset.none()
+
+        # Joining the index so SQLite drives the query from the full-text match
+        index = connection.ops.quote_name(INDEX_TABLE)
+        table = connection.ops.quote_name(MenuItem._meta.db_table)
+        ranked = not request.query_params.get('ordering') # Ranking by relevance when no ordering is requested
+        return queryset.extra(
+            tables=[INDEX_TABLE],
+            where=[f'{index}.rowid = {table}.id', f'{index} MATCH %s'],
+            params=[match],
+            order_by=[f'{INDEX_TABLE}.rank', 'id'] if ranked else None,
+        )
@@ -1,10 +1,65 @@
 from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
-from rest_framework.validators import UniqueTogetherValidator, UniqueValidator
-from .models import MenuItem, Category, Cart, Order, OrderItem
+from .models import MenuItem, Category, Cart, Order, OrderItem, DailySales, OrderHistory, OrderHistoryItem
+from .roles import DELIVERY_CREW, get_user_roles
 from decimal import Decimal
 
 
+def validate_crew_member(user):
+    """
+    Method to validate that a user assigned to orders is a delivery crew member
+
+    Args:
+        user (User): user to be assigned
+
+    Raises:
+        ValidationError: if the user is not in the delivery crew group
+    """
+    
+    if DELIVERY_CREW not in get_user_roles(user):
+        raise serializers.ValidationError('User is not a delivery crew member.')
+
+
+
+class UniqueConstraintMixin:
+    """
+    Serializer mixin leaving uniqueness to the constraints of the database instead of pre-check queries.
+    An 'IntegrityError' of the write is translated into the error payload of the unique validators,
+    the violated rule is only looked up on that failure path
+    """
+    
+    # Unique rules of the model as tuples of fields, the key of the error and its message
+    unique_rules = []
+    
+    
+    def save(self, **kwargs):
+        """
+        Method to save the object inside a savepoint so a violated constraint can be reported
+
+        Raises:
+            ValidationError: if the write violates one of the unique rules
+
+        Returns:
+            Model: saved object
+        """
+        
+        try:
+            with transaction.atomic():
+                return super().save(**kwargs)
+        except IntegrityError:
+            attrs = {**self.validated_data, **kwargs}
+            for fields, key, message in self.unique_rules:
+                lookup = {field: attrs[field] if field in attrs else getattr(self.instance, field) for field in fields}
+                conflicts = self.Meta.model._default_manager.filter(**lookup)
+                if self.instance is not None:
+                    conflicts = conflicts.exclude(pk=self.instance.pk)
+                if conflicts.exists():
+                    raise serializers.ValidationError({key: [message]})
+            raise
+
+
+
 class CategorySerializer(serializers.ModelSerializer):
     """
     Model serializer for 'Category' model
@@ -20,13 +75,16 @@ class CategorySerializer(serializers.ModelSerializer):
 
 
 
-class MenuItemSerializer(serializers.ModelSerializer):
+class MenuItemSerializer(UniqueConstraintMixin, serializers.ModelSerializer):
     """
-    Model serializer for 'MenuItem' model
+    Model serializer for 'MenuItem' model.
+    Unique titles are enforced by the 'menuitem_title_unique' constraint, which also keeps
+    every (title, category) pair unique, so no query runs before the write
     """
     
     category = CategorySerializer(read_only=True)
     category_id = serializers.IntegerField(write_only=True)
+    unique_rules = [(['title'], 'title', 'This field must be unique.')]
     
     class Meta:
         """
@@ -36,22 +94,13 @@ class MenuItemSerializer(serializers.ModelSerializer):
         
         model = MenuItem
         fields = ['id', 'title', 'price', 'featured', 'category', 'category_id']
-        validators = [
-            UniqueTogetherValidator(
-                queryset=MenuItem.objects.all(),
-                fields=['title', 'category_id']
-            )
-        ]
+        validators = [] # Uniqueness is checked by the database on save
         extra_kwargs = {
             'price': {
                 'min_value': 1.0
             },
             'title': {
-                'validators': [
-                    UniqueValidator(
-                        queryset=MenuItem.objects.all()
-                    )
-                ],
+                'validators': [],
                 'max_length': 150
             }
         }
@@ -79,13 +128,13 @@ class UserSerializer(serializers.ModelSerializer):
 
 class CartSerializer(serializers.ModelSerializer):
     """
-    Model serializer for 'Cart' model
+    Model serializer for 'Cart' model.
+    Prices are read only, they are always computed from the price of the menu item
     """
     
     menuitem = MenuItemSerializer(read_only=True)
     menuitem_id = serializers.IntegerField(write_only=True)
     user = UserSerializer(read_only=True)
-    user_id = serializers.IntegerField(write_only=True)
     # calculated_unit_price = serializers.SerializerMethodField(method_name='get_price')
     # total_price = serializers.SerializerMethodField(method_name='calculate_price')
     
@@ -96,22 +145,11 @@ class CartSerializer(serializers.ModelSerializer):
         """
         
         model = Cart
-        fields = ['id', 'user', 'user_id', 'menuitem', 'menuitem_id', 'quantity', 'unit_price', 'price']
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Cart.objects.all(),
-                fields = ['menuitem_id', 'user_id']
-            )
-        ]
+        fields = ['id', 'user', 'menuitem', 'menuitem_id', 'quantity', 'unit_price', 'price']
+        read_only_fields = ['unit_price', 'price']
         extra_kwargs = {
             'quantity': {
-                'min_value': 0,
-            },
-            'unit_price': {
-                'min_value': 0.0
-            },
-            'price': {
-                'min_value': 0.0
+                'min_value': 1,
             },
         }
     
@@ -124,21 +162,38 @@ class CartSerializer(serializers.ModelSerializer):
 
 
 
+class OrderMenuItemSerializer(serializers.ModelSerializer):
+    """
+    Model serializer for the 'MenuItem' nested in order items, the category is shown by its id
+    """
+    
+    class Meta:
+        """
+        Meta class for 'OrderMenuItemSerializer' specifying 'model' object and 'fields' to display.
+        The fields are listed explicitly, so new columns of the model do not change the order responses
+        """
+        
+        model = MenuItem
+        fields = ['id', 'title', 'price', 'featured', 'category']
+
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
     """
     Model serializer for 'OrderItem' model
     """
     
+    menuitem = OrderMenuItemSerializer(read_only=True)
+    
     class Meta:
         """
         Meta class for 'OrderItemSerializer' specifying 'model' object and
         'fields' to display with validations applied to them.
-        Further the depth of the fields is also specified to show details upto specified level
+        The parent 'order' is left out as the items are always displayed inside their order
         """
         
         model = OrderItem
-        fields = ['id', 'order','menuitem', 'quantity', 'price', 'unit_price']
-        depth = 1
+        fields = ['id', 'menuitem', 'quantity', 'price', 'unit_price']
         extra_kwargs = {
             'quantity': {
                 'min_value': 0,
@@ -167,3 +222,131 @@ class OrderSerializer(serializers.ModelSerializer):
         
         model = Order
         fields = ['id', 'user', 'delivery_crew', 'status', 'total', 'date', 'order_items']
+        extra_kwargs = {
+            'delivery_crew': {
+                'validators': [validate_crew_member]
+            },
+        }
+
+
+
+class OrderHistoryItemSerializer(OrderItemSerializer):
+    """
+    Model serializer for 'OrderHistoryItem' model, gives the same output as 'OrderItemSerializer'
+    """
+    
+    class Meta(OrderItemSerializer.Meta):
+        model = OrderHistoryItem
+
+
+
+class OrderHistorySerializer(OrderSerializer):
+    """
+    Model serializer for 'OrderHistory' model reading live and archived orders, gives the same output as 'OrderSerializer'
+    """
+    
+    order_items = OrderHistoryItemSerializer(read_only=True, many=True)
+    
+    class Meta(OrderSerializer.Meta):
+        model = OrderHistory
+
+
+
+class OrderDispatchSerializer(serializers.Serializer):
+    """
+    Serializer for assigning a delivery crew member and/or a status to many orders at once
+    """
+    
+    # Largest number of orders dispatched by a single request
+    max_orders = 500
+    
+    orders = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=max_orders)
+    delivery_crew = serializers.PrimaryKeyRelatedField(
+        queryset=User.objects.all(), required=False, allow_null=True, validators=[validate_crew_member]
+    )
+    status = serializers.BooleanField(required=False)
+    
+    
+    def validate(self, attrs):
+        """
+        Method to check that the request changes at least one field of the orders
+
+        Args:
+            attrs (dict): validated fields
+
+        Returns:
+            dict: validated fields
+        """
+        
+        if 'delivery_crew' not in attrs and 'status' not in attrs:
+            raise serializers.ValidationError('Either delivery_crew or status is required.')
+        return attrs
+
+
+
+class MenuItemImportSerializer(serializers.Serializer):
+    """
+    Serializer for a single row of a menu import, rows with an 'id' update that menu item.
+    Uniqueness and the existence of categories are checked for the whole import at once, not here
+    """
+    
+    id = serializers.IntegerField(min_value=1, required=False)
+    title = serializers.CharField(max_length=150)
+    price = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=Decimal('1.00'))
+    featured = serializers.BooleanField(default=False)
+    category_id = serializers.IntegerField(min_value=1)
+
+
+
+class DailySalesSerializer(serializers.ModelSerializer):
+    """
+    Model serializer for 'DailySales' model
+    """
+    
+    class Meta:
+        """
+        Meta class for 'DailySalesSerializer' specifying 'model' object and 'fields' to display
+        """
+        
+        model = DailySales
+        fields = ['date', 'orders', 'units', 'revenue']
+
+
+
+class ItemSalesSerializer(serializers.Serializer):
+    """
+    Serializer for the sales figures of a menu item over a date range
+    """
+    
+    menuitem = serializers.IntegerField()
+    title = serializers.CharField()
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+
+class CategorySalesSerializer(serializers.Serializer):
+    """
+    Serializer for the sales figures of a category over a date range
+    """
+    
+    category = serializers.IntegerField()
+    title = serializers.CharField()
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+
+class SalesReportSerializer(serializers.Serializer):
+    """
+    Serializer for the sales report of a date range read from the daily rollup tables
+    """
+    
+    start = serializers.DateField(allow_null=True)
+    end = serializers.DateField(allow_null=True)
+    orders = serializers.IntegerField()
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=12, decimal_places=2)
+    days = DailySalesSerializer(many=True)
+    menu_items = ItemSalesSerializer(many=True)
+    categories = CategorySalesSerializer(many=True)
@@ -0,0 +1,98 @@
+from django.contrib.auth.models import User, Group
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from .authentication import invalidate_tokens
+from .cache import bump_menu_version
+from .events import broker, order_event
+from .models import Category, MenuItem, Order
+from .roles import invalidate_roles
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Signal handler to drop cached roles whenever users are added to or removed from groups
+
+    Args:
+        sender (Model): intermediate model of the 'User.groups' relation
+        instance (User | Group): object whose relation was changed
+        action (str): type of change performed on the relation
+        reverse (bool): true if the change was made from the group side
+        pk_set (set): primary keys of the related objects, None for clear actions
+    """
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse: # 'user.groups' was changed
+        invalidate_roles(instance.pk)
+    elif pk_set: # 'group.user_set' was changed for known users
+        invalidate_roles(*pk_set)
+    else: # 'group.user_set' was cleared, affected users are unknown
+        invalidate_roles()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, **kwargs):
+    """
+    Signal handler to drop all cached roles when a group is renamed or removed
+    """
+
+    invalidate_roles()
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    """
+    Signal handler to drop the cached roles of a removed user, its tokens are dropped by their own deletion
+    """
+
+    invalidate_roles(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Signal handler to drop the cached tokens of a changed user, so deactivated users are rejected immediately.
+    Logins only touching 'last_login' are skipped
+    """
+
+    if created or update_fields == frozenset(['last_login']):
+        return
+    invalidate_tokens(*Token.objects.filter(user=instance).values_list('key', flat=True))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """
+    Signal handler to drop a revoked token, e.g. on logout through '/auth/token/logout'
+    """
+
+    invalidate_tokens(instance.key)
+
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def menu_changed(sender, **kwargs):
+    """
+    Signal handler to invalidate the cached menu and category responses
+    """
+
+    bump_menu_version()
+
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Signal handler to announce placed orders and changes of their status or crew member to the order streams.
+    Saves touching neither field are skipped, the event is published after the transaction commits
+    """
+
+    if update_fields is not None and not {'status', 'delivery_crew'} & set(update_fields):
+        return
+    broker.publish_on_commit([order_event(instance.pk, instance.user_id, instance.status, instance.delivery_crew_id, instance.updated_at)])
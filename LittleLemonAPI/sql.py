@@ -0,0 +1,71 @@
+from django.db import connections, router
+
+
+def column(model, name):
+    """
+    Method to get the quoted database column of a model field
+
+    Args:
+        model (Model): model of the field
+        name (str): name of the field
+
+    Returns:
+        str: quoted column name
+    """
+
+    return connections[router.db_for_write(model)].ops.quote_name(model._meta.get_field(name).column)
+
+
+def on_conflict(model, unique_fields, assignments):
+    """
+    Method to build the 'ON CONFLICT ... DO UPDATE' clause of an upsert.
+    The clause is understood by SQLite 3.24+ and PostgreSQL
+
+    Args:
+        model (Model): model written by the upsert
+        unique_fields (list): fields of the unique constraint the insert conflicts on
+        assignments (dict): SQL expressions against the names of the fields they update,
+            'excluded' refers to the row proposed for insertion
+
+    Returns:
+        str: conflict clause to be appended to an 'INSERT' statement
+    """
+
+    target = ', '.join(column(model, name) for name in unique_fields)
+    updates = ', '.join(f'{column(model, name)} = {expression}' for name, expression in assignments.items())
+    return f'ON CONFLICT ({target}) DO UPDATE SET {updates}'
+
+
+def upsert_increment(model, rows, unique_fields, increment_fields):
+    """
+    Method to insert rows or add their values onto the existing rows with a single statement.
+    Used for counters which several transactions update at the same time, as no row is read first
+
+    Args:
+        model (Model): model written by the upsert
+        rows (list): dictionaries of field values, all rows have the same keys
+        unique_fields (list): fields identifying an existing row
+        increment_fields (list): fields added onto the existing row on conflict
+
+    Returns:
+        int: number of rows inserted or updated
+    """
+
+    if not rows:
+        return 0
+    connection = connections[router.db_for_write(model)]
+    table = connection.ops.quote_name(model._meta.db_table)
+    names = list(rows[0])
+    fields = [model._meta.get_field(name) for name in names]
+    placeholders = '(' + ', '.join(['%s'] * len(names)) + ')'
+    assignments = {name: f'{table}.{column(model, name)} + excluded.{column(model, name)}' for name in increment_fields}
+
+    sql = (
+        f'INSERT INTO {table} ({", ".join(column(model, name) for name in names)}) '
+        f'VALUES {", ".join([placeholders] * len(rows))} '
+        f'{on_conflict(model, unique_fields, assignments)}'
+    )
+    params = [field.get_db_prep_save(row[field.name], connection) for row in rows for field in fields]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
@@ -1,3 +1,1613 @@
-from django.test import TestCase
+from django.test import AsyncClient, TestCase, TransactionTestCase
+from django.contrib.auth.models import User, Group
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, router
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import BaseSerializer
+from rest_framework.request import Request
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory
+from .models import Category, MenuItem, Cart, Order, OrderItem, DailySales, DailyItemSales, OutboxEvent, ArchivedOrder, ArchivedOrderItem
+from .sales import rebuild_sales_rollup
+from .roles import MANAGER, DELIVERY_CREW, invalidate_roles, role_cache
+from .authentication import invalidate_tokens, token_cache
+from .throttling import BucketStore, get_store, get_store_path
+from .conf import DEFAULTS
+from .checks import check_shared_cache
+from .cache import get_or_build
+from .projections import get_plan
+from .serializers import MenuItemSerializer, CategorySerializer, CartSerializer, OrderSerializer
+from .pagination import OrderKeysetPagination, OrderPageNumberPagination
+from .renderers import ORJSONRenderer
+from .parsers import ORJSONParser
+from .metrics import registry
+from .routers import pin_key, use_replica
+from django.utils import timezone
+from .events import broker, order_event
+from datetime import datetime, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import hmac
+import asyncio
+import io
+import multiprocessing
+import os
+import tempfile
+import msgpack
+from decimal import Decimal
+import json
+import threading
+import time
+import unittest
+from unittest import mock
+from django.conf import settings
+from django.test import override_settings
+
+def setUpModule():
+    """
+    Module fixture keeping the throttle buckets and the shared cache of the test run in a temporary directory of its own
+    """
+
+    directory = tempfile.TemporaryDirectory()
+    unittest.addModuleCleanup(directory.cleanup)
+    patcher = mock.patch.dict(DEFAULTS, {'THROTTLE_DATABASE': os.path.join(directory.name, 'throttle.sqlite3')})
+    patcher.start()
+    unittest.addModuleCleanup(patcher.stop)
+    caches_override = override_settings(CACHES={
+        'default': {**settings.CACHES['default'], 'LOCATION': os.path.join(directory.name, 'cache')},
+    })
+    caches_override.enable()
+    unittest.addModuleCleanup(caches_override.disable)
+
+
 
 # Create your tests here.
+class APITestCase(TestCase):
+    """
+    Base test case creating the role groups and one user for every role
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.managers = Group.objects.create(name=MANAGER)
+        cls.crews = Group.objects.create(name=DELIVERY_CREW)
+        cls.manager = User.objects.create_user(username='Sana', password='lemon@san!')
+        cls.crew = User.objects.create_user(username='Adrian', password='lemon@adr!')
+        cls.customer = User.objects.create_user(username='Mario', password='lemon@mar!')
+        cls.managers.user_set.add(cls.manager)
+        cls.crews.user_set.add(cls.crew)
+
+
+    def setUp(self):
+        cache.clear()
+        get_store().reset() # Resetting the throttle buckets
+        invalidate_roles()
+        invalidate_tokens()
+        self.client = APIClient()
+
+
+    def login(self, user):
+        self.client.force_authenticate(user=user)
+
+
+    def make_menu(self, count, category=None):
+        """
+        Method to create menu items in a single category
+
+        Args:
+            count (int): number of menu items to create
+            category (Category, optional): category of the items. Defaults to a new category.
+
+        Returns:
+            list: created menu items
+        """
+
+        category = category or Category.objects.create(slug='mains', title='Mains')
+        return MenuItem.objects.bulk_create([
+            MenuItem(title=f'Item {category.pk}-{i}', price=Decimal('2.50') + i, featured=False, category=category)
+            for i in range(count)
+        ])
+
+
+    def fill_cart(self, user, items, quantity=2):
+        Cart.objects.bulk_create([
+            Cart(user=user, menuitem=item, quantity=quantity, unit_price=item.price, price=item.price * quantity)
+            for item in items
+        ])
+
+
+
+def group_queries(queries):
+    """
+    Method to pick the queries reading the groups of the users
+
+    Args:
+        queries (list): queries captured by 'CaptureQueriesContext'
+
+    Returns:
+        list: sql of the queries touching the group tables
+    """
+
+    return [query['sql'] for query in queries if 'auth_group' in query['sql']]
+
+
+
+class RoleCacheTest(APITestCase):
+    """
+    Tests for the cross-request role cache used by the permission classes
+    """
+
+    def test_warm_cache_makes_no_group_queries(self):
+        self.login(self.customer)
+        self.client.get('/api/orders')
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/orders')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(group_queries(ctx.captured_queries), [])
+
+
+    def test_cold_cache_makes_single_group_query(self):
+        self.login(self.customer)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/orders')
+        self.assertEqual(len(group_queries(ctx.captured_queries)), 1)
+
+
+    def test_added_manager_takes_effect_immediately(self):
+        self.login(self.customer)
+        self.assertEqual(self.client.get('/api/groups/manager/users').status_code, 403)
+
+        self.managers.user_set.add(self.customer)
+        self.assertEqual(self.client.get('/api/groups/manager/users').status_code, 200)
+
+
+    def test_removed_manager_takes_effect_immediately(self):
+        self.login(self.manager)
+        self.client.get('/api/groups/manager/users')
+
+        other = User.objects.create_user(username='Heer', password='lemon@hee!')
+        self.managers.user_set.add(other)
+        self.assertEqual(self.client.delete(f'/api/groups/manager/users/{self.manager.pk}').status_code, 204)
+        self.assertEqual(self.client.get('/api/groups/manager/users').status_code, 403)
+
+
+    def test_removed_crew_takes_effect_immediately(self):
+        self.login(self.crew)
+        self.assertEqual(self.client.patch('/api/orders/1', {'status': True}).status_code, 404)
+
+        self.crew.groups.clear()
+        self.assertEqual(self.client.patch('/api/orders/1', {'status': True}).status_code, 403)
+
+
+    def test_removal_reaches_other_workers(self):
+        self.login(self.manager)
+        self.assertEqual(self.client.get('/api/groups/manager/users').status_code, 200)
+
+        entries = dict(role_cache._data) # Cache of a worker which did not handle the removal
+        self.managers.user_set.remove(self.manager)
+        role_cache._data.update(entries)
+        self.assertEqual(self.client.get('/api/groups/manager/users').status_code, 403)
+
+
+
+class CheckoutTest(APITestCase):
+    """
+    Tests for converting the cart into an order
+    """
+
+    def test_checkout_moves_cart_into_order(self):
+        items = self.make_menu(3)
+        self.fill_cart(self.customer, items)
+        self.login(self.customer)
+
+        response = self.client.post('/api/orders')
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(user=self.customer)
+        self.assertEqual(order.total, sum(item.price * 2 for item in items))
+        self.assertEqual(OrderItem.objects.filter(order=order).count(), 3)
+        self.assertFalse(Cart.objects.filter(user=self.customer).exists())
+        self.assertEqual(len(response.data['item']['order_items']), 3)
+
+
+    def test_empty_cart(self):
+        self.login(self.customer)
+        self.assertEqual(self.client.post('/api/orders').status_code, 204)
+        self.assertFalse(Order.objects.exists())
+
+
+    def test_query_count_is_constant_in_cart_size(self):
+        counts = []
+        for size in (1, 25):
+            user = User.objects.create_user(username=f'customer-{size}')
+            self.fill_cart(user, self.make_menu(size))
+            self.login(user)
+            self.client.get('/api/orders') # Warming the role cache
+
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.post('/api/orders').status_code, 201)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+
+class ConcurrentCheckoutTest(TransactionTestCase):
+    """
+    Tests for parallel checkouts of the same cart, committed for real so the requests contend for the database locks
+    """
+
+    def setUp(self):
+        cache.clear()
+        get_store().reset()
+        invalidate_roles()
+        invalidate_tokens()
+
+
+    def test_parallel_checkouts_place_one_order(self):
+        customer = User.objects.create_user(username='Mario', password='lemon@mar!')
+        category = Category.objects.create(slug='mains', title='Mains')
+        items = MenuItem.objects.bulk_create([
+            MenuItem(title=f'Item {i}', price=Decimal('2.50') + i, featured=False, category=category) for i in range(3)
+        ])
+        Cart.objects.bulk_create([
+            Cart(user=customer, menuitem=item, quantity=2, unit_price=item.price, price=item.price * 2) for item in items
+        ])
+        barrier = threading.Barrier(2)
+        statuses = []
+
+        def checkout():
+            client = APIClient() # Every thread holds a database connection of its own
+            client.force_authenticate(user=customer)
+            barrier.wait()
+            try:
+                statuses.append(client.post('/api/orders').status_code)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=checkout) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # The later checkout finds the cart empty or claimed, never a locked database
+        self.assertEqual(sorted(statuses)[0], 201)
+        self.assertIn(sorted(statuses)[1], (204, 409))
+        self.assertEqual(Order.objects.filter(user=customer).count(), 1)
+        self.assertFalse(Cart.objects.filter(user=customer).exists())
+
+
+
+class ConcurrentDispatchTest(TransactionTestCase):
+    """
+    Tests for parallel dispatches of the same orders, committed for real so the requests contend for the database locks
+    """
+
+    def setUp(self):
+        cache.clear()
+        get_store().reset()
+        invalidate_roles()
+        invalidate_tokens()
+
+
+    def test_parallel_dispatches_never_fail(self):
+        manager = User.objects.create_user(username='Sana', password='lemon@san!')
+        manager.groups.add(Group.objects.create(name=MANAGER))
+        customer = User.objects.create_user(username='Mario', password='lemon@mar!')
+        ids = [order.pk for order in Order.objects.bulk_create([Order(user=customer, total=10, date='2023-05-01') for _ in range(3)])]
+        barrier = threading.Barrier(2, timeout=1)
+        statuses = []
+
+        def meet(execute, sql, params, many, context):
+            # Holding both requests after their first statement on the orders, so they overlap every time
+            result = execute(sql, params, many, context)
+            if 'LittleLemonAPI_order' in sql and not barrier.broken:
+                try:
+                    barrier.wait()
+                except threading.BrokenBarrierError: # The other request is waiting for the lock held here
+                    pass
+            return result
+
+        def dispatch(value):
+            client = APIClient() # Every thread holds a database connection of its own
+            client.force_authenticate(user=manager)
+            try:
+                with connection.execute_wrapper(meet):
+                    statuses.append(client.post('/api/orders/dispatch', {'orders': ids, 'status': value}, format='json').status_code)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=dispatch, args=(value,)) for value in (True, False)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # The later dispatch waits for the earlier one or reports the conflict, never a locked database
+        self.assertEqual(sorted(statuses)[0], 200)
+        self.assertIn(sorted(statuses)[1], (200, 409))
+        self.assertIn(Order.objects.filter(status=True).count(), (0, 3))
+
+
+
+class MenuCacheTest(APITestCase):
+    """
+    Tests for the versioned response cache of the menu and category lists
+    """
+
+    def test_warm_list_makes_no_queries(self):
+        self.make_menu(3)
+        first = self.client.get('/api/menu-items')
+
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get('/api/menu-items')
+        self.assertEqual(ctx.captured_queries, [])
+        self.assertEqual(first.json(), second.json())
+
+
+    def test_query_string_is_normalized(self):
+        self.make_menu(3)
+        self.client.get('/api/menu-items?ordering=price&page=2')
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/menu-items?page=2&ordering=price')
+        self.assertEqual(ctx.captured_queries, [])
+        self.assertEqual(response.json()['count'], 3)
+
+
+    def test_menu_change_invalidates_lists(self):
+        self.login(self.customer)
+        items = self.make_menu(1)
+        self.assertEqual(self.client.get('/api/menu-items').json()['count'], 1)
+        self.assertEqual(self.client.get('/api/categories').json()['count'], 1)
+
+        self.make_menu(1, Category.objects.create(slug='drinks', title='Drinks'))
+        items[0].delete()
+        self.assertEqual(self.client.get('/api/menu-items').json()['count'], 1)
+        self.assertEqual(self.client.get('/api/categories').json()['count'], 2)
+
+
+    def test_concurrent_misses_build_once(self):
+        builds = []
+
+        def build():
+            builds.append(1)
+            time.sleep(0.05)
+            return 'value'
+
+        threads = [threading.Thread(target=get_or_build, args=('littlelemon:test', build, 60)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(builds), 1)
+
+
+
+class ConditionalGetTest(APITestCase):
+    """
+    Tests for answering conditional GET requests with '304 Not Modified'
+    """
+
+    def test_single_menu_item(self):
+        item = self.make_menu(1)[0]
+        response = self.client.get(f'/api/menu-items/{item.pk}')
+        etag = response['ETag']
+
+        response = self.client.get(f'/api/menu-items/{item.pk}', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        item.category.title = 'Starters'
+        item.category.save()
+        response = self.client.get(f'/api/menu-items/{item.pk}', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+    def test_if_modified_since(self):
+        category = Category.objects.create(slug='mains', title='Mains')
+        response = self.client.get(f'/api/categories/{category.pk}')
+
+        response = self.client.get(f'/api/categories/{category.pk}', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+
+    def test_order_list_changes_with_rows(self):
+        self.login(self.customer)
+        Order.objects.create(user=self.customer, total=10, date='2023-05-01')
+        etag = self.client.get('/api/orders')['ETag']
+        self.assertEqual(self.client.get('/api/orders', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Order.objects.create(user=self.customer, total=12, date='2023-05-02')
+        self.assertEqual(self.client.get('/api/orders', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+    def test_single_order_skips_serializer(self):
+        self.login(self.customer)
+        order = Order.objects.create(user=self.customer, total=10, date='2023-05-01')
+        etag = self.client.get(f'/api/orders/{order.pk}')['ETag']
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/orders/{order.pk}', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+
+    def test_orders_change_with_menu_items(self):
+        item = self.make_menu(1)[0]
+        self.login(self.customer)
+        order = Order.objects.create(user=self.customer, total=10, date='2023-05-01')
+        OrderItem.objects.create(order=order, menuitem=item, quantity=1, unit_price=item.price, price=item.price)
+        single = self.client.get(f'/api/orders/{order.pk}')['ETag']
+        listed = self.client.get('/api/orders')['ETag']
+
+        item.title, item.price = 'Lemon Tart', Decimal('9.50')
+        item.save()
+        response = self.client.get(f'/api/orders/{order.pk}', HTTP_IF_NONE_MATCH=single)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['order_items'][0]['menuitem']['title'], 'Lemon Tart')
+        self.assertEqual(self.client.get('/api/orders', HTTP_IF_NONE_MATCH=listed).status_code, 200)
+        self.assertEqual(self.client.get(f'/api/orders/{order.pk}', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+
+
+class OrderPaginationTest(APITestCase):
+    """
+    Tests for the keyset and count-free pagination of the order list
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.login(self.manager)
+        Order.objects.bulk_create([
+            Order(user=self.customer, total=i, date=f'2023-05-{1 + i // 3:02d}')
+            for i in range(7)
+        ])
+        self.expected = list(Order.objects.order_by('-date', '-id').values_list('id', flat=True))
+
+
+    def test_cursor_walks_all_orders_without_count(self):
+        seen = []
+        url = '/api/orders?pagination=cursor&page_size=3'
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                data = self.client.get(url).json()
+            self.assertFalse([q for q in ctx.captured_queries if 'COUNT' in q['sql'].upper()])
+            seen += [order['id'] for order in data['results']]
+            url = data['next']
+        self.assertEqual(seen, self.expected)
+
+
+    def test_cursor_previous_link(self):
+        first = self.client.get('/api/orders?pagination=cursor&page_size=3').json()
+        second = self.client.get(first['next']).json()
+        back = self.client.get(second['previous']).json()
+        self.assertEqual(back['results'], first['results'])
+
+
+    def test_page_size_has_hard_maximum(self):
+        request = Request(APIRequestFactory().get('/api/orders?page_size=1000'))
+        self.assertEqual(OrderPageNumberPagination().get_page_size(request), 100)
+        self.assertEqual(OrderKeysetPagination().get_page_size(request), 100)
+
+
+    def test_count_free_page_numbers(self):
+        data = self.client.get('/api/orders?count=false&page=3&page_size=3').json()
+        self.assertNotIn('count', data)
+        self.assertIsNone(data['next'])
+        self.assertEqual(len(data['results']), 1)
+
+
+
+class OrderQueryCountTest(APITestCase):
+    """
+    Tests pinning the number of queries used for rendering orders with their items
+    """
+
+    def place_orders(self, count, lines):
+        items = self.make_menu(lines)
+        orders = Order.objects.bulk_create([
+            Order(user=self.customer, delivery_crew=self.crew, total=10, date='2023-05-01') for _ in range(count)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menuitem=item, quantity=1, unit_price=item.price, price=item.price)
+            for order in orders for item in items
+        ])
+        return orders
+
+
+    def test_order_list_query_count(self):
+        self.place_orders(5, 4)
+        self.login(self.manager)
+        self.client.get('/api/orders') # Warming the role cache
+
+        # Validators aggregate, page count, orders and their items with menuitems
+        with self.assertNumQueries(4):
+            data = self.client.get('/api/orders?page_size=5').json()
+        self.assertEqual(len(data['results']), 5)
+        self.assertEqual(len(data['results'][0]['order_items']), 4)
+
+
+    def test_single_order_query_count(self):
+        order = self.place_orders(1, 6)[0]
+        self.login(self.customer)
+        self.client.get('/api/orders') # Warming the role cache
+
+        # Order and its items with menuitems
+        with self.assertNumQueries(2):
+            data = self.client.get(f'/api/orders/{order.pk}').json()
+        self.assertEqual(len(data['order_items']), 6)
+
+
+    def test_items_are_flat(self):
+        order = self.place_orders(1, 1)[0]
+        self.login(self.customer)
+        item = self.client.get(f'/api/orders/{order.pk}').json()['order_items'][0]
+        self.assertEqual(sorted(item), ['id', 'menuitem', 'price', 'quantity', 'unit_price'])
+        self.assertEqual(item['menuitem']['title'], 'Item %d-0' % Category.objects.get().pk)
+        listed = self.client.get('/api/orders').json()['results'][0]['order_items'][0] # Projected list rows
+        for data in (item, listed):
+            self.assertEqual(sorted(data['menuitem']), ['category', 'featured', 'id', 'price', 'title'])
+        self.assertEqual(listed, item)
+
+
+
+class OrderExportTest(APITestCase):
+    """
+    Tests for the streaming order export
+    """
+
+    def setUp(self):
+        super().setUp()
+        item = self.make_menu(1)[0]
+        for day in ('2023-05-01', '2023-05-03'):
+            order = Order.objects.create(user=self.customer, total=item.price, date=day)
+            OrderItem.objects.create(order=order, menuitem=item, quantity=1, unit_price=item.price, price=item.price)
+        Order.objects.create(user=self.customer, total=0, date='2023-05-04')
+
+
+    def export(self, **params):
+        response = self.client.get('/api/orders/export', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+
+    def test_csv(self):
+        self.login(self.manager)
+        lines = self.export(start='2023-05-02').splitlines()
+        self.assertEqual(lines[0], 'order_id,date,user_id,delivery_crew_id,status,total,menuitem_id,quantity,unit_price,price')
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].endswith(',1,2.50,2.50'))
+
+
+    def test_ndjson(self):
+        self.login(self.manager)
+        orders = [json.loads(line) for line in self.export(type='ndjson', end='2023-05-04').splitlines()]
+        self.assertEqual([order['date'] for order in orders], ['2023-05-01', '2023-05-03', '2023-05-04'])
+        self.assertEqual(orders[0]['items'], [{'menuitem_id': orders[0]['items'][0]['menuitem_id'], 'quantity': 1, 'unit_price': '2.50', 'price': '2.50'}])
+        self.assertEqual(orders[2]['items'], [])
+
+
+    def test_only_managers(self):
+        self.login(self.customer)
+        self.assertEqual(self.client.get('/api/orders/export').status_code, 403)
+
+
+    def test_invalid_date(self):
+        self.login(self.manager)
+        self.assertEqual(self.client.get('/api/orders/export?start=yesterday').status_code, 400)
+
+
+
+class MenuSearchTest(APITestCase):
+    """
+    Tests for the full-text search of the menu items
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.login(self.customer)
+        self.pizza = Category.objects.create(slug='pizza', title='Pizza')
+        self.drinks = Category.objects.create(slug='drinks', title='Drinks')
+        for title, category in (('Margherita', self.pizza), ('Lemonade', self.drinks), ('Lemon Tart', self.pizza)):
+            MenuItem.objects.create(title=title, price=5, featured=False, category=category)
+
+
+    def search(self, query):
+        return [item['title'] for item in self.client.get(f'/api/menu-items?{query}').json()['results']]
+
+
+    def test_prefix_and_category(self):
+        self.assertEqual(self.search('search=marg'), ['Margherita'])
+        self.assertEqual(sorted(self.search('search=lemon')), ['Lemon Tart', 'Lemonade'])
+        self.assertEqual(self.search('search=lemon piz'), ['Lemon Tart'])
+
+
+    def test_exact_and_typo_modes(self):
+        self.assertEqual(self.search('search=lemon&search_mode=exact'), ['Lemon Tart'])
+        self.assertEqual(self.search('search=margarita&search_mode=typo'), ['Margherita'])
+        self.assertEqual(self.search('search=margarita'), [])
+
+
+    def test_index_follows_writes(self):
+        self.drinks.title = 'Beverages'
+        self.drinks.save()
+        MenuItem.objects.filter(title='Margherita').update(title='Marinara')
+        self.assertEqual(self.search('search=bever'), ['Lemonade'])
+        self.assertEqual(self.search('search=mari'), ['Marinara'])
+
+
+
+class ProjectionTest(APITestCase):
+    """
+    Tests for the equivalence of the precompiled read plans with the serializers
+    """
+
+    def setUp(self):
+        super().setUp()
+        items = self.make_menu(3)
+        MenuItem.objects.filter(pk=items[0].pk).update(price=Decimal('7.1'), featured=True)
+        self.fill_cart(self.customer, items[:2], quantity=3)
+        first = Order.objects.create(user=self.customer, delivery_crew=self.crew, total=Decimal('12.5'), date='2023-05-01', status=True)
+        Order.objects.create(user=self.customer, total=0, date='2023-05-02')
+        OrderItem.objects.bulk_create([
+            OrderItem(order=first, menuitem=item, quantity=2, unit_price=item.price, price=item.price * 2) for item in items
+        ])
+
+
+    def assertProjected(self, serializer_class, queryset):
+        plan = get_plan(serializer_class)
+        self.assertIsNotNone(plan)
+        expected = serializer_class(queryset, many=True).data
+        self.assertEqual(JSONRenderer().render(plan.render(list(plan.project(queryset)))), JSONRenderer().render(expected))
+
+
+    def test_menu_items(self):
+        self.assertProjected(MenuItemSerializer, MenuItem.objects.order_by('pk'))
+
+
+    def test_categories(self):
+        self.assertProjected(CategorySerializer, Category.objects.order_by('pk'))
+
+
+    def test_cart(self):
+        self.assertProjected(CartSerializer, Cart.objects.order_by('pk'))
+
+
+    def test_orders(self):
+        self.assertProjected(OrderSerializer, Order.objects.order_by('pk'))
+
+
+    def test_disabled(self):
+        self.login(self.customer)
+        fast = self.client.get('/api/orders').content
+        with self.settings(LITTLELEMON={'FAST_LIST_SERIALIZATION': False}):
+            self.assertEqual(self.client.get('/api/orders').content, fast)
+
+
+
+class RendererTest(APITestCase):
+    """
+    Tests for the orjson and MessagePack renderers and parsers
+    """
+
+    def test_orjson_matches_json_renderer(self):
+        data = {
+            'price': Decimal('5.50'), 'date': datetime(2023, 5, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+            'text': 'caf\u00e9 \u2028 "quoted"', 'items': [1, 2.5, None, True], 1: 'key',
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(ORJSONRenderer().render(data, 'application/json; indent=2'), JSONRenderer().render(data, 'application/json; indent=2'))
+
+
+    def test_orjson_rejects_non_finite_floats(self):
+        for value in (float('nan'), float('inf'), float('-inf')):
+            data = {'total': None, 'items': [{'price': value}]}
+            for renderer in (ORJSONRenderer(), JSONRenderer()):
+                with self.subTest(value=value, renderer=type(renderer).__name__):
+                    with self.assertRaises(ValueError):
+                        renderer.render(data)
+
+
+    def test_orjson_parser(self):
+        self.assertEqual(ORJSONParser().parse(io.BytesIO('{"title": "caf\u00e9"}'.encode())), {'title': 'caf\u00e9'})
+
+
+    def test_responses_and_msgpack_round_trip(self):
+        items = self.make_menu(2)
+        self.login(self.manager)
+        self.assertEqual(self.client.get('/api/menu-items').content, JSONRenderer().render(self.client.get('/api/menu-items').json()))
+        body = msgpack.packb({'title': 'Lemon Tart', 'price': '4.50', 'featured': True, 'category_id': items[0].category_id})
+        response = self.client.post('/api/menu-items', body, content_type='application/msgpack', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        data = msgpack.unpackb(response.content)
+        self.assertEqual((data['title'], data['price']), ('Lemon Tart', '4.50'))
+
+
+
+class SalesReportTest(APITestCase):
+    """
+    Tests for the daily sales rollup and the sales report
+    """
+
+    def test_checkout_updates_rollup_like_rebuild(self):
+        drinks = Category.objects.create(slug='drinks', title='Drinks')
+        items = self.make_menu(2) + self.make_menu(1, drinks)
+        for user in (self.customer, User.objects.create_user(username='Luigi')):
+            self.fill_cart(user, items)
+            self.login(user)
+            self.assertEqual(self.client.post('/api/orders').status_code, 201)
+
+        incremental = list(DailySales.objects.values_list('date', 'orders', 'units', 'revenue'))
+        incremental_items = sorted(DailyItemSales.objects.values_list('date', 'menuitem', 'units', 'revenue'))
+        self.assertEqual(incremental[0][1:], (2, 12, sum(item.price * 4 for item in items)))
+        rebuild_sales_rollup()
+        self.assertEqual(list(DailySales.objects.values_list('date', 'orders', 'units', 'revenue')), incremental)
+        self.assertEqual(sorted(DailyItemSales.objects.values_list('date', 'menuitem', 'units', 'revenue')), incremental_items)
+
+        self.login(self.manager)
+        report = self.client.get('/api/reports/sales').json()
+        self.assertEqual((report['orders'], report['units']), (2, 12))
+        self.assertEqual([category['title'] for category in report['categories']], ['Mains', 'Drinks'])
+        self.assertEqual(report['menu_items'][0], {'menuitem': items[1].pk, 'title': items[1].title, 'units': 4, 'revenue': '14.00'})
+
+        order = Order.objects.first()
+        self.assertEqual(self.client.delete(f'/api/orders/{order.pk}').status_code, 204)
+        self.assertEqual(self.client.get('/api/reports/sales').json()['orders'], 1)
+
+
+    def test_date_range(self):
+        DailySales.objects.bulk_create([
+            DailySales(date=f'2023-05-0{day}', orders=day, units=day, revenue=Decimal('10.50') * day) for day in range(1, 6)
+        ])
+        self.login(self.manager)
+        report = self.client.get('/api/reports/sales?start=2023-05-02&end=2023-05-03').json()
+        self.assertEqual([day['date'] for day in report['days']], ['2023-05-02', '2023-05-03'])
+        self.assertEqual((report['orders'], report['revenue']), (5, '52.50'))
+        self.assertEqual(self.client.get('/api/reports/sales?start=2023-05-03&end=2023-05-01').status_code, 400)
+        self.login(self.customer)
+        self.assertEqual(self.client.get('/api/reports/sales').status_code, 403)
+
+
+
+class OrderDispatchTest(APITestCase):
+    """
+    Tests for dispatching orders in bulk and updating single orders
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.orders = Order.objects.bulk_create([Order(user=self.customer, total=10, date='2023-05-01') for _ in range(3)])
+        self.login(self.manager)
+
+
+    def test_bulk_dispatch(self):
+        ids = [order.pk for order in self.orders]
+        before = Order.objects.get(pk=ids[0]).updated_at
+        self.client.get('/api/orders') # Warming the role cache
+
+        # Crew member, crew roles, locking update, select and the update inside a savepoint
+        with self.assertNumQueries(7):
+            response = self.client.post('/api/orders/dispatch', {'orders': ids[:2] + [999], 'delivery_crew': self.crew.pk}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual([result['result'] for result in response.data['results']], ['updated', 'updated', 'not_found'])
+        self.assertEqual(list(Order.objects.order_by('pk').values_list('delivery_crew', flat=True)), [self.crew.pk, self.crew.pk, None])
+        self.assertGreater(Order.objects.get(pk=ids[0]).updated_at, before)
+
+
+    def test_dispatch_validation(self):
+        ids = [self.orders[0].pk]
+        self.assertEqual(self.client.post('/api/orders/dispatch', {'orders': ids, 'delivery_crew': self.customer.pk}, format='json').status_code, 400)
+        self.assertEqual(self.client.post('/api/orders/dispatch', {'orders': ids}, format='json').status_code, 400)
+        self.assertEqual(self.client.post('/api/orders/dispatch', {'orders': [], 'status': True}, format='json').status_code, 400)
+        self.login(self.crew)
+        self.assertEqual(self.client.post('/api/orders/dispatch', {'orders': ids, 'status': True}, format='json').status_code, 403)
+
+
+    def test_patch_unassigned_order(self):
+        order = self.orders[0]
+        response = self.client.patch(f'/api/orders/{order.pk}', {'status': True, 'total': 99}, format='json')
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.total, order.delivery_crew), (True, 10, None))
+
+        self.client.patch(f'/api/orders/{order.pk}', {'delivery_crew': self.crew.pk}, format='json')
+        self.login(self.crew)
+        self.client.patch(f'/api/orders/{order.pk}', {'status': False, 'delivery_crew': None}, format='json')
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.delivery_crew), (False, self.crew))
+
+
+    def test_patch_without_changes_saves_nothing(self):
+        order = self.orders[0]
+        self.client.patch(f'/api/orders/{order.pk}', {'status': True}, format='json')
+        order.refresh_from_db()
+        etag = self.client.get(f'/api/orders/{order.pk}')['ETag']
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            for data in ({'status': True}, {'total': 99}, {}):
+                self.assertEqual(self.client.patch(f'/api/orders/{order.pk}', data, format='json').status_code, 200)
+        self.assertEqual(callbacks, []) # No order event is published
+        self.assertEqual(Order.objects.get(pk=order.pk).updated_at, order.updated_at)
+        self.assertEqual(self.client.get(f'/api/orders/{order.pk}', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+
+class AsyncViewTest(APITestCase):
+    """
+    Tests for the async read endpoints matching their synchronous counterparts
+    """
+
+    def setUp(self):
+        super().setUp()
+        items = self.make_menu(3)
+        self.fill_cart(self.customer, items[:2])
+        order = Order.objects.create(user=self.customer, delivery_crew=self.crew, total=10, date='2023-05-01')
+        Order.objects.create(user=self.customer, total=5, date='2023-05-02')
+        OrderItem.objects.create(order=order, menuitem=items[0], quantity=2, unit_price=items[0].price, price=items[0].price * 2)
+
+
+    def token_login(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+
+
+    def assertSameResponse(self, path):
+        sync, asynchronous = self.client.get(f'/api/{path}'), self.client.get(f'/api/async/{path}')
+        self.assertEqual(asynchronous.status_code, sync.status_code)
+        self.assertEqual(asynchronous.content.replace(b'/api/async/', b'/api/'), sync.content)
+
+
+    def test_public_menu(self):
+        self.assertSameResponse('menu-items?ordering=-price&page=2')
+        self.token_login(self.customer)
+        self.assertSameResponse('menu-items?search=item')
+        self.assertSameResponse('categories')
+
+
+    def test_orders_by_role(self):
+        for user in (self.customer, self.crew, self.manager):
+            self.token_login(user)
+            self.assertSameResponse('orders?ordering=date&page_size=5')
+        self.assertSameResponse('orders?page=9')
+
+
+    def test_cart_and_authentication(self):
+        self.assertEqual(self.client.get('/api/async/cart/menu-items').status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION='Token missing')
+        self.assertEqual(self.client.get('/api/async/categories').status_code, 401)
+        self.token_login(self.customer)
+        self.assertSameResponse('cart/menu-items')
+
+
+    def test_throttle_runs_outside_event_loop(self):
+        loops = []
+        take = BucketStore.take
+
+        def record(store, *args):
+            try:
+                loops.append(asyncio.get_running_loop())
+            except RuntimeError: # No event loop runs in the worker thread
+                loops.append(None)
+            return take(store, *args)
+
+        self.token_login(self.customer)
+        with mock.patch.object(BucketStore, 'take', record):
+            self.assertEqual(self.client.get('/api/async/categories').status_code, 200)
+        self.assertEqual(loops, [None])
+
+
+
+class TokenCacheTest(APITestCase):
+    """
+    Tests for the cached token authentication and the revocation of tokens
+    """
+
+    def test_warm_request_makes_no_queries(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.customer).key}')
+        self.assertEqual(self.client.get('/api/categories').status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/categories').status_code, 200)
+
+
+    def test_logout_revokes_token(self):
+        response = self.client.post('/auth/token/login/', {'username': 'Mario', 'password': 'lemon@mar!'})
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {response.json()["auth_token"]}')
+        self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 200)
+        self.assertEqual(self.client.get('/api/async/cart/menu-items').status_code, 200)
+
+        self.assertEqual(self.client.post('/auth/token/logout/').status_code, 204)
+        self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 401)
+        self.assertEqual(self.client.get('/api/async/cart/menu-items').status_code, 401)
+
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.crew).key}')
+        self.assertEqual(self.client.get('/api/orders').status_code, 200)
+        self.crew.is_active = False
+        self.crew.save()
+        self.assertEqual(self.client.get('/api/orders').status_code, 401)
+
+
+    def test_revocation_reaches_other_workers(self):
+        token = Token.objects.create(user=self.customer)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 200)
+
+        entries = dict(token_cache._data) # Cache of a worker which did not handle the revocation
+        token.delete()
+        token_cache._data.update(entries)
+        self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 401)
+        self.assertEqual(self.client.get('/api/async/cart/menu-items').status_code, 401)
+
+
+    def test_revocation_in_another_process(self):
+        token = Token.objects.create(user=self.customer)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 200)
+
+        User.objects.filter(pk=self.customer.pk).update(is_active=False) # 'update()' sends no signals
+        with multiprocessing.get_context('fork').Pool(1) as pool: # Worker process handling the revocation
+            pool.apply(invalidate_tokens, (token.key,))
+        self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 401)
+
+
+    def test_process_local_cache_fails_check(self):
+        self.assertEqual(check_shared_cache(None), [])
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ['LittleLemonAPI.E001'])
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ['LittleLemonAPI.E001'])
+
+
+
+def take_tokens(path, count):
+    return [BucketStore(path).take('user:1', 5, 5 / 60) for _ in range(count)]
+
+
+
+class ThrottleTest(APITestCase):
+    """
+    Tests for the role based token bucket throttle
+    """
+
+    def test_rates_follow_roles(self):
+        self.login(self.customer)
+        for _ in range(5):
+            self.assertEqual(self.client.get('/api/categories').status_code, 200)
+        response = self.client.get('/api/categories')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+        self.login(self.manager) # Managers have a bucket and a rate of their own
+        for _ in range(6):
+            self.assertEqual(self.client.get('/api/categories').status_code, 200)
+
+
+    def test_bucket_database_belongs_to_the_project(self):
+        self.assertEqual(get_store().path, DEFAULTS['THROTTLE_DATABASE']) # File of this test run
+        with mock.patch.dict(DEFAULTS, {'THROTTLE_DATABASE': None}):
+            self.assertEqual(get_store_path(), str(settings.BASE_DIR / 'throttle.sqlite3'))
+
+
+    def test_buckets_are_shared_across_processes(self):
+        path = os.path.join(tempfile.mkdtemp(), 'throttle.sqlite3')
+        with multiprocessing.get_context('fork').Pool(1) as pool:
+            self.assertEqual(pool.apply(take_tokens, (path, 3)), [0, 0, 0])
+        waits = take_tokens(path, 3)
+        self.assertEqual(waits[:2], [0, 0])
+        self.assertGreater(waits[2], 0)
+
+
+
+
+class SeedDataTest(APITestCase):
+    """
+    Tests for the bulk seeding command
+    """
+
+    def seed(self, **options):
+        options = {'customers': 4, 'crews': 2, 'managers': 1, 'categories': 3, 'items': 20, 'orders': 50, 'carts': 10,
+                   'batch_size': 7, 'stdout': io.StringIO(), **options}
+        call_command('seed_data', **options)
+
+
+    def test_seeded_data_is_consistent(self):
+        self.seed()
+        self.assertEqual(User.objects.filter(username__startswith='seed-').count(), 7)
+        self.assertEqual(Token.objects.filter(user__username__startswith='seed-').count(), 7)
+        self.assertEqual(User.objects.filter(groups__name=DELIVERY_CREW, username__startswith='seed-').count(), 2)
+        self.assertEqual((Order.objects.count(), Cart.objects.count()), (50, 10))
+        for order in Order.objects.annotate(items_total=Sum('order_items__price')):
+            self.assertEqual(order.total, order.items_total)
+        self.assertEqual(DailySales.objects.aggregate(orders=Sum('orders'))['orders'], 50)
+
+        # Dropped indexes are back and the login works with the shared password
+        with connection.cursor() as cursor:
+            self.assertIn('order_date_id_idx', connection.introspection.get_constraints(cursor, Order._meta.db_table))
+        self.assertTrue(self.client.login(username='seed-customer-0', password='lemon@seed!'))
+
+        with self.assertRaises(CommandError):
+            self.seed()
+
+
+    def test_output_does_not_depend_on_workers(self):
+        self.seed(prefix='one')
+        one = list(OrderItem.objects.order_by('order_id', 'menuitem_id').values_list('quantity', 'price'))
+        OrderItem.objects.all().delete()
+        Order.objects.all().delete()
+        self.seed(prefix='two', workers=2)
+        two = list(OrderItem.objects.order_by('order_id', 'menuitem_id').values_list('quantity', 'price'))
+        self.assertEqual(one, two)
+
+
+
+class PerformanceMetricsTest(APITestCase):
+    """
+    Tests for the per-request performance instrumentation
+    """
+
+    def setUp(self):
+        super().setUp()
+        registry.clear()
+
+
+    def test_server_timing_and_metrics(self):
+        self.make_menu(3)
+        self.manager.is_staff = True
+        self.manager.save()
+        with self.settings(LITTLELEMON={'PERFORMANCE_METRICS': True}):
+            self.login(self.customer)
+            self.assertNotIn('Server-Timing', self.client.get('/api/orders')) # Only shown to staff users
+
+            self.login(self.manager)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/orders')
+            timings = dict(part.split(';', 1) for part in response['Server-Timing'].split(', '))
+            self.assertEqual(set(timings), {'db', 'serialize', 'render', 'total'})
+            self.assertIn(f'desc="{len(queries)} queries"', timings['db'])
+            self.assertEqual(BaseSerializer.data.fget.__qualname__, 'BaseSerializer.data') # Rest framework is left unpatched
+            self.client.generic('BREW', '/api/orders')
+
+            response = self.client.get('/api/metrics')
+            self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+            text = response.content.decode()
+            self.assertIn('# TYPE littlelemon_request_duration_seconds histogram', text)
+            self.assertIn('littlelemon_request_duration_seconds_count{route="order-item",method="GET"} 2', text)
+            self.assertIn(f'littlelemon_request_queries_bucket{{route="order-item",method="GET",le="+Inf"}} 2', text)
+            self.assertIn('littlelemon_request_duration_seconds_count{route="order-item",method="OTHER"} 1', text)
+            self.assertNotIn('BREW', text)
+
+            self.login(self.customer)
+            self.assertEqual(self.client.get('/api/metrics').status_code, 403)
+
+
+    def test_disabled_by_default(self):
+        self.login(self.manager)
+        self.assertNotIn('Server-Timing', self.client.get('/api/categories'))
+        self.assertEqual(self.client.get('/api/metrics').status_code, 404)
+
+
+    def test_slow_requests_are_logged_with_sql(self):
+        self.make_menu(2)
+        self.login(self.customer)
+        with self.settings(LITTLELEMON={'PERFORMANCE_METRICS': True, 'SLOW_REQUEST_SECONDS': 0}):
+            with self.assertLogs('LittleLemonAPI.performance', 'WARNING') as logs:
+                self.client.get('/api/cart/menu-items')
+        self.assertIn('Slow request GET /api/cart/menu-items (cart) 200', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+
+    def test_disabled_middleware_is_removed(self):
+        with self.settings(LITTLELEMON={'PERFORMANCE_METRICS': False}):
+            client = APIClient()
+            client.force_authenticate(user=self.manager)
+            response = client.get('/api/categories')
+            self.assertNotIn('Server-Timing', response)
+            self.assertEqual(client.get('/api/metrics').status_code, 404)
+
+
+
+class CartUpsertTest(APITestCase):
+    """
+    Tests for adding items to the cart with a single upsert
+    """
+
+    def test_add_increments_and_prices_from_menu(self):
+        item = self.make_menu(1)[0]
+        self.login(self.customer)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/cart/menu-items', {'menuitem_id': item.pk, 'quantity': 2, 'price': '0.01'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['quantity'], response.data['unit_price'], response.data['price']), (2, '2.50', '5.00'))
+        self.assertEqual(response.data['menuitem']['id'], item.pk)
+        writes = [query['sql'] for query in queries if 'LittleLemonAPI_cart' in query['sql']]
+        self.assertEqual(len(writes), 1)
+        self.assertIn('ON CONFLICT', writes[0])
+
+        MenuItem.objects.filter(pk=item.pk).update(price=Decimal('3.10'))
+        response = self.client.post('/api/cart/menu-items', {'menuitem_id': item.pk, 'quantity': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['id'], response.data['quantity'], response.data['price']), (Cart.objects.get().pk, 3, '9.30'))
+        cart = Cart.objects.get()
+        self.assertEqual((cart.user, cart.quantity, cart.unit_price, cart.price), (self.customer, 3, Decimal('3.10'), Decimal('9.30')))
+
+
+    def test_invalid_items(self):
+        self.login(self.customer)
+        response = self.client.post('/api/cart/menu-items', {'menuitem_id': 999, 'quantity': 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('menuitem_id', response.data)
+        item = self.make_menu(1)[0]
+        self.assertEqual(self.client.post('/api/cart/menu-items', {'menuitem_id': item.pk, 'quantity': 0}).status_code, 400)
+        self.assertFalse(Cart.objects.exists())
+
+
+
+class MenuImportTest(APITestCase):
+    """
+    Tests for the bulk menu import
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.login(self.manager)
+        self.mains = Category.objects.create(slug='mains', title='Mains')
+
+
+    def test_json_import_creates_and_updates(self):
+        item = self.make_menu(1, self.mains)[0]
+        self.client.get('/api/menu-items') # Filling the response cache
+        rows = [{'title': f'Special {i}', 'price': '4.50', 'category_id': self.mains.pk} for i in range(1200)]
+        rows.append({'id': item.pk, 'title': 'Renamed', 'price': '7.25', 'featured': True, 'category_id': self.mains.pk})
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/menu-items/import', rows, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated']), (1200, 1))
+        self.assertEqual(response.data['results'][-1], {'row': 1200, 'id': item.pk, 'result': 'updated'})
+        self.assertLess(len(queries), 15)
+
+        item.refresh_from_db()
+        self.assertEqual((item.title, item.price, item.featured), ('Renamed', Decimal('7.25'), True))
+        self.assertEqual(MenuItem.objects.count(), 1201)
+        self.assertEqual(self.client.get('/api/menu-items').data['count'], 1201)
+
+
+    def test_csv_import(self):
+        document = f'\ufefftitle,price,featured,category_id\nSoup,3.00,true,{self.mains.pk}\nSalad,4.00,,{self.mains.pk}\n'
+        response = self.client.post('/api/menu-items/import', document.encode(), content_type='text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(MenuItem.objects.order_by('title').values_list('title', 'featured')), [('Salad', False), ('Soup', True)])
+
+
+    def test_errors_are_reported_per_row(self):
+        item = self.make_menu(1, self.mains)[0]
+        rows = [
+            {'title': 'Fine', 'price': '4.50', 'category_id': self.mains.pk},
+            {'title': item.title, 'price': '4.50', 'category_id': self.mains.pk},
+            {'title': 'Fine', 'price': '0.50', 'category_id': 999},
+            {'id': 999, 'title': 'Ghost', 'price': '4.50', 'category_id': self.mains.pk},
+            {'title': 'Fine', 'price': '4.50', 'category_id': self.mains.pk},
+        ]
+        response = self.client.post('/api/menu-items/import', rows, format='json')
+        self.assertEqual(response.status_code, 400)
+        errors = {error['row']: set(error['errors']) for error in response.data['errors']}
+        self.assertEqual(errors, {1: {'title'}, 2: {'price'}, 3: {'id'}, 4: {'title'}})
+        self.assertEqual(MenuItem.objects.count(), 1)
+
+        # Titles are checked row by row by the unique constraint, so they can not be swapped in one import
+        other = MenuItem.objects.create(title='Other', price=Decimal('2.00'), featured=False, category=self.mains)
+        rows = [
+            {'id': item.pk, 'title': 'Other', 'price': '2.00', 'category_id': self.mains.pk},
+            {'id': other.pk, 'title': item.title, 'price': '2.00', 'category_id': self.mains.pk},
+        ]
+        response = self.client.post('/api/menu-items/import', rows, format='json')
+        self.assertEqual([error['row'] for error in response.data['errors']], [0, 1])
+        self.login(self.customer)
+        self.assertEqual(self.client.post('/api/menu-items/import', rows, format='json').status_code, 403)
+
+
+
+class UniqueConstraintTest(APITestCase):
+    """
+    Tests for the uniqueness of menuitems enforced by the database constraint
+    """
+
+    def test_writes_skip_pre_checks_and_report_conflicts(self):
+        item = self.make_menu(1)[0]
+        self.login(self.manager)
+        payload = {'title': 'Soup', 'price': '3.00', 'featured': False, 'category_id': item.category_id}
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.post('/api/menu-items', payload).status_code, 201)
+        menu_queries = [query['sql'] for query in queries if 'LittleLemonAPI_menuitem' in query['sql']]
+        self.assertEqual(len(menu_queries), 1)
+        self.assertTrue(menu_queries[0].startswith('INSERT'))
+
+        response = self.client.post('/api/menu-items', {**payload, 'category_id': Category.objects.create(slug='x', title='X').pk})
+        self.assertEqual((response.status_code, response.data), (400, {'title': ['This field must be unique.']}))
+        response = self.client.patch(f'/api/menu-items/{item.pk}', {'title': 'Soup'})
+        self.assertEqual((response.status_code, response.data), (400, {'title': ['This field must be unique.']}))
+        self.assertEqual(self.client.patch(f'/api/menu-items/{item.pk}', {'title': item.title, 'price': '9.00'}).status_code, 200)
+        self.assertEqual(MenuItem.objects.filter(title='Soup').count(), 1)
+
+
+
+class ReplicaRoutingTest(APITestCase):
+    """
+    Tests for sending safe reads to the replicas and pinning writers to the primary
+    """
+
+    def read_database(self, path):
+        return self.client.get(path).renderer_context['view'].read_database
+
+
+    def test_router(self):
+        with use_replica('replica1'):
+            self.assertEqual(router.db_for_read(MenuItem), 'replica1')
+            self.assertEqual(router.db_for_write(MenuItem), 'default')
+        self.assertEqual(router.db_for_read(MenuItem), 'default')
+        self.assertFalse(router.allow_migrate('replica1', 'LittleLemonAPI'))
+
+
+    def test_reads_follow_replicas_until_a_write(self):
+        self.login(self.manager)
+        self.assertIsNone(self.read_database('/api/categories')) # No replica configured
+
+        with self.settings(LITTLELEMON={'READ_REPLICAS': ['default']}):
+            for path in ('/api/categories', '/api/menu-items', '/api/orders', '/api/reports/sales'):
+                self.assertEqual(self.read_database(path), 'default')
+
+            response = self.client.post('/api/categories', {'slug': 'soups', 'title': 'Soups'})
+            self.assertEqual(response.status_code, 201)
+            self.assertIsNone(self.read_database('/api/categories')) # Reading its own write from the primary
+
+            cache.delete(pin_key(self.manager)) # Pin window is over
+            self.assertEqual(self.read_database('/api/categories'), 'default')
+
+
+    def test_pin_window_needs_no_cookies(self):
+        token = Token.objects.create(user=self.manager).key
+        with self.settings(LITTLELEMON={'READ_REPLICAS': ['default']}):
+            response = APIClient().post('/api/categories', {'slug': 'soups', 'title': 'Soups'}, HTTP_AUTHORIZATION=f'Token {token}')
+            self.assertEqual(response.status_code, 201)
+            self.assertFalse(response.cookies)
+
+            client = APIClient() # New client without the cookies of the write
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+            self.assertIsNone(client.get('/api/categories').renderer_context['view'].read_database)
+            self.login(self.customer)
+            self.assertEqual(self.read_database('/api/categories'), 'default') # Other users are not pinned
+
+
+    def test_cached_menu_lists_are_built_on_the_primary(self):
+        self.make_menu(3)
+        self.login(self.customer)
+        with self.settings(LITTLELEMON={'READ_REPLICAS': ['unreachable']}): # Any read of the replica would fail
+            for path in ('/api/categories', '/api/menu-items'):
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.renderer_context['view'].read_database, 'unreachable')
+
+
+
+class RecordingSubscription:
+    """
+    Subscription stand-in collecting the delivered events synchronously
+    """
+
+    def __init__(self, role, user_id):
+        self.role, self.user_id, self.events = role, user_id, []
+        self.key = ('manager',) if role == 'manager' else (role, user_id)
+
+
+    def deliver(self, event):
+        self.events.append((event['id'], event['status'], event['delivery_crew']))
+
+
+
+class OrderEventsTest(APITestCase):
+    """
+    Tests for publishing order changes and streaming them as server-sent events
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.order = Order.objects.create(user=self.customer, total=10, date='2023-05-01')
+        self.other = Order.objects.create(user=self.manager, total=5, date='2023-05-01')
+        self.subscriptions = [
+            RecordingSubscription('manager', self.manager.pk),
+            RecordingSubscription('crew', self.crew.pk),
+            RecordingSubscription('customer', self.customer.pk),
+        ]
+        self.token = Token.objects.create(user=self.customer).key
+        for subscription in self.subscriptions:
+            broker.subscribe(subscription)
+        self.addCleanup(lambda: [broker.unsubscribe(subscription) for subscription in self.subscriptions])
+
+
+    def test_changes_reach_the_visible_streams(self):
+        manager, crew, customer = self.subscriptions
+        self.login(self.manager)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/orders/{self.order.pk}', {'delivery_crew': self.crew.pk}, format='json')
+            self.client.post('/api/orders/dispatch', {'orders': [self.order.pk, self.other.pk], 'status': True}, format='json')
+
+        self.assertEqual(manager.events, [(self.order.pk, False, self.crew.pk), (self.order.pk, True, self.crew.pk), (self.other.pk, True, None)])
+        self.assertEqual(crew.events, [(self.order.pk, False, self.crew.pk), (self.order.pk, True, self.crew.pk)])
+        self.assertEqual(customer.events, [(self.order.pk, False, self.crew.pk), (self.order.pk, True, self.crew.pk)])
+
+
+    def test_rolled_back_and_unrelated_saves_are_silent(self):
+        self.order.total = 12
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.save(update_fields=['total'])
+        with self.captureOnCommitCallbacks(execute=False):
+            self.order.save(update_fields=['status'])
+        self.assertEqual([subscription.events for subscription in self.subscriptions], [[], [], []])
+
+
+    def test_stream_requires_asgi_and_authentication(self):
+        self.assertEqual(self.client.get('/api/orders/events').status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        self.assertEqual(self.client.get('/api/orders/events').status_code, 406)
+
+
+    async def test_event_stream(self):
+        response = await AsyncClient().get(f'/api/orders/events?order={self.order.pk}', headers={'Authorization': f'Token {self.token}'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        frames = aiter(response.streaming_content)
+        self.assertEqual(await anext(frames), b'retry: 3000\n\n')
+
+        first = asyncio.ensure_future(anext(frames))
+        await asyncio.sleep(0) # Letting the stream subscribe
+        broker.publish(order_event(self.other.pk, self.manager.pk, True, None, None)) # Not visible to the customer
+        broker.publish(order_event(self.order.pk, self.customer.pk, True, None, None))
+        frame = await asyncio.wait_for(first, 5)
+        self.assertTrue(frame.startswith(b'id: '))
+        self.assertIn(b'event: order\ndata: {"id":%d,"user":%d,"status":true' % (self.order.pk, self.customer.pk), frame)
+
+        with self.settings(LITTLELEMON={'EVENT_STREAM_KEEPALIVE_SECONDS': 0.01}):
+            self.assertEqual(await asyncio.wait_for(anext(frames), 5), b': keep-alive\n\n')
+
+        # A client leaving cancels the stream while it waits, like the ASGI handler on disconnect
+        waiting = asyncio.ensure_future(anext(frames))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        self.assertEqual(len(broker), len(self.subscriptions))
+
+
+
+class WebhookStandIn(ThreadingHTTPServer):
+    """
+    Local HTTP server standing in for an integration, records the received events
+    and answers 503 to the first 'failures' requests
+    """
+
+    def __init__(self, failures=0, delay=0):
+        super().__init__(('127.0.0.1', 0), WebhookHandler)
+        self.failures, self.delay = failures, delay
+        self.requests, self.active, self.peak = [], 0, 0
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/events'
+
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        with server.lock:
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+            failing = server.failures > 0
+            server.failures -= failing
+        time.sleep(server.delay)
+        with server.lock:
+            server.active -= 1
+            if not failing:
+                server.requests.append((self.headers, json.loads(body)))
+        self.send_response(503 if failing else 204)
+        self.end_headers()
+
+
+    def log_message(self, *args):
+        pass
+
+
+
+class OutboxTest(APITestCase):
+    """
+    Tests for writing order events into the outbox and draining them to the integrations
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.server = WebhookStandIn()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.order = Order.objects.create(user=self.customer, total=10, date='2023-05-01')
+
+
+    def outbox_settings(self, **destinations):
+        return self.settings(LITTLELEMON={
+            'OUTBOX_DESTINATIONS': destinations, 'OUTBOX_BACKOFF_SECONDS': 0, 'OUTBOX_MAX_ATTEMPTS': 3,
+        })
+
+
+    def drain(self):
+        call_command('drain_outbox', '--once', stdout=io.StringIO())
+
+
+    def test_order_changes_write_the_outbox(self):
+        self.login(self.manager)
+        self.client.patch(f'/api/orders/{self.order.pk}', {'status': True}, format='json')
+        self.assertFalse(OutboxEvent.objects.exists()) # No destination configured
+
+        with self.outbox_settings(kitchen={'url': self.server.url, 'topics': ['order.created']}, pos={'url': self.server.url}):
+            self.client.patch(f'/api/orders/{self.order.pk}', {'delivery_crew': self.crew.pk}, format='json')
+            self.client.post('/api/orders/dispatch', {'orders': [self.order.pk], 'status': False}, format='json')
+            self.login(self.customer)
+            self.fill_cart(self.customer, self.make_menu(2))
+            order_id = self.client.post('/api/orders').data['item']['id']
+
+        events = list(OutboxEvent.objects.order_by('id').values_list('destination', 'topic', 'payload'))
+        self.assertEqual([event[:2] for event in events], [
+            ('pos', 'order.updated'), ('pos', 'order.updated'), ('kitchen', 'order.created'), ('pos', 'order.created'),
+        ])
+        self.assertEqual((events[0][2]['status'], events[0][2]['delivery_crew']), (True, self.crew.pk))
+        self.assertEqual((events[1][2]['status'], events[1][2]['delivery_crew']), (False, self.crew.pk))
+        created = events[2][2]
+        self.assertEqual((created['id'], created['total'], len(created['items'])), (order_id, '12.00', 2))
+
+
+    def test_drain_delivers_signed_batches(self):
+        with self.outbox_settings(pos={'url': self.server.url, 'secret': 'lemon', 'batch_size': 2}):
+            self.login(self.manager)
+            orders = Order.objects.bulk_create([Order(user=self.customer, total=5, date='2023-05-02') for _ in range(2)])
+            self.client.post('/api/orders/dispatch', {'orders': [self.order.pk] + [order.pk for order in orders], 'status': True}, format='json')
+            self.drain()
+
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.assertEqual([len(body['events']) for _, body in self.server.requests], [2, 1])
+        headers, body = self.server.requests[0]
+        content = json.dumps(body, separators=(',', ':')).encode()
+        self.assertEqual(headers['X-LittleLemon-Signature'], 'sha256=' + hmac.new(b'lemon', content, hashlib.sha256).hexdigest())
+        self.assertEqual([event['payload']['id'] for event in body['events']], [self.order.pk, orders[0].pk])
+
+
+    def test_failed_deliveries_are_retried_then_given_up(self):
+        self.server.failures = 1
+        with self.outbox_settings(pos={'url': self.server.url}, down={'url': 'http://127.0.0.1:9/closed', 'timeout': 1}):
+            OutboxEvent.objects.bulk_create([OutboxEvent(destination=name, topic='order.updated', payload={'id': 1}) for name in ('pos', 'down')])
+            with self.assertLogs('LittleLemonAPI.outbox', 'WARNING') as logs:
+                self.drain()
+        self.assertEqual(len(logs.records), 4) # One 503 of the stand-in and three refused connections
+
+        self.assertEqual(len(self.server.requests), 1) # Delivered by the retry after the 503
+        event = OutboxEvent.objects.get()
+        self.assertEqual((event.destination, event.attempts, event.failed), ('down', 3, True))
+        self.assertIn('Connection refused', event.last_error)
+
+
+    def test_concurrency_limit_per_destination(self):
+        self.server.delay = 0.05
+        with self.outbox_settings(pos={'url': self.server.url, 'batch_size': 1, 'concurrency': 2}):
+            OutboxEvent.objects.bulk_create([OutboxEvent(destination='pos', topic='order.updated', payload={'id': i}) for i in range(6)])
+            self.drain()
+        self.assertEqual(len(self.server.requests), 6)
+        self.assertEqual(self.server.peak, 2)
+
+
+    def test_events_of_an_order_arrive_in_order(self):
+        self.server.delay = 0.02
+        with self.outbox_settings(pos={'url': self.server.url, 'batch_size': 1, 'concurrency': 3}):
+            OutboxEvent.objects.bulk_create([
+                OutboxEvent(destination='pos', topic='order.updated', payload={'id': order_id, 'step': step})
+                for step in range(4) for order_id in (1, 2, 3)
+            ])
+            self.drain()
+        received = {}
+        for _, body in self.server.requests:
+            for event in body['events']:
+                received.setdefault(event['payload']['id'], []).append((event['id'], event['payload']['step']))
+        self.assertEqual({order_id: [step for _, step in events] for order_id, events in received.items()}, {i: [0, 1, 2, 3] for i in (1, 2, 3)})
+        self.assertTrue(all(events == sorted(events) for events in received.values())) # Ids grow with the writes
+        self.assertEqual(self.server.peak, 3) # Different orders are still delivered in parallel
+
+
+
+class OrderArchiveTest(APITestCase):
+    """
+    Tests for moving old delivered orders into the archive and reading them back by date
+    """
+
+    def setUp(self):
+        super().setUp()
+        today = timezone.localdate()
+        self.old_day, self.recent_day = today - timedelta(days=400), today - timedelta(days=10)
+        items = self.make_menu(2)
+        self.archived = Order.objects.create(user=self.customer, delivery_crew=self.crew, status=True, total=10, date=self.old_day)
+        self.pending = Order.objects.create(user=self.customer, total=5, date=self.old_day) # Undelivered, stays live
+        self.recent = Order.objects.create(user=self.customer, delivery_crew=self.crew, status=True, total=7, date=self.recent_day)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menuitem=item, quantity=2, unit_price=item.price, price=item.price * 2)
+            for order in (self.archived, self.recent) for item in items
+        ])
+
+
+    def archive(self):
+        call_command('archive_orders', '--batch-size', '1', stdout=io.StringIO())
+
+
+    def read(self, path):
+        data = self.client.get(path).data
+        self.assertNotIn('detail', data)
+        # Lists have no default order, the orders of a page are compared by id
+        return sorted(data['results'], key=lambda order: order['id']) if 'results' in data else data
+
+
+    def test_archive_moves_old_delivered_orders(self):
+        self.archive()
+        self.assertEqual(set(Order.objects.values_list('pk', flat=True)), {self.pending.pk, self.recent.pk})
+        archived = ArchivedOrder.objects.get()
+        self.assertEqual((archived.pk, archived.delivery_crew, archived.total), (self.archived.pk, self.crew, 10))
+        self.assertEqual(ArchivedOrderItem.objects.filter(order=archived).count(), 2)
+        self.assertEqual(OrderItem.objects.count(), 2)
+
+        self.archive() # Nothing left, running again changes nothing
+        self.assertEqual(ArchivedOrder.objects.count(), 1)
+        self.assertEqual(rebuild_sales_rollup()[0], 2) # Archived orders still count in the rollup
+
+
+    def test_lists_read_the_archive_for_old_dates_only(self):
+        self.login(self.manager)
+        paths = [f'/api/orders?start={self.old_day}&page_size=10', f'/api/orders?date={self.old_day}&page_size=10', f'/api/orders/{self.archived.pk}']
+        before = {path: self.read(path) for path in paths}
+        self.archive()
+        for path, data in before.items():
+            self.assertEqual(self.read(path), data)
+        self.assertEqual(self.client.patch(f'/api/orders/{self.archived.pk}', {'status': False}, format='json').status_code, 404)
+
+        self.login(self.customer)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/orders')
+        self.assertEqual(response.data['count'], 2)
+        self.assertFalse([query for query in queries if 'history' in query['sql'] or 'archived' in query['sql']])
+        self.assertEqual(self.client.get(f'/api/orders?start={self.recent_day}').data['count'], 1)
+
+        self.login(self.crew)
+        self.assertEqual([order['id'] for order in self.client.get(f'/api/orders?end={self.old_day}').data['results']], [self.archived.pk])
+
+
+    def test_malformed_date_is_rejected(self):
+        self.login(self.manager)
+        for path in ('/api/orders?date=garbage', f'/api/orders/{self.recent.pk}?date=2023-13-01'):
+            response = self.client.get(path)
+            self.assertEqual((response.status_code, response.data), (400, {'date': ['Date has wrong format. Use YYYY-MM-DD.']}))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.manager).key}')
+        self.assertEqual(self.client.get('/api/async/orders?date=garbage').status_code, 400)
+
+
+    def test_async_list_and_export_include_the_archive(self):
+        self.archive()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.manager).key}')
+        path = f'orders?start={self.old_day}&ordering=date'
+        sync, asynchronous = self.client.get(f'/api/{path}'), self.client.get(f'/api/async/{path}')
+        self.assertEqual(asynchronous.content.replace(b'/api/async/', b'/api/'), sync.content)
+        self.assertEqual(json.loads(sync.content)['count'], 3)
+
+        export = b''.join(self.client.get('/api/orders/export?type=ndjson').streaming_content)
+        self.assertEqual({json.loads(line)['id'] for line in export.splitlines()}, {self.archived.pk, self.pending.pk, self.recent.pk})
@@ -0,0 +1,201 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+from .conf import get_setting
+from .roles import MANAGER, DELIVERY_CREW, get_roles
+
+
+# Takes a token from the bucket of a key in a single statement, refilling it for the time passed since the last check.
+# No row is returned when the bucket holds less than one token, which denies the request
+TAKE_SQL = '''
+    INSERT INTO buckets (key, tokens, updated) VALUES (:key, :capacity - 1, :now)
+    ON CONFLICT (key) DO UPDATE SET
+        tokens = MIN(:capacity, tokens + MAX(0, :now - updated) * :rate) - 1,
+        updated = :now
+    WHERE MIN(:capacity, tokens + MAX(0, :now - updated) * :rate) >= 1
+    RETURNING tokens
+'''
+
+
+class BucketStore:
+    """
+    Token buckets kept in an SQLite database in WAL mode.
+    Every worker process on the host opens the same file, so all of them draw from the same buckets,
+    and every check is a single indexed upsert
+    """
+
+    def __init__(self, path):
+        """
+        Constructor for the store object
+
+        Args:
+            path (str): file of the SQLite database
+        """
+
+        self.path = path
+        self.local = threading.local()
+
+
+    def connect(self):
+        """
+        Method to get the connection of the current thread, connections are never shared across forks
+
+        Returns:
+            Connection: sqlite3 connection with the bucket table present
+        """
+
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or self.local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL') # Buckets may lose their last changes on power loss only
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL) WITHOUT ROWID'
+            )
+            self.local.connection, self.local.pid = connection, os.getpid()
+        return connection
+
+
+    def take(self, key, capacity, rate):
+        """
+        Method to take one token from a bucket
+
+        Args:
+            key (str): key of the bucket
+            capacity (int): largest number of tokens the bucket holds
+            rate (float): tokens added per second
+
+        Returns:
+            float: seconds until a token is available, 0 if one was taken
+        """
+
+        now = time.time()
+        connection = self.connect()
+        params = {'key': key, 'capacity': capacity, 'rate': rate, 'now': now}
+        if connection.execute(TAKE_SQL, params).fetchone() is not None:
+            if random.random() < 0.001: # Dropping idle buckets now and then, a missing bucket is a full one
+                connection.execute('DELETE FROM buckets WHERE updated < ?', [now - 86400])
+            return 0.0
+
+        row = connection.execute('SELECT tokens, updated FROM buckets WHERE key = ?', [key]).fetchone()
+        tokens = min(capacity, row[0] + max(0, now - row[1]) * rate) if row else 0
+        return max(0.0, (1 - tokens) / rate)
+
+
+    def reset(self):
+        """
+        Method to empty the store, used by the tests
+        """
+
+        self.connect().execute('DELETE FROM buckets')
+
+
+# Stores against their database files
+_stores = {}
+
+
+def get_store_path():
+    """
+    Method to get the database file of the bucket store, every project keeps its buckets in its own file
+
+    Returns:
+        str: configured 'THROTTLE_DATABASE' or 'throttle.sqlite3' inside the 'BASE_DIR' of the project
+    """
+
+    path = get_setting('THROTTLE_DATABASE')
+    if path is None:
+        path = os.path.join(getattr(settings, 'BASE_DIR', os.getcwd()), 'throttle.sqlite3')
+    return str(path)
+
+
+def get_store():
+    """
+    Method to get the bucket store of the configured database file
+
+    Returns:
+        BucketStore: shared bucket store
+    """
+
+    path = get_store_path()
+    if path not in _stores:
+        _stores[path] = BucketStore(path)
+    return _stores[path]
+
+
+
+class RoleRateThrottle(SimpleRateThrottle):
+    """
+    Throttle limiting every client with a token bucket shared by all worker processes on the host.
+    The rate is picked by the role of the user from the same role data the permissions use:
+    'manager', 'crew', 'user' for customers and 'anon' for anonymous clients, taken from 'DEFAULT_THROTTLE_RATES'.
+    A rate of 'n/period' allows bursts of n requests refilled evenly over the period
+    """
+
+    def __init__(self):
+        # The rate depends on the request, it is read in 'allow_request()'
+        pass
+
+
+    def get_scope(self, request):
+        """
+        Method to pick the rate scope of the request
+
+        Args:
+            request (Request): request object from the client side
+
+        Returns:
+            str: name of the rate in 'DEFAULT_THROTTLE_RATES'
+        """
+
+        if not (request.user and request.user.is_authenticated):
+            return 'anon'
+        roles = get_roles(request)
+        if MANAGER in roles:
+            return 'manager'
+        if DELIVERY_CREW in roles:
+            return 'crew'
+        return 'user'
+
+
+    def get_scope_rate(self, scope):
+        """
+        Method to read the rate of a scope from the current settings, roles without a rate of their own use the customer rate
+
+        Returns:
+            tuple: number of requests and period in seconds or None if the scope is not limited
+        """
+
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        rate = rates.get(scope, rates.get('user')) if scope != 'anon' else rates.get('anon')
+        return self.parse_rate(rate)
+
+
+    def allow_request(self, request, view):
+        """
+        Method to take a token from the bucket of the client
+
+        Args:
+            request (Request): request object from the client side
+            view (View): view object handling the request
+
+        Returns:
+            bool: true if the request is allowed
+        """
+
+        scope = self.get_scope(request)
+        requests, duration = self.get_scope_rate(scope)
+        if requests is None:
+            return True
+
+        ident = request.user.pk if scope != 'anon' else self.get_ident(request)
+        self.delay = get_store().take(f'{scope}:{ident}', requests, requests / duration)
+        return self.delay == 0
+
+
+    def wait(self):
+        return getattr(self, 'delay', None)
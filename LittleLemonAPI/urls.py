@@ -1,10 +1,13 @@
 from django.urls import path
-from . import views
+from . import views, async_views
 
 urlpatterns = [
     # path for handling menuitems
     path('menu-items', views.MenuItemsView.as_view(), name='menu-items'),
     
+    # path for importing many menuitems at once
+    path('menu-items/import', views.MenuItemImportView.as_view(), name='menu-import'),
+    
     # path for handling single menuitem
     path('menu-items/<int:pk>', views.SingleMenuItem.as_view(), name='single-item'),
     
@@ -32,6 +35,27 @@ urlpatterns = [
     # path for handling orderitems
     path('orders', views.OrderItemView.as_view(), name='order-item'),
     
+    # path for exporting the order history
+    path('orders/export', views.OrderExportView.as_view(), name='order-export'),
+    
+    # path for dispatching many orders at once
+    path('orders/dispatch', views.OrderDispatchView.as_view(), name='order-dispatch'),
+    
     # path for handling single orderitem
     path('orders/<int:pk>', views.SingleOrderItemView.as_view(), name='single-order'),
-]
\ No newline at end of file
+    
+    # path for handling the sales report
+    path('reports/sales', views.SalesReportView.as_view(), name='sales-report'),
+    
+    # path for handling the request metrics of the process
+    path('metrics', views.MetricsView.as_view(), name='metrics'),
+    
+    # paths for the async implementations of the hot read endpoints
+    path('async/menu-items', async_views.AsyncMenuItemsView.as_view(), name='async-menu-items'),
+    path('async/categories', async_views.AsyncCategoriesView.as_view(), name='async-categories'),
+    path('async/cart/menu-items', async_views.AsyncCartView.as_view(), name='async-cart'),
+    path('async/orders', async_views.AsyncOrdersView.as_view(), name='async-orders'),
+    
+    # path for streaming the order changes as server-sent events
+    path('orders/events', async_views.OrderEventsView.as_view(), name='order-events'),
+]
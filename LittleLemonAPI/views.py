@@ -1,18 +1,165 @@
-from django.shortcuts import render, get_object_or_404
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_date
 from django.contrib.auth.models import User, Group
+from django.db import OperationalError, transaction
+from django.db.models import F, Prefetch, Sum, prefetch_related_objects
+from django.utils import timezone
 from rest_framework import generics, status
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.filters import OrderingFilter
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from .models import MenuItem, Cart, Order, OrderItem, Category
-from .serializers import MenuItemSerializer, UserSerializer, CartSerializer, OrderSerializer, OrderItemSerializer, CategorySerializer
+from rest_framework.settings import api_settings
+import csv
+import io
+import json
+from .models import MenuItem, Cart, Order, OrderItem, Category, OrderHistory, OrderHistoryItem
+from .serializers import MenuItemSerializer, UserSerializer, CartSerializer, OrderSerializer, CategorySerializer, SalesReportSerializer, OrderDispatchSerializer, MenuItemImportSerializer, OrderHistorySerializer
+from .mixins import ConditionalGetMixin, MenuCachedListMixin, ProjectedListMixin
+from .pagination import OrderKeysetPagination, OrderPageNumberPagination
+from .search import MenuSearchFilter
+from .sales import record_sales, discard_sales, sales_report
+from .carts import add_to_cart
+from .menu_import import import_menu_items, MAX_IMPORT_ROWS
+from .parsers import CSVParser
+from .conf import get_setting
+from .metrics import registry, timed
+from .routers import ReplicaReadMixin
+from .events import broker, order_event
+from .outbox import enqueue, order_created
+from .archive import archive_cutoff, reaches_archive
 from .permissions import IsManagerUser, IsCustomerUser, IsManagerorCrewUser, isManager, isCrew
-from datetime import datetime
+
+# Prefetch loading the items of orders together with their menuitems
+ORDER_ITEMS_PREFETCH = Prefetch('order_items', queryset=OrderItem.objects.select_related('menuitem'))
+HISTORY_ITEMS_PREFETCH = Prefetch('order_items', queryset=OrderHistoryItem.objects.select_related('menuitem'))
+
+
+def get_date_param(request, param):
+    """
+    Method to read an optional date from the query parameters of a request
+
+    Args:
+        request (Request): request object from the client side
+        param (str): name of the query parameter
+
+    Raises:
+        ValidationError: if the date has a wrong format
+
+    Returns:
+        date: given date, None if the parameter is missing
+    """
+    
+    value = request.query_params.get(param)
+    try:
+        day = parse_date(value) if value else None
+    except ValueError:
+        day = None
+    if value and day is None:
+        raise ValidationError({param: ['Date has wrong format. Use YYYY-MM-DD.']})
+    return day
+
+
+def get_date_range(request):
+    """
+    Method to read the optional 'start' and 'end' dates of a request
+
+    Args:
+        request (Request): request object from the client side
+
+    Raises:
+        ValidationError: if a date has a wrong format or the range is reversed
+
+    Returns:
+        tuple: start and end dates, None for a missing date
+    """
+    
+    start, end = get_date_param(request, 'start'), get_date_param(request, 'end')
+    if start is not None and end is not None and start > end:
+        raise ValidationError({'end': ['End date must not be before the start date.']})
+    return start, end
+
+
+
+class OrderArchiveMixin:
+    """
+    View mixin reading orders from the live table, or from the live and archived tables together
+    when the requested dates reach before the archive cutoff. The dates come from the 'start' and 'end'
+    parameters or the exact 'date' filter, requests without dates never touch the archive
+    """
+    
+    def get_order_dates(self):
+        """
+        Method to read the date range of the requested orders
+
+        Raises:
+            ValidationError: if a date has a wrong format or the range is reversed
+
+        Returns:
+            tuple: start and end dates, None for a missing date
+        """        
+        
+        start, end = get_date_range(self.request)
+        day = get_date_param(self.request, 'date')
+        if day is not None:
+            start, end = day, day
+        return start, end
+    
+    
+    @property
+    def reads_archive(self):
+        """
+        Whether the request is served from the order history including the archive
+        """        
+        
+        if not hasattr(self, '_reads_archive'): # Archived orders are read only
+            self._reads_archive = self.request.method in ('GET', 'HEAD', 'OPTIONS') and reaches_archive(*self.get_order_dates())
+        return self._reads_archive
+    
+    
+    @reads_archive.setter
+    def reads_archive(self, value):
+        self._reads_archive = value
+    
+    
+    def get_order_queryset(self):
+        """
+        Methods for making personalized querysets limited to the requested dates
+
+        Returns:
+            QuerySet[Order | OrderHistory]: different order querysets for managers, crew members and customers
+        """        
+        
+        request = self.request
+        user = request.user
+        
+        model = OrderHistory if self.reads_archive else Order
+        if isManager(request): # Checking if user is manager
+            orders = model.objects.all()
+        elif isCrew(request): # Checking if user is delivery crew member
+            orders = model.objects.filter(delivery_crew=user)
+        else:
+            orders = model.objects.filter(user=user) # Returning only specified user's orders
+        
+        start, end = self.get_order_dates()
+        if start is not None:
+            orders = orders.filter(date__gte=start)
+        if end is not None:
+            orders = orders.filter(date__lte=end)
+        return orders
+    
+    
+    def get_serializer_class(self):
+        return OrderHistorySerializer if self.reads_archive else OrderSerializer
+
 
 # Create your views here.
-class CategoriesView(generics.ListCreateAPIView):
+class CategoriesView(ReplicaReadMixin, MenuCachedListMixin, ProjectedListMixin, generics.ListCreateAPIView):
     """
     View class for displaying and creating categories.
-    Contains 'queryset' and 'serializer_class' attributes for handling the model.    
+    Contains 'queryset' and 'serializer_class' attributes for handling the model.
+    The category list is served from the menu response cache, misses are built on the primary database and never use a replica
     """
     
     queryset = Category.objects.all()
@@ -34,10 +181,11 @@ class CategoriesView(generics.ListCreateAPIView):
 
 
 
-class SingleCategoryView(generics.RetrieveUpdateDestroyAPIView):
+class SingleCategoryView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     View class for showing and managing single menuitem.
-    Contains 'queryset' and 'serializer_class' attributes for handling the model
+    Contains 'queryset' and 'serializer_class' attributes for handling the model.
+    Conditional GET requests are answered with '304 Not Modified' when the client copy is fresh
     """    
     
     queryset = Category.objects.all()
@@ -59,15 +207,17 @@ class SingleCategoryView(generics.RetrieveUpdateDestroyAPIView):
 
 
 
-class MenuItemsView(generics.ListCreateAPIView):
+class MenuItemsView(ReplicaReadMixin, MenuCachedListMixin, ProjectedListMixin, generics.ListCreateAPIView):
     """
     View class for displaying and creating menuitems.
     Contains 'queryset' and 'serializer_class' attributes for handling the model.
-    Further, ordering, search and filter can be performed here
+    Further, ordering, search and filter can be performed here and the list is served from the menu response cache,
+    misses are built on the primary database and never use a replica
     """    
     
     queryset = MenuItem.objects.select_related('category').all()
     serializer_class = MenuItemSerializer
+    conditional_fields = ['updated_at', 'category__updated_at']
     
     
     def get_permissions(self):
@@ -87,17 +237,20 @@ class MenuItemsView(generics.ListCreateAPIView):
     ordering_fields = ['price', 'featured']
     filterset_fields = ['category__title', 'price', 'featured']
     search_fields = ['title','category__title']
+    filter_backends = [OrderingFilter, MenuSearchFilter] # Full-text index search with 'SearchFilter' as fallback
     
     
     
-class SingleMenuItem(generics.RetrieveUpdateDestroyAPIView):
+class SingleMenuItem(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     View class for showing and managing single menuitem.
-    Contains 'queryset' and 'serializer_class' attributes for handling the model
+    Contains 'queryset' and 'serializer_class' attributes for handling the model.
+    Conditional GET requests are answered with '304 Not Modified' when the client copy is fresh
     """    
     
     queryset = MenuItem.objects.select_related('category').all()
     serializer_class = MenuItemSerializer
+    conditional_fields = ['updated_at', 'category__updated_at']
     
     
     def get_permissions(self):
@@ -115,6 +268,47 @@ class SingleMenuItem(generics.RetrieveUpdateDestroyAPIView):
 
 
 
+class MenuItemImportView(generics.GenericAPIView):
+    """
+    View class for creating and updating many menuitems at once from a JSON list or a CSV document.
+    The whole import is validated with a few set-based queries and written in one transaction,
+    errors are reported per row and nothing is written if any row is invalid.
+    Can be used by Manager users only
+    """    
+    
+    permission_classes = [IsManagerUser]
+    serializer_class = MenuItemImportSerializer
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES + [CSVParser]
+    
+    
+    def post(self, request, *args, **kwargs):
+        """
+        Method to import the menuitems, rows with an 'id' update that menuitem and the others are created
+
+        Args:
+            request (Request): request object from the client side
+
+        Returns:
+            Response: response object with the result of every row or the errors of the invalid rows
+        """        
+        
+        rows = request.data
+        if not isinstance(rows, list) or not rows:
+            raise ValidationError({'non_field_errors': ['Expected a non-empty list of menu items.']})
+        if len(rows) > MAX_IMPORT_ROWS:
+            raise ValidationError({'non_field_errors': [f'Ensure this list has no more than {MAX_IMPORT_ROWS} menu items.']})
+        
+        results, errors = import_menu_items(rows)
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        
+        counts = {'created': 0, 'updated': 0}
+        for result in results:
+            counts[result['result']] += 1
+        return Response({**counts, 'results': results}, status=status.HTTP_200_OK)
+
+
+
 class ManagerView(generics.ListCreateAPIView):
     """
     View class for displaying and generating managers.
@@ -247,7 +441,7 @@ class SingleDeliveryCrewView(generics.DestroyAPIView):
     
     
     
-class CartView(generics.ListCreateAPIView, generics.DestroyAPIView):
+class CartView(ProjectedListMixin, generics.ListCreateAPIView, generics.DestroyAPIView):
     """
     View class for displaying, creating and destroying cart items.
     Can be used only by Customers
@@ -268,6 +462,30 @@ class CartView(generics.ListCreateAPIView, generics.DestroyAPIView):
         return Cart.objects.filter(user=self.request.user)
     
     
+    def create(self, request, *args, **kwargs):
+        """
+        Method to add a menu item to the cart of the user, or add onto its quantity if it is there already.
+        The cart is written by a single upsert, prices come from the menu item
+
+        Args:
+            request (Request): request object from the client side
+
+        Returns:
+            Response: response object with the cart item, '201 Created' for a new item else '200 OK'
+        """        
+        
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        cart, created = add_to_cart(request.user, serializer.validated_data['menuitem_id'], serializer.validated_data['quantity'])
+        if cart is None:
+            raise ValidationError({'menuitem_id': [f'Invalid pk "{serializer.validated_data["menuitem_id"]}" - object does not exist.']})
+        
+        cart.menuitem = MenuItem.objects.select_related('category').get(pk=cart.menuitem_id)
+        with timed('serialize'):
+            data = self.get_serializer(cart).data
+        return Response(data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+    
+    
     def destroy(self, request, *args, **kwargs):
         """
         Method to flush the complete cart
@@ -285,35 +503,66 @@ class CartView(generics.ListCreateAPIView, generics.DestroyAPIView):
 
 
 
-class OrderItemView(generics.ListCreateAPIView):
+class OrderItemView(ReplicaReadMixin, OrderArchiveMixin, ConditionalGetMixin, ProjectedListMixin, generics.ListCreateAPIView):
     """
     View class for displaying and generating orders.
     User must be authenticated for using this view.
-    Further, order list can be filtered and searched
+    Further, order list can be filtered by dates and searched, supports conditional GET requests and is read from a replica.
+    Archived orders are only read when the requested dates reach before the archive cutoff
     """    
     
     serializer_class = OrderSerializer
+    conditional_menu = True
     
     filterset_fields = ['status', 'date']
     ordering_fields = ['status', 'date']
     
     
+    @property
+    def paginator(self):
+        """
+        The paginator instance for the request.
+        Keyset pagination on '(date, id)' is used when 'pagination=cursor' or a 'cursor' is passed,
+        otherwise page numbers with an optional count-free mode are used
+
+        Returns:
+            BasePagination: paginator object for the list
+        """        
+        
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if params.get('pagination') == 'cursor' or 'cursor' in params:
+                self._paginator = OrderKeysetPagination()
+            else:
+                self._paginator = OrderPageNumberPagination()
+        return self._paginator
+    
+    
+    def get_list_validators(self, request, queryset):
+        """
+        Method to compute the list validators, skipped when the client paginates without counting
+        so deep pages never scan the whole order table
+
+        Returns:
+            tuple: quoted etag and last modified timestamp of the list or None for both
+        """        
+        
+        paginator = self.paginator
+        if isinstance(paginator, OrderKeysetPagination) or paginator.is_count_free(request):
+            return None, None
+        return super().get_list_validators(request, queryset)
+    
+    
     def get_queryset(self):
         """
         Methods for making personalized querysets
 
         Returns:
-            QuerySet[Order]: different order querysets for managers, crew members and customers
+            QuerySet[Order | OrderHistory]: different order querysets for managers, crew members and customers
         """        
         
-        request = self.request
-        user = request.user
-        
-        if isManager(request): # Checking if user is manager
-            return Order.objects.all()
-        elif isCrew(request): # Checking if user is delivery crew member
-            return Order.objects.filter(delivery_crew=user)
-        return Order.objects.filter(user=user) # Returning only specified user's orders
+        prefetch = HISTORY_ITEMS_PREFETCH if self.reads_archive else ORDER_ITEMS_PREFETCH
+        return self.get_order_queryset().prefetch_related(prefetch) # Loading the items of the whole page in one query
     
     
     def get_permissions(self):
@@ -330,75 +579,108 @@ class OrderItemView(generics.ListCreateAPIView):
         return [permission() for permission in permission_classes]
 
 
-    def perform_action(self, serializer, obj):
+    def create(self, request, *args, **kwargs):
         """
-        Method for creating the serializer object and saving the item
+        Method for generting the orders.
+        Only customers can generate the orderitems.
+        The cart is converted into an order inside a single transaction with a fixed number of queries
 
         Args:
-            serializer (ModelSerializer): serializer class for generating object
-            obj (Model): model object for generating serializer object
+            request (Request): request object from the client side
 
         Returns:
-            Serializer: serializer object after saving the item
+            Response: different response objects for the clients
         """        
         
-        serialized_order = serializer(obj)
-        serialized_order.is_valid(raise_exception=True)
-        serialized_order.save()
-        return serialized_order
-        
+        user = request.user
+        try:
+            with transaction.atomic():
+                order, cart_items = self.checkout(user)
+        except OperationalError as exc: # Lock not granted within the database timeout
+            if 'locked' not in str(exc):
+                raise
+            order, cart_items = None, None
+        if cart_items == []: # Checking if cart is empty
+            return Response({"message": "Cart is empty"}, status=status.HTTP_204_NO_CONTENT)
+        if order is None: # Cart was claimed by a parallel checkout
+            return Response({"message": "Cart is already being checked out"}, status=status.HTTP_409_CONFLICT)
 
-    def create(self, request, *args, **kwargs):
+        prefetch_related_objects([order], ORDER_ITEMS_PREFETCH)
+        with timed('serialize'):
+            serialized_order = OrderSerializer(order).data
+        return Response({'message':'request successful', 'item': serialized_order}, status=status.HTTP_201_CREATED)
+
+
+    def checkout(self, user):
         """
-        Method for generting the orders.
-        Only customers can generate the orderitems
+        Method to convert the cart of a user into an order, has to run inside a transaction.
+        The cart rows are written first, so the transaction holds the write lock from its first statement.
+        On SQLite a parallel checkout of the same user then waits for this one instead of failing to upgrade
+        its read lock, on other databases the rows are locked until the commit
 
         Args:
-            request (Request): request object from the client side
+            user (User): customer checking out
 
         Returns:
-            Response: different response objects for the clients
-        """        
+            tuple: created order and the checked out cart rows, no order if the cart was claimed by a parallel checkout
+        """
+
+        cart = Cart.objects.filter(user=user)
+        cart.update(quantity=F('quantity')) # Taking the write lock without changing the rows
+        cart_items = list(cart.values_list('id', 'menuitem_id', 'quantity', 'unit_price', 'price'))
+        if not cart_items:
+            return None, cart_items
+        cart_ids = [item[0] for item in cart_items]
+        cart_rows = Cart.objects.filter(id__in=cart_ids)
         
-        user = request.user
-        cart_items = Cart.objects.filter(user=user)
-        if not cart_items: # Checking if cart is empty
-            return Response({"message": "Cart is empty"}, status=status.HTTP_204_NO_CONTENT)
+        # Calucalting the total price in the database
+        total_price = cart_rows.aggregate(total=Sum('price'))['total']
         
-        # Calucalting the totaal price
-        total_price = 0
-        for item in cart_items: 
-            total_price += item.price
+        # Claiming the cart rows, a concurrent checkout which already consumed them deletes fewer rows
+        deleted, _ = cart_rows.delete()
+        if deleted != len(cart_ids):
+            transaction.set_rollback(True)
+            return None, cart_items
         
         # Generating order object
-        order = Order(user=user, total=total_price, date=datetime.now())
-        serialized_order = self.perform_action(OrderSerializer, order)
-            
+        order = Order.objects.create(user=user, total=total_price, date=timezone.localdate())
+        
         # Making orderitem objects from cart items
-        for item in cart_items:
-            order_item = OrderItem(
+        OrderItem.objects.bulk_create([
+            OrderItem(
                 order=order,
-                menuitem=item.menuitem,
-                quantity=item.quantity,
-                unit_price=item.unit_price,
-                price=item.price
+                menuitem_id=menuitem_id,
+                quantity=quantity,
+                unit_price=unit_price,
+                price=price
             )
-                
-            self.perform_action(OrderItemSerializer, order_item)
-            item.delete()
-
-        return Response({'message':'request successful', 'item': serialized_order.data}, status=status.HTTP_201_CREATED)
+            for _, menuitem_id, quantity, unit_price, price in cart_items
+        ])
+        
+        # Adding the order to the daily sales rollup inside the same transaction
+        record_sales(order.date, total_price, [(menuitem_id, quantity, price) for _, menuitem_id, quantity, _, price in cart_items])
+        
+        # Announcing the order to the integrations, the outbox rows commit together with the order
+        enqueue('order.created', [order_created(order, cart_items)])
+        return order, cart_items
         
         
         
-class SingleOrderItemView(generics.RetrieveUpdateDestroyAPIView):
+class SingleOrderItemView(OrderArchiveMixin, ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     View class for handling single orderitem.
     User must be authenticated for using this view.
-    Seperate permissions for seperate request types
+    Seperate permissions for seperate request types and conditional GET requests are supported,
+    archived orders can be displayed but not changed
     """    
     
     serializer_class = OrderSerializer
+    conditional_menu = True
+    
+    
+    @property
+    def object_prefetch(self):
+        return [HISTORY_ITEMS_PREFETCH if self.reads_archive else ORDER_ITEMS_PREFETCH]
     
     
     def get_permissions(self):
@@ -422,38 +704,338 @@ class SingleOrderItemView(generics.RetrieveUpdateDestroyAPIView):
         Methods for making personalized querysets
 
         Returns:
-            QuerySet[Order]: different order querysets for managers, crew members and customers
+            QuerySet[Order | OrderHistory]: different order querysets for managers, crew members and customers
         """      
           
-        request = self.request
-        user = request.user
+        return self.get_order_queryset()
+    
+    
+    def get_object(self):
+        """
+        Method to find the requested order, a GET request missing the live table looks into the archive
+
+        Returns:
+            Order | OrderHistory: requested order
+        """        
         
-        if isManager(request): # Checking if user is manager
-            return Order.objects.all()
-        elif isCrew(request): # Checking if user is delivery crew member
-            return Order.objects.filter(delivery_crew=user)
-        return Order.objects.filter(user=user) # Returning only specified user's orders
+        try:
+            return super().get_object()
+        except Http404:
+            if self.request.method != 'GET' or self.reads_archive:
+                raise
+            self.reads_archive = True
+            return super().get_object()
     
     
     def perform_update(self, serializer):
-        request = self.request
+        """
+        Method to save the changes of an order.
+        Managers can change the crew member and the status while crew members can only change the status,
+        all other fields of the request are ignored. A request changing nothing saves nothing
+
+        Args:
+            serializer (OrderSerializer): serializer validated against the request data
+        """        
+        
+        fields = ['status'] if isCrew(self.request) else ['delivery_crew', 'status']
+        instance = serializer.instance
+        current = {'status': instance.status, 'delivery_crew': instance.delivery_crew_id}
+        changes = {
+            field: serializer.validated_data[field] for field in fields
+            if field in serializer.validated_data and getattr(serializer.validated_data[field], 'pk', serializer.validated_data[field]) != current[field]
+        }
+        if not changes: # Keeping 'updated_at' and the validators of the clients, no event is announced
+            return
+        for field, value in changes.items():
+            setattr(instance, field, value)
+        with transaction.atomic():
+            instance.save(update_fields=[*changes, 'updated_at'])
+            enqueue('order.updated', [order_event(instance.pk, instance.user_id, instance.status, instance.delivery_crew_id, instance.updated_at)])
+    
+    
+    def perform_destroy(self, instance):
+        """
+        Method to delete the order together with its figures in the daily sales rollup
+
+        Args:
+            instance (Order): order to be deleted
+        """        
+        
+        with transaction.atomic():
+            discard_sales(instance)
+            instance.delete()
+
+        
+        
+        
+class OrderDispatchView(generics.GenericAPIView):
+    """
+    View class for assigning a delivery crew member and/or a status to many orders at once.
+    The orders are changed with a single UPDATE and the result of every requested order is reported.
+    Can be used by Manager users only
+    """    
+    
+    permission_classes = [IsManagerUser]
+    serializer_class = OrderDispatchSerializer
+    
+    
+    def post(self, request, *args, **kwargs):
+        """
+        Method to dispatch the requested orders
+
+        Args:
+            request (Request): request object from the client side
+
+        Returns:
+            Response: response object with the result of every order
+        """        
         
-        order_instance = self.get_object() # Get object instance
-        # Create data object
-        req_obj = dict(
-            user = order_instance.user.id,
-            total = order_instance.total,
-            date = order_instance.date,
-            # Managers can change crew-id and status
-            delivery_crew = request.data.get('delivery_crew', order_instance.delivery_crew.id),
-            status = request.data.get('status', order_instance.status),
-        )
-        
-        # Crew can only change status so, fixing (hard coding) the crew_id
-        if isCrew(request):
-            req_obj['delivery_crew'] = order_instance.delivery_crew.id
-        
-        # Saving the model instance uing serializer
-        serializer = self.get_serializer(order_instance, data=req_obj, partial=False)
+        serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        data = serializer.validated_data
+        order_ids = list(dict.fromkeys(data['orders'])) # Dropping repeated ids while keeping the order
+        changes = {field: data[field] for field in ('delivery_crew', 'status') if field in data}
+        
+        try:
+            with transaction.atomic():
+                updated, found = self.dispatch_orders(order_ids, changes)
+        except OperationalError as exc: # Lock not granted within the database timeout
+            if 'locked' not in str(exc):
+                raise
+            return Response({"message": "Orders are being changed by another request"}, status=status.HTTP_409_CONFLICT)
+        
+        results = [{'id': order_id, 'result': 'updated' if order_id in found else 'not_found'} for order_id in order_ids]
+        return Response({'updated': updated, 'results': results}, status=status.HTTP_200_OK)
+
+
+
+    def dispatch_orders(self, order_ids, changes):
+        """
+        Method to apply the changes to the existing orders, has to run inside a transaction.
+        The orders are written first, so the transaction holds the write lock from its first statement.
+        On SQLite a parallel dispatch then waits for this one instead of failing to upgrade its read lock,
+        on other databases the rows are locked until the commit so the reported results match the update
+
+        Args:
+            order_ids (list): ids of the requested orders
+            changes (dict): new delivery crew and/or status
+
+        Returns:
+            tuple: number of updated orders and the previous row of every existing order against its id
+        """
+
+        orders = Order.objects.filter(id__in=order_ids)
+        orders.update(status=F('status')) # Taking the write lock without changing the rows
+        found = {row[0]: row for row in orders.values_list('id', 'user_id', 'status', 'delivery_crew_id')}
+        # Setting the change marker explicitly as 'update()' skips 'auto_now'
+        now = timezone.now()
+        updated = Order.objects.filter(id__in=found).update(**changes, updated_at=now) if found else 0
+        # 'update()' sends no signals, the order streams are notified here
+        crew_id = changes['delivery_crew'].pk if changes.get('delivery_crew') is not None else None
+        events = [
+            order_event(
+                order_id, user_id, changes.get('status', order_status),
+                crew_id if 'delivery_crew' in changes else order_crew_id, now,
+            )
+            for order_id, user_id, order_status, order_crew_id in found.values()
+        ]
+        broker.publish_on_commit(events)
+        enqueue('order.updated', events)
+        return updated, found
+        
+        
+        
+class OrderExportView(generics.GenericAPIView):
+    """
+    View class for streaming the order history with its items as CSV or NDJSON.
+    Rows are read in chunks with a server-side cursor so memory stays flat for any table size.
+    Can be used by Manager users only
+    """    
+    
+    permission_classes = [IsManagerUser]
+    
+    # Number of rows fetched from the database at once
+    chunk_size = 2000
+    
+    # Columns of the order and its items in export order
+    order_columns = ['id', 'date', 'user_id', 'delivery_crew_id', 'status', 'total']
+    item_columns = ['menuitem_id', 'quantity', 'unit_price', 'price']
+    
+    
+    def perform_content_negotiation(self, request, force=False):
+        """
+        Method to accept any 'Accept' header, the export format is chosen by the 'type' parameter
+        """        
+        
+        return super().perform_content_negotiation(request, force=True)
+    
+    
+    def get_queryset(self):
+        """
+        Method for making the queryset of the exported rows, one row per orderitem.
+        Orders are optionally limited by the 'start' and 'end' dates given by the client,
+        the archive is included unless the range starts after the archive cutoff
+
+        Returns:
+            QuerySet[tuple]: order columns followed by orderitem columns, ordered by order
+        """        
+        
+        start, end = get_date_range(self.request)
+        orders = (OrderHistory if start is None or start < archive_cutoff() else Order).objects.all()
+        if start is not None:
+            orders = orders.filter(date__gte=start)
+        if end is not None:
+            orders = orders.filter(date__lte=end)
+        
+        item_columns = [f'order_items__{column}' for column in self.item_columns]
+        return orders.order_by('id', 'order_items__id').values_list(*self.order_columns, *item_columns)
+    
+    
+    def get_rows(self):
+        """
+        Method to iterate the exported rows in chunks from a server-side cursor
+
+        Returns:
+            Iterator[tuple]: exported rows
+        """        
+        
+        return self.get_queryset().iterator(chunk_size=self.chunk_size)
+    
+    
+    def stream_csv(self, rows):
+        """
+        Method to render the rows as CSV, one line per orderitem
+
+        Args:
+            rows (Iterator[tuple]): exported rows
+
+        Returns:
+            Iterator[str]: CSV text in chunks of 'chunk_size' lines
+        """        
+        
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['order_id', *self.order_columns[1:], *self.item_columns])
+        for count, row in enumerate(rows, start=1):
+            writer.writerow(row)
+            if count % self.chunk_size == 0: # Flushing the buffered lines
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    
+    def stream_ndjson(self, rows):
+        """
+        Method to render the rows as newline delimited JSON, one line per order with its items.
+        Decimals and dates are written as strings like in the API responses
+
+        Args:
+            rows (Iterator[tuple]): exported rows ordered by order
+
+        Returns:
+            Iterator[str]: NDJSON text in chunks of about 'chunk_size' orders
+        """        
+        
+        size = len(self.order_columns)
+        lines = []
+        order = None
+        for row in rows:
+            if order is None or order['id'] != row[0]: # Starting the next order
+                if order is not None:
+                    lines.append(json.dumps(order, default=str))
+                    if len(lines) >= self.chunk_size:
+                        yield '\n'.join(lines) + '\n'
+                        lines = []
+                order = dict(zip(self.order_columns, row[:size]), items=[])
+            if row[size] is not None: # Orders without items have a single empty row
+                order['items'].append(dict(zip(self.item_columns, row[size:])))
+        if order is not None:
+            lines.append(json.dumps(order, default=str))
+        if lines:
+            yield '\n'.join(lines) + '\n'
+    
+    
+    def get(self, request, *args, **kwargs):
+        """
+        Method to stream the orders in the format given by the 'type' parameter, CSV by default
+
+        Args:
+            request (Request): request object from the client side
+
+        Returns:
+            StreamingHttpResponse: response streaming the export to the client
+        """        
+        
+        export_type = request.query_params.get('type', 'csv')
+        if export_type == 'csv':
+            content, content_type = self.stream_csv(self.get_rows()), 'text/csv'
+        elif export_type == 'ndjson':
+            content, content_type = self.stream_ndjson(self.get_rows()), 'application/x-ndjson'
+        else:
+            return Response({'message': 'type must be csv or ndjson'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="orders.{export_type}"'
+        return response
+        
+        
+        
+class SalesReportView(ReplicaReadMixin, generics.GenericAPIView):
+    """
+    View class for displaying the sales figures over a date range.
+    Figures are read from the daily rollup tables of a replica, so a report costs O(days) instead of O(orders).
+    Can be used by Manager users only
+    """    
+    
+    permission_classes = [IsManagerUser]
+    serializer_class = SalesReportSerializer
+    
+    
+    def get(self, request, *args, **kwargs):
+        """
+        Method to display the revenue, orders and units per day, menu item and category
+        between the optional 'start' and 'end' dates
+
+        Args:
+            request (Request): request object from the client side
+
+        Returns:
+            Response: response object with the sales report
+        """        
+        
+        start, end = get_date_range(request)
+        report = sales_report(start, end)
+        with timed('serialize'):
+            data = self.get_serializer(report).data
+        return Response(data)
+
+
+
+class MetricsView(generics.GenericAPIView):
+    """
+    View class for exporting the request histograms of this process in the Prometheus text format.
+    Scrapes are not throttled, can be used by Manager users only
+    """
+
+    permission_classes = [IsManagerUser]
+    throttle_classes = []
+
+
+    def get(self, request, *args, **kwargs):
+        """
+        Method to display the request metrics
+
+        Args:
+            request (Request): request object from the client side
+
+        Raises:
+            NotFound: if the performance metrics are disabled
+
+        Returns:
+            HttpResponse: metrics document for the scraper
+        """
+
+        if not get_setting('PERFORMANCE_METRICS'):
+            raise NotFound('Performance metrics are disabled.')
+        return HttpResponse(registry.export(), content_type='text/plain; version=0.0.4; charset=utf-8')